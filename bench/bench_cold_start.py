@@ -0,0 +1,110 @@
+# bench_cold_start.py — obmen_bot_full.py ni import qilish (ishga tushish) vaqti
+# -*- coding: utf-8 -*-
+# Har bir o'lcham uchun vaqtinchalik bot_data (users.json, orders.json — bot
+# yozadigan formatda) yasaladi va modul alohida jarayonda import qilinadi:
+#   eager       — OBMEN_LAZY_LOAD=0: users/orders to'liq json.load
+#   lazy-first  — birinchi ishga tushish: JSON -> .snap ko'chirish
+#   lazy        — keyingi ishga tushishlar: faqat mmap + kalitlar indeksi
+# Har jarayon import vaqti, RSS va decode qilingan buyurtmalar sonini qaytaradi.
+# anon — heap (RssAnon); lazy rejimda RSS ning qolgani mmap sahifalari (page cache, qaytariladigan).
+#   python bench/bench_cold_start.py [--sizes 10000,100000,1000000] [--pending 0.02]
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import CURRENCIES, ROOT, prepare_data_dir  # noqa: E402
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import obmen_bot_full as app
+elapsed = time.perf_counter() - started
+mem = {}
+with open("/proc/self/status") as f:
+    for line in f:
+        if line.startswith(("VmRSS:", "RssAnon:")):
+            mem[line.split(":")[0]] = int(line.split()[1]) / 1024
+decoded = app.orders.stats()["decoded"] if hasattr(app.orders, "stats") else len(app.orders)
+print(json.dumps({"import_s": round(elapsed, 3), "rss_mb": round(mem.get("VmRSS", 0), 1),
+                  "anon_mb": round(mem.get("RssAnon", 0), 1), "orders": len(app.orders),
+                  "users": len(app.users), "pending": len(app.pending), "decoded_orders": decoded}))
+"""
+
+
+def build_data(size: int, pending_share: float, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    data_dir = prepare_data_dir(CURRENCIES)
+    now = int(time.time())
+    users_count = max(size // 5, 1)
+    orders, users = {}, {}
+    for n in range(size):
+        uid = 100000 + rnd.randrange(users_count)
+        oid = f"{now - size + n}{n % 1000:03d}"
+        status = "waiting_admin" if rnd.random() < pending_share else rnd.choice(("✅ Tasdiqlandi", "❌ Bekor qilindi"))
+        orders[oid] = {
+            "id": oid, "user_id": uid, "currency": rnd.choice(list(CURRENCIES)),
+            "amount": round(rnd.uniform(1, 500), 2), "wallet": f"UQ{rnd.getrandbits(128):032x}",
+            "type": rnd.choice(("buy", "sell")), "status": status, "created_at": now - size + n,
+            "rate": 12600, "photo_file_id": f"AgAC{rnd.getrandbits(160):040x}", "document_file_id": None,
+        }
+        user = users.setdefault(str(uid), {"name": f"User {uid}", "username": f"user{uid}", "orders": []})
+        user["orders"].append(oid)
+    # Bot o'zi yozadigan formatda (PersistenceService: ixcham JSON)
+    for name, data in (("orders.json", orders), ("users.json", users)):
+        with open(os.path.join(data_dir, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    return data_dir
+
+
+def start(data_dir: str, lazy: bool) -> dict:
+    env = dict(os.environ, OBMEN_DATA_DIR=data_dir, OBMEN_BOT_TOKEN="123456:" + "B" * 35,
+               OBMEN_LAZY_LOAD="1" if lazy else "0", OBMEN_STORAGE="json", OBMEN_METRICS_PORT="0",
+               OBMEN_STALL_MS="0")
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ishga tushish vaqti: eager va lazy yuklash")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--pending", type=float, default=0.02, help="kutilayotgan buyurtmalar ulushi")
+    parser.add_argument("--out", default=None, help="natija JSON fayli")
+    args = parser.parse_args()
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        data_dir = build_data(size, args.pending)
+        try:
+            json_mb = sum(os.path.getsize(os.path.join(data_dir, n)) for n in ("orders.json", "users.json")) / 2 ** 20
+            row = {"orders": size, "json_mb": round(json_mb, 1), "eager": start(data_dir, lazy=False),
+                   "lazy_first": start(data_dir, lazy=True), "lazy": start(data_dir, lazy=True)}
+            row["snap_mb"] = round(sum(os.path.getsize(os.path.join(data_dir, n))
+                                       for n in ("orders.snap", "users.snap")) / 2 ** 20, 1)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+        results.append(row)
+        print(f"{size:>9,} buyurtma ({row['json_mb']} MB JSON, {row['snap_mb']} MB snap):")
+        for mode in ("eager", "lazy_first", "lazy"):
+            r = row[mode]
+            print(f"   {mode:<11} import {r['import_s']:>7.3f} s  RSS {r['rss_mb']:>7.1f} MB (anon {r['anon_mb']:>7.1f})  "
+                  f"decode qilingan: {r['decoded_orders']:,}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# bench_e2e.py — obmen_bot_full.py ni soxta Bot API bilan oxirigacha yuklama sinovi
+# -*- coding: utf-8 -*-
+# Vaqtinchalik bot_data va mahalliy soxta Bot API (fake_bot_api.py) bilan haqiqiy
+# Dispatcher ishga tushiriladi. Minglab foydalanuvchi to'liq BuyFSM / SellFSM
+# yo'lidan o'tadi (valyuta → miqdor → hamyon → chek yuborish → rasm), admin esa
+# har bir buyurtmani tasdiqlaydi. Natija JSON faylga yoziladi — o'zgarishlar
+# orasida solishtirish uchun:
+#   python bench/bench_e2e.py [--users 2000] [--concurrency 200] [--storage json|sqlite]
+#                             [--api-latency 0.0] [--out natija.json]
+# Chiquvchi xabar limitlari (OBMEN_SEND_*) sukut bo'yicha ochib qo'yiladi —
+# o'lchanadigan narsa bot kodi, Telegram limitlari emas (--keep-limits bilan yoqiladi).
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi, order_callback  # noqa: E402
+from harness import (ADMIN_ID, CURRENCIES, ROOT, boot_bot, dir_size, git_revision, io_write_bytes,  # noqa: E402
+                     peak_rss_mb, percentiles, prepare_data_dir, rss_mb, shutdown_bot)
+
+
+class Driver:
+    def __init__(self, dp, types):
+        self.dp = dp
+        self.types = types
+        self.update_id = 0
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors = 0
+
+    def _next_id(self) -> int:
+        self.update_id += 1
+        return self.update_id
+
+    async def feed(self, step: str, payload: Dict[str, Any]):
+        update = self.types.Update(**{"update_id": self._next_id(), **payload})
+        started = time.perf_counter()
+        try:
+            # polling kabi: middlewarelar bilan, har update alohida vazifada
+            await asyncio.ensure_future(self.dp.updates_handler.notify(update))
+        except Exception:
+            self.errors += 1
+        self.latencies.setdefault(step, []).append((time.perf_counter() - started) * 1000)
+
+    def message(self, user_id: int, text: str = None, photo: str = None) -> Dict[str, Any]:
+        message: Dict[str, Any] = {
+            "message_id": self.update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": f"User {user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}", "username": f"user{user_id}"},
+        }
+        if text is not None:
+            message["text"] = text
+        if photo is not None:
+            message["photo"] = [{"file_id": photo, "file_unique_id": photo, "width": 800, "height": 600}]
+        return {"message": message}
+
+    async def user_flow(self, user_id: int, rnd: random.Random):
+        kind = rnd.choice(("buy", "sell"))
+        steps = [
+            ("start", "/start"),
+            ("menu", "💲 Sotib olish" if kind == "buy" else "💰 Sotish"),
+            ("currency", rnd.choice(list(CURRENCIES))),
+            ("amount", str(round(rnd.uniform(1, 50), 2))),
+            ("wallet", f"UQ{rnd.getrandbits(128):032x}"),
+            ("confirm", "✅ Chek yuborish"),
+        ]
+        for step, text in steps:
+            await self.feed(f"{kind}.{step}", self.message(user_id, text=text))
+        await self.feed(f"{kind}.upload", self.message(user_id, photo=f"receipt-{user_id}"))
+
+    async def admin_confirm(self, admin_message: Dict[str, Any]):
+        await self.feed("admin.confirm", {"callback_query": {
+            "id": str(self._next_id()),
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Admin"},
+            "chat_instance": "bench",
+            "message": admin_message,
+            "data": order_callback(admin_message),
+        }})
+
+
+async def run(args) -> Dict[str, Any]:
+    data_dir = prepare_data_dir(CURRENCIES)
+    api = FakeBotApi(ADMIN_ID, latency=args.api_latency)
+    rss_before_import = rss_mb()
+    app = await boot_bot(await api.start(), data_dir, ADMIN_ID, args.storage, args.keep_limits)
+    from aiogram import types
+    io_before = io_write_bytes()
+    rss_start = rss_mb()
+
+    driver = Driver(app.dp, types)
+    rnd = random.Random(args.seed)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one_user(n: int):
+        async with sem:
+            await driver.user_flow(100000 + n, random.Random(rnd.random()))
+
+    async def admin():
+        for _ in range(args.users):
+            message = await api.admin_orders.get()
+            await driver.admin_confirm(message)
+
+    started = time.perf_counter()
+    admin_task = asyncio.ensure_future(admin())
+    await asyncio.gather(*(one_user(n) for n in range(args.users)))
+    users_done = time.perf_counter() - started
+    try:
+        await asyncio.wait_for(admin_task, timeout=max(60.0, users_done))
+    except asyncio.TimeoutError:
+        print("⚠️ admin barcha buyurtmalarni tasdiqlab ulgurmadi")
+    elapsed = time.perf_counter() - started
+    rss_peak = rss_mb()
+
+    side_effects = app.side_effects.stats()
+    await shutdown_bot(app)
+    await api.stop()
+
+    all_latencies = [v for values in driver.latencies.values() for v in values]
+    updates = len(all_latencies)
+    confirmed = sum(1 for o in app.orders.values() if o.get("status") == "✅ Tasdiqlandi")
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "storage": args.storage,
+            "fsm_storage": app.FSM_STORAGE,
+            "api_latency_s": args.api_latency,
+            "send_limits": args.keep_limits,
+        },
+        "updates": updates,
+        "errors": driver.errors,
+        "orders_confirmed": confirmed,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "all": percentiles(all_latencies),
+            "by_step": {step: percentiles(values) for step, values in sorted(driver.latencies.items())},
+        },
+        "rss_mb": {
+            "before_import": rss_before_import,
+            "after_startup": rss_start,
+            "end": rss_peak,
+            "peak": peak_rss_mb(),
+        },
+        "bytes": {
+            "persistence_written": app.persistence.stats()["bytes_total"],
+            "process_write_bytes": io_write_bytes() - io_before,
+            "bot_data_size": dir_size(data_dir),
+        },
+        "persistence": app.persistence.stats(),
+        "side_effects": side_effects,
+        "outbound": app.outbound.stats(),
+        "fake_api": api.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Obmen bot uchun oxirigacha yuklama sinovi")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--storage", choices=("json", "sqlite"), default=os.getenv("OBMEN_STORAGE", "json"))
+    parser.add_argument("--api-latency", type=float, default=0.0, help="soxta Bot API javob kechikishi, s")
+    parser.add_argument("--keep-limits", action="store_true", help="OBMEN_SEND_* limitlarini o'zgartirmaslik")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="natija JSON fayli")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    out = args.out or os.path.join(ROOT, "bench", "results", f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    lat = results["latency_ms"]["all"]
+    print(f"{results['updates']:,} update, {results['elapsed_s']} s, {results['updates_per_s']:,} update/s, "
+          f"xatolar: {results['errors']}, tasdiqlangan: {results['orders_confirmed']}")
+    print(f"kechikish ms: p50 {lat.get('p50')}  p95 {lat.get('p95')}  p99 {lat.get('p99')}  max {lat.get('max')}")
+    print(f"RSS: {results['rss_mb']}")
+    print(f"yozilgan baytlar: {results['bytes']}")
+    print(f"natija: {out}")
+
+
+if __name__ == "__main__":
+    main()
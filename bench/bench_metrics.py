@@ -0,0 +1,75 @@
+# bench_metrics.py — metrikalar update boshiga qancha qo'shadi
+# -*- coding: utf-8 -*-
+# Bitta Dispatcher (bo'sh handler, FSM holati bilan) avval middlewaresiz, keyin
+# MetricsMiddleware bilan yuritiladi; farq — bitta update uchun metrikalar narxi.
+# Alohida: Histogram.observe va Counter.inc ning o'zi hamda /metrics matnini yasash.
+#   python bench/bench_metrics.py [updatelar_soni]
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+
+from metrics import BotMetrics, MetricsMiddleware  # noqa: E402
+
+
+def build(with_metrics: bool):
+    dp = Dispatcher(Bot(token="123456:" + "A" * 35), storage=MemoryStorage())
+    metrics = BotMetrics()
+    if with_metrics:
+        dp.middleware.setup(MetricsMiddleware(metrics))
+
+    @dp.message_handler(state="*")
+    async def handler(message: types.Message):
+        pass
+    return dp, metrics
+
+
+def update(n: int) -> types.Update:
+    return types.Update(**{"update_id": n, "message": {
+        "message_id": n, "date": 0, "text": "10",
+        "chat": {"id": 1000 + n % 100, "type": "private"},
+        "from": {"id": 1000 + n % 100, "is_bot": False, "first_name": "U"},
+    }})
+
+
+async def run(dp: Dispatcher, updates) -> float:
+    Dispatcher.set_current(dp)
+    started = time.perf_counter()
+    for u in updates:
+        await asyncio.ensure_future(dp.updates_handler.notify(u))
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+async def main(count: int):
+    updates = [update(n) for n in range(count)]
+    plain, _ = build(False)
+    observed, metrics = build(True)
+    for user in range(100):
+        await observed.storage.set_state(chat=1000 + user, user=1000 + user, state="BuyFSM:amount")
+        await plain.storage.set_state(chat=1000 + user, user=1000 + user, state="BuyFSM:amount")
+    # isitish
+    await run(plain, updates[:1000])
+    await run(observed, updates[:1000])
+    base = min([await run(plain, updates) for _ in range(3)])
+    with_metrics = min([await run(observed, updates) for _ in range(3)])
+    print(f"middlewaresiz:      {base:8.2f} µs/update")
+    print(f"MetricsMiddleware:  {with_metrics:8.2f} µs/update  (+{with_metrics - base:.2f} µs)")
+
+    hist, counter = metrics.handler_seconds, metrics.updates_total
+    started = time.perf_counter()
+    for n in range(count):
+        hist.observe(0.003, "handler")
+        counter.inc("message", "BuyFSM:amount")
+    print(f"observe + inc:      {(time.perf_counter() - started) / count * 1e6:8.2f} µs")
+    started = time.perf_counter()
+    size = len(metrics.registry.render())
+    print(f"/metrics matni:     {(time.perf_counter() - started) * 1e3:8.2f} ms ({size} bayt)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
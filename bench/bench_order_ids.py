@@ -0,0 +1,96 @@
+# bench_order_ids.py — OrderIdAllocator uchun stress sinovi
+# -*- coding: utf-8 -*-
+# Bir nechta thread va asyncio vazifalari bir vaqtda millionlab ID oladi;
+# takror yoki kamayuvchi ID bo'lsa skript xato bilan tugaydi.
+#   python bench/bench_order_ids.py [jami_soni] [threadlar]
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_ids import OrderIdAllocator  # noqa: E402
+
+
+def check_monotonic(ids, label):
+    for a, b in zip(ids, ids[1:]):
+        if b <= a:
+            raise SystemExit(f"❌ {label}: ID kamaydi ({a} -> {b})")
+
+
+def run_threads(allocator, total, threads):
+    per_thread = total // threads
+    results = [None] * threads
+
+    def worker(i):
+        results[i] = [allocator.next_int() for _ in range(per_thread)]
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    for i, ids in enumerate(results):
+        check_monotonic(ids, f"thread {i}")
+    return [x for ids in results for x in ids]
+
+
+def run_tasks(allocator, total, tasks):
+    per_task = total // tasks
+
+    async def worker():
+        ids = []
+        for n in range(per_task):
+            ids.append(allocator.next_int())
+            if n % 1000 == 0:
+                await asyncio.sleep(0)
+        return ids
+
+    async def main():
+        return await asyncio.gather(*(worker() for _ in range(tasks)))
+
+    results = asyncio.run(main())
+    for i, ids in enumerate(results):
+        check_monotonic(ids, f"task {i}")
+    return [x for ids in results for x in ids]
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    with tempfile.TemporaryDirectory() as tmp:
+        hwm = os.path.join(tmp, "order_id.hwm")
+        allocator = OrderIdAllocator(hwm)
+
+        started = time.perf_counter()
+        ids = run_threads(allocator, total, threads)
+        elapsed = time.perf_counter() - started
+        print(f"threadlar: {len(ids):,} ID, {len(ids) / elapsed:,.0f} ID/s")
+
+        started = time.perf_counter()
+        ids += run_tasks(allocator, total // 2, 100)
+        elapsed = time.perf_counter() - started
+        print(f"asyncio:   {total // 2:,} ID, {(total // 2) / elapsed:,.0f} ID/s")
+
+        # qayta ishga tushirish: yangi obyekt avvalgi barcha ID lardan katta ID berishi kerak
+        last = max(ids)
+        restarted = OrderIdAllocator(hwm)
+        after = [restarted.next_int() for _ in range(100_000)]
+        check_monotonic(after, "restart")
+        if after[0] <= last:
+            raise SystemExit(f"❌ restart: {after[0]} <= {last}")
+        ids += after
+
+        unique = len(set(ids))
+        longest = max(len(str(x)) for x in ids)
+        print(f"jami: {len(ids):,} ID, takrorlar: {len(ids) - unique}, eng uzun ID: {longest} belgi")
+        if unique != len(ids):
+            raise SystemExit("❌ takroriy ID topildi")
+        print("✅ takroriy ID yo'q")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench_rate_history.py — RateHistory: nuqta bo'yicha so'rov va kunlik agregatlar
+# -*- coding: utf-8 -*-
+# Sintetik tarix (har N soniyada kurs o'zgaradi) ustun fayllariga to'g'ridan-to'g'ri
+# yoziladi, keyin mmap orqali ochilib at() va daily() vaqti o'lchanadi.
+#   python bench/bench_rate_history.py [o'zgarishlar_soni] [kunlar]
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rate_history import RateHistory  # noqa: E402
+
+
+def build(directory: str, count: int, step: int) -> int:
+    rnd = random.Random(1)
+    end = int(time.time())
+    ts = array("q", range(end - count * step, end, step))
+    buy = array("d", (12000 + rnd.uniform(-300, 300) for _ in range(count)))
+    sell = array("d", (b + rnd.uniform(100, 400) for b in buy))
+    for name, column in (("ts", ts), ("buy", buy), ("sell", sell)):
+        with open(os.path.join(directory, f"USDT.{name}"), "wb") as f:
+            column.tofile(f)
+    return end
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    directory = tempfile.mkdtemp(prefix="obmen-rates-")
+    try:
+        end = build(directory, count, step=60)
+        started = time.perf_counter()
+        series = RateHistory(directory).series("USDT")
+        print(f"{len(series):,} o'zgarishli tarix ochildi: {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        rnd = random.Random(2)
+        probes = [rnd.randrange(end - count * 60, end) for _ in range(100_000)]
+        started = time.perf_counter()
+        for ts in probes:
+            series.at(ts)
+        elapsed = time.perf_counter() - started
+        print(f"at(): {elapsed / len(probes) * 1e6:.2f} µs / so'rov")
+
+        started = time.perf_counter()
+        daily = series.daily(days, now=end, tz_offset=5 * 3600)
+        elapsed = time.perf_counter() - started
+        changes = sum(d["changes"] for _, d in daily)
+        print(f"daily({days}): {elapsed * 1000:.1f} ms ({changes:,} o'zgarish ko'rildi, {len(daily)} kun)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
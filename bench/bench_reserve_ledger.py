@@ -0,0 +1,89 @@
+# bench_reserve_ledger.py — ReserveLedger ni minglab parallel buyurtmalar bilan tekshirish
+# -*- coding: utf-8 -*-
+# Har bir "xaridor" buy_amount dagi kabi avval mavjud miqdorni tekshiradi, biroz
+# kutadi (foydalanuvchi hamyon va chek yuboradi), keyin place() qiladi. Admin
+# tasodifiy tasdiqlaydi / bekor qiladi, ba'zi bandlar muddati o'tib bo'shaydi.
+# Oxirida invariantlar tekshiriladi: zaxira manfiy emas, band qilingan jami
+# holds bilan mos, tasdiqlangan jami boshlang'ich zaxiradan oshmaydi.
+#   python bench/bench_reserve_ledger.py [buyurtmalar_soni]
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reserve_ledger import ReserveLedger, EPSILON  # noqa: E402
+
+CURRENCIES = {"USDT": 1000.0, "BTC": 2.5, "TON": 300.0}
+
+
+def check(ledger, committed, initial):
+    for cur in CURRENCIES:
+        held = round(sum(h["amount"] for h in ledger.holds.values() if h["currency"] == cur), 8)
+        assert abs(held - ledger.held(cur)) < 1e-6, (cur, held, ledger.held(cur))
+        assert ledger.reserves[cur] >= -EPSILON, (cur, ledger.reserves[cur])
+        assert ledger.available(cur) >= 0, cur
+        assert committed[cur] <= initial[cur] + 1e-6, (cur, committed[cur], initial[cur])
+        assert abs(initial[cur] - committed[cur] - ledger.reserves[cur]) < 1e-6, cur
+
+
+async def simulate(count: int, seed: int = 1):
+    rnd = random.Random(seed)
+    writes = {"n": 0}
+
+    def save(path, data):
+        writes["n"] += 1
+
+    initial = dict(CURRENCIES)
+    ledger = ReserveLedger(dict(CURRENCIES), {}, save, "reserves.json", "holds.json", ttl=0.05)
+    committed = {cur: 0.0 for cur in CURRENCIES}
+    stats = {"rejected_at_check": 0, "rejected_at_place": 0, "placed": 0, "confirmed": 0,
+             "confirm_refused": 0, "cancelled": 0, "expired": 0}
+
+    async def buyer(n: int):
+        cur = rnd.choice(list(CURRENCIES))
+        amount = round(rnd.uniform(0.01, CURRENCIES[cur] / 20), 4)
+        if amount > ledger.available(cur):
+            stats["rejected_at_check"] += 1
+            return
+        await asyncio.sleep(rnd.uniform(0, 0.01))
+        order_id = str(n)
+        if not ledger.place(order_id, cur, amount):
+            stats["rejected_at_place"] += 1
+            return
+        stats["placed"] += 1
+        await asyncio.sleep(rnd.uniform(0, 0.08))
+        if rnd.random() < 0.7:
+            if ledger.commit(order_id, cur, amount):
+                committed[cur] += amount
+                stats["confirmed"] += 1
+            else:
+                stats["confirm_refused"] += 1
+        elif ledger.release(order_id):
+            stats["cancelled"] += 1
+
+    async def expirer():
+        while True:
+            stats["expired"] += len(ledger.expire())
+            check(ledger, committed, initial)
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    sweeper = asyncio.get_running_loop().create_task(expirer())
+    await asyncio.gather(*(buyer(n) for n in range(count)))
+    sweeper.cancel()
+    stats["expired"] += len(ledger.expire(time.time() + 3600))
+    check(ledger, committed, initial)
+    elapsed = time.perf_counter() - started
+    print(f"{count:,} buyurtma, {elapsed:.2f} s, saqlashlar: {writes['n']:,}")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+    for cur, row in ledger.stats().items():
+        print(f"  {cur}: boshlang'ich {initial[cur]}, tasdiqlangan {round(committed[cur], 4)}, qoldiq {row}")
+    print("✅ invariantlar buzilmadi")
+
+
+if __name__ == "__main__":
+    asyncio.run(simulate(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,154 @@
+# bench_router.py — tugma marshrutlash narxi: filtrlar zanjiri va ButtonRouter
+# -*- coding: utf-8 -*-
+# Ikkita Dispatcher yig'iladi: birida menyu tugmalari eski usulda (har biri
+# o'z lambda/text filtri bilan), ikkinchisida ButtonRouter orqali. Qolgan
+# handlerlar (FSM qadamlari, buyruqlar, unknown) ikkalasida bir xil.
+# Handlerlar hech narsa qilmaydi — o'lchanadigan narsa faqat update ni
+# to'g'ri handlerga yetkazish vaqti.
+#   python bench/bench_router.py [updatelar_soni]
+import os
+import sys
+import time
+import random
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+from aiogram.dispatcher.filters.state import State, StatesGroup  # noqa: E402
+
+from router import ButtonRouter  # noqa: E402
+
+MAIN_MENU = [
+    "📉 Sotish kursi", "📈 Sotib olish kursi", "🕒 Ish vaqti", "💳 Karta va kripto zaxiralari",
+    "📖 Foydalanish qo'llanmasi", "📋 Mening buyurtmalarim", "💲 Sotib olish", "💰 Sotish",
+    "⚙️ Admin Panel", "📨 Adminga xabar yuborish",
+]
+ADMIN_MENU = [
+    "➕ Valyuta qo‘shish", "✏️ Valyutani tahrirlash", "🗑️ Valyutani o‘chirish", "📄 Valyutalar ro‘yxati",
+    "📦 Kripto zaxiralari", "💳 Karta balansi", "🎥 Qo'llanma sozlamalari", "📩 Foydalanuvchilarga xabar",
+]
+
+
+class BuyFSM(StatesGroup):
+    choose_currency = State()
+    amount = State()
+    wallet = State()
+    confirm = State()
+    upload = State()
+
+
+class SellFSM(StatesGroup):
+    choose_currency = State()
+    amount = State()
+    wallet = State()
+    confirm = State()
+    upload = State()
+
+
+class AdminFSM(StatesGroup):
+    main = State()
+    add_choose_code = State()
+    edit_choose_currency = State()
+    reserves_set_amount = State()
+
+
+hits = {}
+
+
+def handler(name):
+    async def handle(message: types.Message):
+        hits[name] = hits.get(name, 0) + 1
+    return handle
+
+
+def build(use_router: bool) -> Dispatcher:
+    bot = Bot(token="123456:" + "A" * 35)
+    dp = Dispatcher(bot, storage=MemoryStorage())
+    if use_router:
+        router = ButtonRouter()
+        router.register(dp)
+        for text in MAIN_MENU:
+            router.button(text)(handler(text))
+        for text in ADMIN_MENU:
+            router.button(text, state=AdminFSM.main)(handler(text))
+    else:
+        # eski zanjir: obmen_bot_full.py dagi tartib va filtr turlari
+        dp.register_message_handler(handler(MAIN_MENU[0]), lambda m: "Sotish kursi" in m.text)
+        dp.register_message_handler(handler(MAIN_MENU[1]), lambda m: "Sotib olish kursi" in m.text)
+        for text in MAIN_MENU[2:6]:
+            dp.register_message_handler(handler(text), text=text)
+    dp.register_message_handler(handler("start"), commands=["start", "help"])
+    if not use_router:
+        for text in MAIN_MENU[6:8]:
+            dp.register_message_handler(handler(text), lambda m, t=text: m.text == t)
+    for group in (BuyFSM, SellFSM):
+        for state in group.all_states:
+            dp.register_message_handler(handler(state.state), state=state)
+    if not use_router:
+        dp.register_message_handler(handler(MAIN_MENU[8]), lambda m: m.text == MAIN_MENU[8])
+        for text in ADMIN_MENU:
+            dp.register_message_handler(handler(text), lambda m, t=text: m.text == t, state=AdminFSM.main)
+    for state in AdminFSM.all_states[1:]:
+        dp.register_message_handler(handler(state.state), state=state)
+    if not use_router:
+        dp.register_message_handler(handler(MAIN_MENU[9]), lambda m: m.text == MAIN_MENU[9])
+    dp.register_message_handler(handler("unknown"))
+    return dp
+
+
+def make_update(n: int, user_id: int, text: str) -> types.Update:
+    return types.Update(**{
+        "update_id": n,
+        "message": {
+            "message_id": n,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+            "text": text,
+        },
+    })
+
+
+async def run(dp: Dispatcher, updates) -> float:
+    started = time.perf_counter()
+    for update in updates:
+        # polling/webhook kabi: har update o'z vazifasida (FSM holati keshi update ga xos)
+        await asyncio.ensure_future(dp.process_update(update))
+    return time.perf_counter() - started
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    rnd = random.Random(1)
+    admin_id = 999
+    # 90% — holatsiz foydalanuvchilar menyu tugmalarini bosadi, 10% — admin panelda
+    updates = []
+    for n in range(count):
+        if rnd.random() < 0.9:
+            text = rnd.choice(MAIN_MENU + ["salom"])
+            updates.append(make_update(n, 1000 + n % 500, text))
+        else:
+            updates.append(make_update(n, admin_id, rnd.choice(ADMIN_MENU)))
+
+    results = {}
+    for name, use_router in (("zanjir", False), ("router", True)):
+        dp = build(use_router)
+        Dispatcher.set_current(dp)
+        Bot.set_current(dp.bot)
+        await dp.storage.set_state(chat=admin_id, user=admin_id, state=AdminFSM.main.state)
+        hits.clear()
+        await run(dp, updates[:1000])  # isinish
+        hits.clear()
+        elapsed = await run(dp, updates)
+        results[name] = (elapsed, dict(hits))
+        print(f"{name:7s}: {elapsed / count * 1e6:8.1f} µs/update, {count / elapsed:,.0f} update/s")
+
+    if results["zanjir"][1] != results["router"][1]:
+        raise SystemExit(f"❌ marshrutlar farq qildi:\n{results['zanjir'][1]}\n{results['router'][1]}")
+    print(f"✅ bir xil marshrutlar, tezlashish: {results['zanjir'][0] / results['router'][0]:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+# bench_scaleout.py — ko'p jarayonli rejim (scaleout.py) ning 1/2/4/8 ishchidagi o'tkazuvchanligi
+# -*- coding: utf-8 -*-
+# bench_e2e.py dagi foydalanuvchi yo'llari (BuyFSM / SellFSM + admin tasdig'i)
+# haqiqiy Front orqali yuboriladi: update -> unix socket -> ishchi jarayon
+# (obmen_bot_full.py, OBMEN_ROLE=worker) -> javob. Kechikish — front update ni
+# yuborgandan ishchi qayta ishlab javob berguncha. Har ishchilar soni uchun
+# yangi bot_data va soxta Bot API.
+#   python bench/bench_scaleout.py [--workers 1,2,4,8] [--users 2000] [--concurrency 200]
+# Natija faqat yadrolar soni yetarli bo'lsa o'sadi (os.cpu_count() natijada yoziladi).
+import os
+import sys
+import json
+import time
+import sqlite3
+import random
+import asyncio
+import argparse
+import platform
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_e2e import Driver  # noqa: E402
+from fake_bot_api import FakeBotApi  # noqa: E402
+from harness import ADMIN_ID, CURRENCIES, ROOT, git_revision, percentiles, prepare_data_dir  # noqa: E402
+
+# Ishchi: bot moduli + ish vaqti tekshiruvi o'chirilgan (harness.boot_bot dagidek)
+WORKER = """
+import obmen_bot_full as app
+app.is_working_hours = lambda: True
+app.run_worker(app.dp, app.WORKER_SOCKET, on_startup=app.on_startup, on_shutdown=app.on_shutdown,
+               workers=app.WEBHOOK_WORKERS, queue_size=app.WEBHOOK_QUEUE_SIZE)
+"""
+
+
+class FrontDriver(Driver):
+    def __init__(self, front):
+        super().__init__(None, None)
+        self.front = front
+
+    async def feed(self, step: str, payload: Dict[str, Any]):
+        update = {"update_id": self._next_id(), **payload}
+        started = time.perf_counter()
+        try:
+            ack = await (await self.front.submit(update))
+            if not ack["ok"]:
+                self.errors += 1
+        except Exception:
+            self.errors += 1
+        self.latencies.setdefault(step, []).append((time.perf_counter() - started) * 1000)
+
+
+def confirmed_orders(data_dir: str) -> int:
+    conn = sqlite3.connect(os.path.join(data_dir, "bot.db"))
+    try:
+        return conn.execute("SELECT COUNT(*) FROM orders WHERE status = ?", ("✅ Tasdiqlandi",)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+async def run_once(workers: int, args) -> Dict[str, Any]:
+    from repository import migrate_json
+    from scaleout import Front
+
+    data_dir = prepare_data_dir(CURRENCIES)
+    api = FakeBotApi(ADMIN_ID, latency=args.api_latency)
+    env = dict(os.environ, OBMEN_DATA_DIR=data_dir, OBMEN_API_SERVER=await api.start(),
+               OBMEN_BOT_TOKEN="123456:" + "B" * 35, OBMEN_ADMIN_ID=str(ADMIN_ID), OBMEN_METRICS_PORT="0",
+               OBMEN_SEND_RATE="1000000", OBMEN_SEND_PRIVATE_RATE="1000000", OBMEN_SEND_CHANNEL_RATE="1000000")
+    migrate_json(data_dir).close()
+    front = Front(workers, os.path.join(data_dir, "workers"), command=[sys.executable, "-c", WORKER], env=env)
+    boot_started = time.perf_counter()
+    await front.start()
+    boot_s = time.perf_counter() - boot_started
+
+    driver = FrontDriver(front)
+    rnd = random.Random(args.seed)
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one_user(n: int):
+        async with sem:
+            await driver.user_flow(100000 + n, random.Random(rnd.random()))
+
+    async def admin():
+        for _ in range(args.users):
+            message = await api.admin_orders.get()
+            await driver.admin_confirm(message)
+
+    started = time.perf_counter()
+    admin_task = asyncio.ensure_future(admin())
+    await asyncio.gather(*(one_user(n) for n in range(args.users)))
+    try:
+        await asyncio.wait_for(admin_task, timeout=120)
+    except asyncio.TimeoutError:
+        print("⚠️ admin barcha buyurtmalarni tasdiqlab ulgurmadi")
+    elapsed = time.perf_counter() - started
+    per_worker = front.stats()
+    await front.stop()
+    await api.stop()
+
+    all_latencies = [v for values in driver.latencies.values() for v in values]
+    return {
+        "workers": workers,
+        "boot_s": round(boot_s, 2),
+        "updates": len(all_latencies),
+        "errors": driver.errors,
+        "orders_confirmed": confirmed_orders(data_dir),
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": percentiles(all_latencies),
+        "per_worker": per_worker,
+        "fake_api": api.stats(),
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    results = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        row = await run_once(workers, args)
+        results.append(row)
+        lat = row["latency_ms"]
+        print(f"{workers} ishchi: {row['updates']:,} update, {row['elapsed_s']} s, {row['updates_per_s']:,} update/s, "
+              f"p50 {lat.get('p50')} ms, p99 {lat.get('p99')} ms, xatolar: {row['errors']}, "
+              f"tasdiqlangan: {row['orders_confirmed']}")
+    return {
+        "meta": {"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "cpu_count": os.cpu_count(), "users": args.users,
+                 "concurrency": args.concurrency, "api_latency_s": args.api_latency},
+        "runs": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ko'p jarayonli rejimda yuklama sinovi")
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="soxta Bot API javob kechikishi, s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="natija JSON fayli")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    out = args.out or os.path.join(ROOT, "bench", "results", f"scaleout-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"natija: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# bench_segments.py — SegmentIndex: qurish, xotira va segment ifodalari vaqti
+# -*- coding: utf-8 -*-
+# Sintetik foydalanuvchilar (qo'shilgan sanasi, ba'zilari bloklagan) va buyurtmalar
+# (oxirgi `kunlar` kun ichida) bir marta indekslanadi, keyin tayyor segmentlar
+# hisoblanadi va yuborish ro'yxati (members) olinadi.
+# Solishtirish uchun: har so'rovda foydalanuvchi va buyurtmalarni to'liq ko'rib chiqish (eski usul).
+#   python bench/bench_segments.py [foydalanuvchilar_soni] [buyurtmalar_soni] [kunlar]
+import os
+import sys
+import time
+import random
+import asyncio
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segments import DAY, SegmentIndex  # noqa: E402
+
+TZ = 5 * 3600
+CODES = ["USDT", "BTC", "TON", "TRX", "ETH"]
+
+
+def make_users(count: int, days: int, now: int):
+    rnd = random.Random(1)
+    users = []
+    for i in range(count):
+        user = {"joined_at": now - rnd.randrange(days * DAY)}
+        if rnd.random() < 0.3:
+            user["last_seen"] = now - rnd.randrange(30 * DAY)
+        if rnd.random() < 0.05:
+            user["blocked_at"] = now - rnd.randrange(days * DAY)
+        users.append((100_000_000 + i * 7, user))
+    return users
+
+
+def make_orders(users, count: int, days: int, now: int):
+    rnd = random.Random(2)
+    orders = []
+    for i in range(count):
+        created = now - rnd.randrange(days * DAY)
+        orders.append({"id": str(i), "user_id": rnd.choice(users)[0], "currency": rnd.choice(CODES),
+                       "type": rnd.choice(("buy", "sell")), "created_at": created,
+                       "status": rnd.choice(("✅ Tasdiqlandi", "✅ Tasdiqlandi", "❌ Bekor qilindi")),
+                       "reviewed_at": created + rnd.randrange(3600)})
+    return orders
+
+
+def timed(label: str, fn, repeat: int = 20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"{label}: {(time.perf_counter() - started) / repeat * 1000:.2f} ms")
+    return result
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    order_count = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else 365
+    now = int(time.time())
+    users = make_users(count, days, now)
+    orders = make_orders(users, order_count, days, now)
+
+    index = SegmentIndex(window_days=90, tz_offset=TZ)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    await index.build(users, orders)
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    bitmaps = sum(len(b) for b in index._bitmaps.values())
+    days_size = sum(a.itemsize * len(a) for a in index._days.values())
+    print(f"{count:,} foydalanuvchi, {order_count:,} buyurtma: qurish {index.build_s:.2f} s, "
+          f"bitmaplar {bitmaps / 1e6:.1f} MB, kunlik ro'yxatlar {days_size / 1e6:.1f} MB "
+          f"(RSS cho'qqisi +{(rss_peak - rss_before) / 1024:.0f} MB)")
+
+    for expression in ("all & !blocked", "ordered & !blocked", "!ordered & !blocked", "active:7 & !blocked",
+                       "active:30 & !blocked", "buy:USDT:30 & !blocked", "(buy:USDT | buy:TON) & !sell:USDT & !blocked"):
+        bits = timed(f"evaluate({expression})", lambda: index.evaluate(expression))
+        print(f"  {index.count(bits):,} foydalanuvchi")
+    targets = timed("members(active:30 & !blocked)", lambda: index.members(index.evaluate("active:30 & !blocked")), 5)
+    print(f"  {len(targets):,} user_id")
+
+    rnd = random.Random(3)
+    sample = orders[:100_000]
+    started = time.perf_counter()
+    for order in sample:
+        index.record_order(order, rnd.choice(("new", "ok")), now)
+    print(f"record_order(): {(time.perf_counter() - started) / len(sample) * 1e6:.2f} µs / hodisa")
+
+    # eski usul: "30 kunda USDT olgan, bloklamagan" — har so'rovda barcha ma'lumotni ko'rib chiqish
+    started = time.perf_counter()
+    blocked = {uid for uid, user in users if user.get("blocked_at")}
+    # segmentlar kabi: bugun + oldingi 29 kalendar kun (mahalliy vaqt)
+    cutoff = (index.day(now) - 29) * DAY - TZ
+    found = {o["user_id"] for o in orders if o["status"] == "✅ Tasdiqlandi" and o["type"] == "buy"
+             and o["currency"] == "USDT" and o["reviewed_at"] >= cutoff} - blocked
+    print(f"to'liq skan (buy:USDT:30 & !blocked): {(time.perf_counter() - started) * 1000:.1f} ms ({len(found):,})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
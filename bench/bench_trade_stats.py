@@ -0,0 +1,72 @@
+# bench_trade_stats.py — TradeStats: hodisa yozish, /stats hisoboti va tarixdan qayta qurish
+# -*- coding: utf-8 -*-
+# Sintetik buyurtmalar (oxirgi `kunlar` kun ichida) bir marta qayta quriladi, keyin
+# record() va summary() vaqti buyurtmalarni to'liq ko'rib chiqish bilan solishtiriladi.
+#   python bench/bench_trade_stats.py [buyurtmalar_soni] [kunlar]
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade_stats import DAY, TradeStats  # noqa: E402
+
+TZ = 5 * 3600
+
+
+def make_orders(count: int, days: int, now: int):
+    rnd = random.Random(1)
+    codes = ["USDT", "BTC", "TON", "TRX", "ETH"]
+    for i in range(count):
+        created = now - rnd.randrange(days * DAY)
+        yield {"id": str(i), "currency": rnd.choice(codes), "type": rnd.choice(("buy", "sell")),
+               "amount": round(rnd.uniform(1, 500), 2), "rate": 12500.0, "created_at": created,
+               "status": rnd.choice(("✅ Tasdiqlandi", "✅ Tasdiqlandi", "❌ Bekor qilindi", "waiting_admin")),
+               "reviewed_at": created + rnd.randrange(3600)}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    now = int(time.time())
+    orders = list(make_orders(count, days, now))
+
+    stats = TradeStats(tz_offset=TZ)
+    started = time.perf_counter()
+    stats.rebuild(orders)
+    print(f"{count:,} buyurtmadan qayta qurish: {time.perf_counter() - started:.2f} s, {len(stats.rows()):,} qator")
+
+    sample = orders[:100_000]
+    started = time.perf_counter()
+    for order in sample:
+        stats.record(order, "ok", now)
+    print(f"record(): {(time.perf_counter() - started) / len(sample) * 1e6:.2f} µs / hodisa")
+
+    today = stats.day_start(now)
+    for label, grain, start in (("bugun", "d", today), ("30 kun", "d", today - 29 * DAY),
+                                ("365 kun", "d", today - 364 * DAY), ("24 soat", "h", now // 3600 * 3600 - 23 * 3600)):
+        started = time.perf_counter()
+        stats.summary(grain, start, today + DAY)
+        print(f"summary({label}): {(time.perf_counter() - started) * 1000:.3f} ms")
+
+    # taqqoslash uchun: har hisobotda barcha buyurtmalarni ko'rib chiqish
+    started = time.perf_counter()
+    cutoff = today - 29 * DAY
+    total = 0.0
+    for order in orders:
+        if order["status"] == "✅ Tasdiqlandi" and order["reviewed_at"] >= cutoff:
+            total += order["amount"] * order["rate"]
+    print(f"to'liq skan (30 kun): {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".trade_stats_bench.json")
+    try:
+        started = time.perf_counter()
+        size = stats.write_atomic(path)
+        print(f"fayl: {size / 1024:.1f} KB, yozish {(time.perf_counter() - started) * 1000:.1f} ms")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_user_index.py — UserIndex: qurish, xotira va /find qidiruvi vaqti
+# -*- coding: utf-8 -*-
+# Sintetik foydalanuvchilar (ism + familiya, ba'zilarida username) bir marta
+# indekslanadi, keyin aniq username, ism prefiksi va ikki so'zli so'rovlar o'lchanadi.
+# Solishtirish uchun: users lug'atini to'liq ko'rib chiqish (eski usul).
+#   python bench/bench_user_index.py [foydalanuvchilar_soni]
+import os
+import sys
+import time
+import random
+import asyncio
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from user_index import UserIndex, normalize  # noqa: E402
+
+FIRST = ["Ali", "Vali", "Aziz", "Jasur", "Dilshod", "Sardor", "Bekzod", "Nodira", "Gulnora", "Madina", "Shahzod",
+         "Otabek", "Jahongir", "Sevara", "Kamola", "Zarina", "Rustam", "Timur", "Aleksandr", "Olga", "Ra'no", "O‘g‘iloy"]
+LAST = ["Karimov", "Rahimov", "Toshmatov", "Aliyev", "Valiyev", "Yusupov", "Ismoilov", "Qodirov", "Sobirov",
+        "Nazarov", "Xolmatov", "Ergashev", "Saidov", "Mirzayev", "Abdullayev", "Petrov"]
+
+
+def make_users(count: int):
+    rnd = random.Random(1)
+    users = {}
+    for i in range(count):
+        uid = 100_000_000 + i * 7
+        name = f"{rnd.choice(FIRST)} {rnd.choice(LAST)}{rnd.randrange(100) if rnd.random() < 0.3 else ''}"
+        username = f"user{uid:x}" if rnd.random() < 0.6 else ""
+        users[str(uid)] = {"id": uid, "name": name, "username": username}
+    return users
+
+
+def timed(label: str, fn, repeat: int = 200):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    print(f"{label}: {(time.perf_counter() - started) / repeat * 1000:.3f} ms")
+    return result
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = make_users(count)
+    rows = [(int(k), u["name"], u["username"]) for k, u in users.items()]
+
+    index = UserIndex()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    await index.build(rows)
+    elapsed = time.perf_counter() - started
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    size = sys.getsizeof(index._base.blob) + index._base.offsets.itemsize * len(index._base.offsets) \
+        + index._base.uids.itemsize * len(index._base.uids)
+    print(f"{count:,} foydalanuvchi: qurish {elapsed:.2f} s, {len(index):,} kalit, "
+          f"indeks {size / 1e6:.1f} MB (qurishda RSS cho'qqisi +{(rss_peak - rss_before) / 1024:.0f} MB)")
+
+    lookup = lambda uid: users.get(str(uid))  # noqa: E731
+    some = users[str(100_000_000 + 7 * (count // 2))]
+    handle = some["username"] or "user5f5e100"
+    timed(f"aniq @username ({handle})", lambda: index.search("@" + handle, lookup))
+    timed("aniq ID", lambda: index.search(str(some["id"]), lookup))
+    matches, cut = timed("bitta so'z prefiksi ('dilsh')", lambda: index.search("dilsh", lookup))
+    print(f"  {len(matches)} natija, chegaralangan: {cut}")
+    matches, cut = timed("ikki so'z ('sardor qodirov7')", lambda: index.search("sardor qodirov7", lookup))
+    print(f"  {len(matches)} natija, chegaralangan: {cut}")
+    timed("yo'q ism ('zzzz')", lambda: index.search("zzzz", lookup))
+
+    rnd = random.Random(3)
+    started = time.perf_counter()
+    for i in range(20_000):
+        index.add(900_000_000 + i, f"{rnd.choice(FIRST)} {rnd.choice(LAST)}", f"new{i}")
+    print(f"add(): {(time.perf_counter() - started) / 20_000 * 1e6:.1f} µs / foydalanuvchi")
+    started = time.perf_counter()
+    await index.compact()
+    print(f"compact(): {time.perf_counter() - started:.2f} s (thread poolda)")
+
+    # eski usul: har so'rovda barcha foydalanuvchilarni ko'rib chiqish
+    started = time.perf_counter()
+    wanted = normalize("Sardor Qodirov7")
+    found = [k for k, u in users.items() if normalize(u["name"]) == wanted]
+    print(f"to'liq skan: {(time.perf_counter() - started) * 1000:.1f} ms ({len(found)} natija)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+# fake_bot_api.py — benchmarklar uchun mahalliy soxta Telegram Bot API serveri
+# -*- coding: utf-8 -*-
+# Bot OBMEN_API_SERVER=http://127.0.0.1:<port> bilan shu serverga ulanadi.
+# Har bir so'rov Telegram qaytaradigan shakldagi javob oladi (send* — Message,
+# getMe — User, getChat — Chat, qolganlari — true). Admin chatiga kelgan
+# buyurtma xabarlari (admin_order|confirm|... tugmasi bilan) navbatga qo'yiladi,
+# shunda benchmark adminning tasdiqlashini simulyatsiya qila oladi.
+import time
+import asyncio
+import itertools
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+SEND_METHODS = {
+    "sendMessage", "sendPhoto", "sendVideo", "sendDocument", "copyMessage", "forwardMessage",
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup",
+}
+
+
+class FakeBotApi:
+    def __init__(self, admin_id: int, latency: float = 0.0):
+        self.admin_id = admin_id
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.bytes_in = 0
+        self.admin_orders: asyncio.Queue = asyncio.Queue()
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.bytes_in += request.content_length or 0
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    def _result(self, method: str, data: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "getChat":
+            chat_id = int(data["chat_id"])
+            return {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"}
+        if method not in SEND_METHODS:
+            return True
+        chat_id = data.get("chat_id")
+        try:
+            chat = {"id": int(chat_id), "type": "private"}
+        except (TypeError, ValueError):
+            chat = {"id": -100, "type": "channel", "username": str(chat_id).lstrip("@")}
+        message: Dict[str, Any] = {
+            "message_id": int(data.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": chat,
+        }
+        if "text" in data:
+            message["text"] = data["text"]
+        if "caption" in data or method in ("sendPhoto", "sendDocument", "editMessageCaption"):
+            message["caption"] = data.get("caption", "")
+        if method == "sendPhoto":
+            message["photo"] = [{"file_id": data.get("photo", ""), "file_unique_id": "u", "width": 1, "height": 1}]
+        if chat.get("id") == self.admin_id and "admin_order|confirm|" in data.get("reply_markup", ""):
+            self.admin_orders.put_nowait(message)
+        return message
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": dict(sorted(self.calls.items())), "total_calls": sum(self.calls.values()),
+                "bytes_in": self.bytes_in}
+
+
+def order_callback(message: Dict[str, Any], action: str = "confirm") -> str:
+    # Admin xabari captionidagi "Buyurtma ID: ..." dan callback_data yasash
+    for line in message.get("caption", "").splitlines():
+        if line.startswith("Buyurtma ID:"):
+            return f"admin_order|{action}|{line.split(':', 1)[1].strip()}"
+    raise ValueError("Buyurtma ID topilmadi")
+
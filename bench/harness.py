@@ -0,0 +1,118 @@
+# harness.py — bench/ skriptlari uchun umumiy yordamchilar
+# -*- coding: utf-8 -*-
+# obmen_bot_full.py ni vaqtinchalik bot_data va soxta Bot API bilan ishga
+# tushirish, to'xtatish hamda o'lchov yordamchilari (persentil, RSS, I/O).
+import os
+import sys
+import json
+import resource
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+ADMIN_ID = 900000001
+CURRENCIES = {
+    "USDT": {"name": "Tether", "buy_rate": 12600, "sell_rate": 12900, "buy_card": "8600 0000 0000 0001",
+             "sell_card": "8600 0000 0000 0002"},
+    "TON": {"name": "Toncoin", "buy_rate": 38000, "sell_rate": 41000, "buy_card": "8600 0000 0000 0003",
+            "sell_card": "8600 0000 0000 0004"},
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(values[min(len(values) - 1, int(len(values) * q))], 3)
+    return {"count": len(values), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "max": round(values[-1], 3)}
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return 0.0
+
+
+def peak_rss_mb() -> float:
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def io_write_bytes() -> int:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def prepare_data_dir(currencies: Dict[str, Any], reserves: Optional[Dict[str, float]] = None) -> str:
+    data_dir = tempfile.mkdtemp(prefix="obmen-bench-")
+    with open(os.path.join(data_dir, "currencies.json"), "w", encoding="utf-8") as f:
+        json.dump(currencies, f, ensure_ascii=False)
+    if reserves is None:
+        reserves = {cur: 10 ** 9 for cur in currencies}
+    with open(os.path.join(data_dir, "reserves.json"), "w", encoding="utf-8") as f:
+        json.dump(reserves, f)
+    return data_dir
+
+
+async def boot_bot(api_url: str, data_dir: str, admin_id: int = ADMIN_ID, storage: str = "json",
+                   keep_limits: bool = False, env: Optional[Dict[str, str]] = None):
+    # Sozlamalar modul import qilinganda o'qiladi — env oldindan to'ldiriladi
+    os.environ.update({
+        "OBMEN_DATA_DIR": data_dir,
+        "OBMEN_API_SERVER": api_url,
+        "OBMEN_BOT_TOKEN": "123456:" + "B" * 35,
+        "OBMEN_ADMIN_ID": str(admin_id),
+        "OBMEN_STORAGE": storage,
+    })
+    if not keep_limits:
+        # O'lchanadigan narsa bot kodi, Telegram limitlari emas
+        os.environ.update({"OBMEN_SEND_RATE": "1000000", "OBMEN_SEND_PRIVATE_RATE": "1000000",
+                           "OBMEN_SEND_CHANNEL_RATE": "1000000"})
+    os.environ.update(env or {})
+    import obmen_bot_full as app
+    from aiogram import Bot, Dispatcher
+    # Ish vaqti tekshiruvi benchmark soatiga bog'liq bo'lmasin
+    app.is_working_hours = lambda: True
+    Dispatcher.set_current(app.dp)
+    Bot.set_current(app.bot)
+    await app.on_startup(app.dp)
+    return app
+
+
+async def shutdown_bot(app):
+    await app.on_shutdown(app.dp)
+    await app.dp.storage.close()
+    await app.dp.storage.wait_closed()
+    await (await app.bot.get_session()).close()
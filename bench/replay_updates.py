@@ -0,0 +1,162 @@
+# replay_updates.py — yozib olingan updatelarni Dispatcher ga qayta berish
+# -*- coding: utf-8 -*-
+# OBMEN_RECORD_UPDATES=1 bilan yozilgan gzip JSONL faylni (recorder.py) soxta
+# Bot API ustida ishlayotgan obmen_bot_full.py ga qayta o'ynatadi. Valyutalar,
+# zaxiralar va admin ID yozuv sarlavhasidan olinadi, shuning uchun bir xil
+# yozuv har safar bir xil natija beradi. Bitta foydalanuvchining updatelari
+# ketma-ket, turli foydalanuvchilarniki parallel beriladi. Buyurtma ID lari
+# qayta o'ynatishda yangidan beriladi, shuning uchun yozuvdagi admin
+# tasdiqlashlari "topilmadi" yo'lidan o'tadi — foydalanuvchi oqimlari o'zgarmaydi.
+# --speed max da "boshlanish kechikishi" navbat chuqurligini ko'rsatadi.
+#   python bench/replay_updates.py YOZUV.jsonl.gz [--speed 1|10|max] [--profile out.prof]
+#                                  [--storage json|sqlite] [--out natija.json]
+import os
+import sys
+import json
+import time
+import pstats
+import asyncio
+import cProfile
+import argparse
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+from harness import (CURRENCIES, ROOT, boot_bot, git_revision, peak_rss_mb, percentiles,  # noqa: E402
+                     prepare_data_dir, shutdown_bot)
+from recorder import read_recording  # noqa: E402
+
+
+def update_kind(update: Dict[str, Any]) -> str:
+    for key in ("message", "callback_query", "edited_message", "my_chat_member"):
+        if key in update:
+            return key
+    return "other"
+
+
+def update_user(update: Dict[str, Any]) -> Optional[int]:
+    for key in ("message", "callback_query", "edited_message", "my_chat_member"):
+        obj = update.get(key)
+        if obj and obj.get("from"):
+            return obj["from"]["id"]
+    return None
+
+
+async def replay(args) -> Dict[str, Any]:
+    header, records = read_recording(args.recording)
+    currencies = header.get("currencies") or CURRENCIES
+    data_dir = prepare_data_dir(currencies, header.get("reserves"))
+    api = FakeBotApi(header.get("admin_id", 0), latency=args.api_latency)
+    app = await boot_bot(await api.start(), data_dir, header.get("admin_id", 0), args.storage)
+    from aiogram import types
+
+    speed = None if args.speed == "max" else float(args.speed)
+    latencies: Dict[str, List[float]] = {}
+    lags: List[float] = []
+    errors = 0
+    last_task: Dict[Any, asyncio.Future] = {}
+    pending = set()
+
+    async def dispatch(previous: Optional[asyncio.Future], update: types.Update, kind: str, due: float):
+        nonlocal errors
+        if previous is not None:
+            await asyncio.wait([previous])
+        started = time.perf_counter()
+        lags.append(max(0.0, started - due) * 1000)
+        try:
+            await app.dp.updates_handler.notify(update)
+        except Exception:
+            errors += 1
+        latencies.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    replay_start = time.perf_counter()
+    first_t = None
+    count = 0
+    for t, raw in records:
+        if first_t is None:
+            first_t = t
+        due = replay_start + ((t - first_t) / speed if speed else 0.0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif speed is None and count % 200 == 0:
+            await asyncio.sleep(0)
+        user = update_user(raw)
+        key = user if user is not None else object()
+        task = asyncio.ensure_future(dispatch(last_task.get(key), types.Update(**raw), update_kind(raw), due))
+        last_task[key] = task
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        count += 1
+    if pending:
+        await asyncio.gather(*list(pending))
+    elapsed = time.perf_counter() - replay_start
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    await shutdown_bot(app)
+    await api.stop()
+
+    all_latencies = [v for values in latencies.values() for v in values]
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "recording": os.path.abspath(args.recording),
+            "recorded_at": header.get("started_at"),
+            "speed": args.speed,
+            "storage": args.storage,
+        },
+        "updates": count,
+        "errors": errors,
+        "recorded_span_s": round((t - first_t), 3) if first_t is not None else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(count / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "all": percentiles(all_latencies),
+            "by_kind": {kind: percentiles(values) for kind, values in sorted(latencies.items())},
+        },
+        # update belgilangan vaqtdan qancha kechikib boshlandi (replay ulgurmayotganini ko'rsatadi)
+        "start_lag_ms": percentiles(lags),
+        "rss_peak_mb": peak_rss_mb(),
+        "persistence": app.persistence.stats(),
+        "outbound": app.outbound.stats(),
+        "fake_api": api.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Yozib olingan updatelarni qayta o'ynatish")
+    parser.add_argument("recording")
+    parser.add_argument("--speed", default="1", help="1 — asl tezlik, N — N marta tez, max — kutmasdan")
+    parser.add_argument("--storage", choices=("json", "sqlite"), default=os.getenv("OBMEN_STORAGE", "json"))
+    parser.add_argument("--api-latency", type=float, default=0.0, help="soxta Bot API javob kechikishi, s")
+    parser.add_argument("--profile", default=None, help="cProfile natijasi (.prof) fayli")
+    parser.add_argument("--out", default=None, help="natija JSON fayli")
+    args = parser.parse_args()
+    if args.speed != "max" and float(args.speed) <= 0:
+        parser.error("--speed musbat son yoki max bo'lishi kerak")
+
+    results = asyncio.run(replay(args))
+    out = args.out or os.path.join(ROOT, "bench", "results", f"replay-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    lat = results["latency_ms"]["all"]
+    print(f"{results['updates']:,} update ({results['recorded_span_s']} s yozuv) {results['elapsed_s']} s da, "
+          f"{results['updates_per_s']:,} update/s, xatolar: {results['errors']}")
+    print(f"kechikish ms: p50 {lat.get('p50')}  p95 {lat.get('p95')}  p99 {lat.get('p99')}  max {lat.get('max')}")
+    print(f"boshlanish kechikishi ms: {results['start_lag_ms']}")
+    if args.profile:
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(20)
+    print(f"natija: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+# broadcast.py — ommaviy xabar yuborish (broadcast) vazifalari
+# -*- coding: utf-8 -*-
+# Vazifa handlerdan ajratilgan holda fon rejimida ishlaydi:
+#   * cheklangan parallellik; tezlik va RetryAfter dan keyingi qayta urinishlar
+#     outbound.OutboundScheduler da (umumiy limit, broadcast ustuvorligi)
+#   * holat bot_data/broadcasts/<id>.json ga yoziladi, qayta ishga tushganda davom etadi
+#   * adminga jarayon haqida xabar tahrirlanib turadi, oxirida yakuniy hisobot
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.utils import exceptions
+
+from outbound import PRIORITY_BROADCAST, send_priority
+
+logger = logging.getLogger(__name__)
+
+# Foydalanuvchi botni bloklagan yoki akkaunt o'chirilgan — qayta urinishning foydasi yo'q
+BLOCKED_ERRORS = (
+    exceptions.BotBlocked,
+    exceptions.UserDeactivated,
+    exceptions.ChatNotFound,
+    exceptions.CantInitiateConversation,
+    exceptions.BotKicked,
+)
+
+
+def message_content(message) -> Optional[Dict[str, Any]]:
+    # Admin yuborgan xabardan yuboriladigan kontentni ajratib olish
+    if message.photo:
+        return {"type": "photo", "file_id": message.photo[-1].file_id, "caption": message.caption}
+    if message.video:
+        return {"type": "video", "file_id": message.video.file_id, "caption": message.caption}
+    if message.document:
+        return {"type": "document", "file_id": message.document.file_id, "caption": message.caption}
+    if message.text:
+        return {"type": "text", "text": message.text}
+    return None
+
+
+async def send_content(bot: Bot, chat_id: int, content: Dict[str, Any]):
+    kind = content["type"]
+    if kind == "photo":
+        return await bot.send_photo(chat_id, content["file_id"], caption=content.get("caption"))
+    if kind == "video":
+        return await bot.send_video(chat_id, content["file_id"], caption=content.get("caption"))
+    if kind == "document":
+        return await bot.send_document(chat_id, content["file_id"], caption=content.get("caption"))
+    return await bot.send_message(chat_id, content["text"])
+
+
+class BroadcastJob:
+    def __init__(self, job_id: str, content: Dict[str, Any], targets: List[int], admin_chat_id: int):
+        self.id = job_id
+        self.content = content
+        self.targets = targets
+        self.admin_chat_id = admin_chat_id
+        self.progress_message_id: Optional[int] = None
+        # cursor: shu indeksdan oldingi barcha foydalanuvchilar bilan ish tugagan
+        self.cursor = 0
+        self.delivered = 0
+        self.blocked = 0
+        self.failed = 0
+        self.status = "running"
+        self.created_at = int(time.time())
+        self.finished_at: Optional[int] = None
+
+    @property
+    def done(self) -> int:
+        return self.delivered + self.blocked + self.failed
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "content": self.content,
+            "admin_chat_id": self.admin_chat_id,
+            "progress_message_id": self.progress_message_id,
+            "total": len(self.targets),
+            "cursor": self.cursor,
+            "delivered": self.delivered,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any], targets: List[int]) -> "BroadcastJob":
+        job = cls(state["id"], state["content"], targets, state["admin_chat_id"])
+        job.progress_message_id = state.get("progress_message_id")
+        job.cursor = state.get("cursor", 0)
+        job.delivered = state.get("delivered", 0)
+        job.blocked = state.get("blocked", 0)
+        job.failed = state.get("failed", 0)
+        job.status = state.get("status", "running")
+        job.created_at = state.get("created_at", job.created_at)
+        job.finished_at = state.get("finished_at")
+        return job
+
+    def progress_text(self) -> str:
+        total = len(self.targets)
+        percent = int(self.done * 100 / total) if total else 100
+        head = "✅ Xabar yuborish yakunlandi." if self.status == "finished" else f"📤 Xabar yuborilmoqda... {percent}%"
+        return (
+            f"{head}\n"
+            f"👥 Jami: {total}\n"
+            f"✅ Yetkazildi: {self.delivered}\n"
+            f"🚫 Bloklagan: {self.blocked}\n"
+            f"❌ Xato: {self.failed}"
+        )
+
+
+class BroadcastManager:
+    def __init__(self, bot: Bot, jobs_dir: str, save: Callable[[str, Any], None],
+                 concurrency: int = 20, progress_interval: float = 3.0,
+                 on_blocked: Optional[Callable[[int], None]] = None):
+        self.bot = bot
+        self.jobs_dir = jobs_dir
+        self._save = save
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.on_blocked = on_blocked
+        self.jobs: Dict[str, BroadcastJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _targets_path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.targets.json")
+
+    def _checkpoint(self, job: BroadcastJob):
+        self._save(self._state_path(job.id), job.state())
+
+    async def start(self, content: Dict[str, Any], targets: List[int], admin_chat_id: int) -> BroadcastJob:
+        job_id = str(int(time.time() * 1000))
+        job = BroadcastJob(job_id, content, targets, admin_chat_id)
+        self._save(self._targets_path(job_id), targets)
+        try:
+            msg = await self.bot.send_message(admin_chat_id, job.progress_text())
+            job.progress_message_id = msg.message_id
+        except Exception as e:
+            logger.exception("Broadcast jarayon xabarini yuborishda xato: %s", e)
+        self._checkpoint(job)
+        self._spawn(job)
+        return job
+
+    def _spawn(self, job: BroadcastJob):
+        self.jobs[job.id] = job
+        task = asyncio.get_event_loop().create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda t, job_id=job.id: self._tasks.pop(job_id, None))
+
+    def resume_all(self) -> int:
+        # Qayta ishga tushgandan keyin tugallanmagan vazifalarni davom ettirish
+        resumed = 0
+        for name in os.listdir(self.jobs_dir):
+            if not name.endswith(".json") or name.endswith(".targets.json"):
+                continue
+            try:
+                with open(os.path.join(self.jobs_dir, name), "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if state.get("status") != "running" or state["id"] in self.jobs:
+                    continue
+                with open(self._targets_path(state["id"]), "r", encoding="utf-8") as f:
+                    targets = json.load(f)
+            except Exception as e:
+                logger.exception("Broadcast holatini o'qishda xato (%s): %s", name, e)
+                continue
+            job = BroadcastJob.from_state(state, targets)
+            logger.info("Broadcast %s davom ettirilmoqda: %d/%d", job.id, job.cursor, len(targets))
+            self._spawn(job)
+            resumed += 1
+        return resumed
+
+    async def _deliver(self, job: BroadcastJob, uid: int):
+        try:
+            # umumiy navbatda foydalanuvchilarga javoblar va kanal postlaridan keyin turadi;
+            # RetryAfter bo'lsa scheduler o'zi kutib, qayta yuboradi
+            with send_priority(PRIORITY_BROADCAST):
+                await send_content(self.bot, uid, job.content)
+            job.delivered += 1
+        except BLOCKED_ERRORS:
+            job.blocked += 1
+            if self.on_blocked is not None:
+                # segmentlar "blocked" belgisini yangilaydi — keyingi yuborishlarda chiqarib tashlanadi
+                try:
+                    self.on_blocked(uid)
+                except Exception as e:
+                    logger.exception("on_blocked(%s) xato: %s", uid, e)
+        except Exception as e:
+            logger.debug("Broadcast %s: %s ga yuborilmadi: %s", job.id, uid, e)
+            job.failed += 1
+
+    async def _report(self, job: BroadcastJob):
+        if not job.progress_message_id:
+            return
+        try:
+            await self.bot.edit_message_text(job.progress_text(), job.admin_chat_id, job.progress_message_id)
+        except exceptions.MessageNotModified:
+            pass
+        except Exception as e:
+            logger.debug("Broadcast jarayon xabarini tahrirlashda xato: %s", e)
+
+    async def _run(self, job: BroadcastJob):
+        in_flight = set()
+        next_index = job.cursor
+
+        async def worker():
+            nonlocal next_index
+            while next_index < len(job.targets):
+                index = next_index
+                next_index += 1
+                in_flight.add(index)
+                try:
+                    await self._deliver(job, int(job.targets[index]))
+                finally:
+                    in_flight.discard(index)
+                    job.cursor = min(in_flight) if in_flight else next_index
+
+        async def reporter():
+            while True:
+                await asyncio.sleep(self.progress_interval)
+                self._checkpoint(job)
+                await self._report(job)
+
+        progress = asyncio.get_event_loop().create_task(reporter())
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            progress.cancel()
+        job.status = "finished"
+        job.finished_at = int(time.time())
+        job.cursor = len(job.targets)
+        self._checkpoint(job)
+        await self._report(job)
+        if not job.progress_message_id:
+            try:
+                await self.bot.send_message(job.admin_chat_id, job.progress_text())
+            except Exception as e:
+                logger.exception("Broadcast hisobotini yuborishda xato: %s", e)
+        logger.info("Broadcast %s yakunlandi: %s", job.id, job.state())
+
+    async def stop(self):
+        # To'xtatilgan vazifalar "running" holatida qoladi va keyingi ishga tushishda davom etadi
+        for job_id, task in list(self._tasks.items()):
+            task.cancel()
+            job = self.jobs.get(job_id)
+            if job:
+                self._checkpoint(job)
+        await asyncio.gather(*list(self._tasks.values()), return_exceptions=True)
@@ -0,0 +1,245 @@
+# fsm_storage.py — SQLite asosidagi FSM storage (MemoryStorage o'rniga)
+# -*- coding: utf-8 -*-
+# * holatlar bot_data/fsm.db ga yoziladi — qayta deploydan keyin ham saqlanadi
+# * ttl soniyadan ko'p harakatsiz qolgan suhbatlar o'chiriladi
+# * tez-tez ishlatiladigan holatlar cheklangan LRU keshdan o'qiladi
+# * bo'sh holat (state=None, data={}) saqlanmaydi — xotira va baza o'smaydi; lekin
+#   "bazada yo'q" natijasi keshda turadi (holatsiz foydalanuvchi har updateda SELECT qilmasin)
+# * bazadagi yozuvlar soni hisoblagichda yuritiladi (/metrics har safar COUNT(*) qilmaydi)
+import copy
+import json
+import time
+import sqlite3
+import typing
+import logging
+from collections import OrderedDict
+
+from aiogram.dispatcher.storage import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    chat TEXT NOT NULL,
+    user TEXT NOT NULL,
+    state TEXT,
+    data TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chat, user)
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_updated ON fsm(updated_at);
+"""
+
+
+class SQLiteStorage(BaseStorage):
+    def __init__(self, path: str, ttl: float = 86400, cache_size: int = 5000, sweep_interval: float = 300):
+        self.path = path
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.sweep_interval = sweep_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        # bazadagi yozuvlar soni: ochishda bir marta sanaladi, keyin INSERT/DELETE bo'yicha
+        self.stored = self._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+        self._cache: "OrderedDict[typing.Tuple[str, str], dict]" = OrderedDict()
+        self._last_sweep = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def resolve_address(self, chat, user) -> typing.Tuple[str, str]:
+        chat_id, user_id = map(str, self.check_address(chat=chat, user=user))
+        return chat_id, user_id
+
+    def _expired(self, record: dict, now: float) -> bool:
+        # bo'sh (bazada yo'q) yozuv eskirmaydi — o'chiradigan narsa yo'q
+        return bool(self.ttl) and record["stored"] and now - record["updated_at"] > self.ttl
+
+    def _load(self, key: typing.Tuple[str, str]) -> dict:
+        now = time.time()
+        record = self._cache.get(key)
+        if record is not None:
+            if not self._expired(record, now):
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return record
+            self._drop(key)
+            return self._empty()
+        self.misses += 1
+        row = self._conn.execute(
+            "SELECT state, data, bucket, updated_at FROM fsm WHERE chat = ? AND user = ?", key
+        ).fetchone()
+        if row is None:
+            record = self._empty()
+        else:
+            record = {"state": row[0], "data": json.loads(row[1]), "bucket": json.loads(row[2]),
+                      "updated_at": row[3], "stored": True}
+            if self._expired(record, now):
+                self._drop(key)
+                record = self._empty()
+        # bo'sh natija ham eslab qolinadi; set_state/set_data _store orqali uni almashtiradi
+        self._remember(key, record)
+        return record
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"state": None, "data": {}, "bucket": {}, "updated_at": time.time(), "stored": False}
+
+    def _remember(self, key, record: dict):
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _drop(self, key):
+        self._cache.pop(key, None)
+        self._delete(key)
+        self.evicted += 1
+
+    def _delete(self, key):
+        cur = self._conn.execute("DELETE FROM fsm WHERE chat = ? AND user = ?", key)
+        self._conn.commit()
+        self.stored -= cur.rowcount
+
+    def _store(self, key, record: dict):
+        if record["state"] is None and not record["data"] and not record["bucket"]:
+            if record["stored"]:
+                self._delete(key)
+                record["stored"] = False
+            # bazada yo'q — keshda bo'sh yozuv sifatida qoladi
+            self._remember(key, record)
+            return
+        if not record["stored"]:
+            self.stored += 1
+            record["stored"] = True
+        record["updated_at"] = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fsm (chat, user, state, data, bucket, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key[0], key[1], record["state"],
+             json.dumps(record["data"], ensure_ascii=False), json.dumps(record["bucket"], ensure_ascii=False),
+             record["updated_at"]),
+        )
+        self._conn.commit()
+        self._remember(key, record)
+        self._maybe_sweep(record["updated_at"])
+
+    def _maybe_sweep(self, now: float):
+        if not self.ttl or now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        self.sweep(now)
+
+    def sweep(self, now: typing.Optional[float] = None) -> int:
+        # Eskirgan suhbatlarni bazadan va keshdan tozalash
+        now = now or time.time()
+        cur = self._conn.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+        self._conn.commit()
+        for key in [k for k, r in self._cache.items() if self._expired(r, now)]:
+            del self._cache[key]
+        if cur.rowcount:
+            self.stored -= cur.rowcount
+            self.evicted += cur.rowcount
+            logger.info("FSM: %d ta eskirgan holat o'chirildi", cur.rowcount)
+        return cur.rowcount
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return {
+            "cached": len(self._cache),
+            "stored": self.stored,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+    async def close(self):
+        self._cache.clear()
+        self._conn.close()
+
+    async def wait_closed(self):
+        pass
+
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = self._load(self.resolve_address(chat, user))
+        return record["state"] if record["state"] is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        record = self._load(self.resolve_address(chat, user))
+        return copy.deepcopy(record["data"] or default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.Optional[typing.AnyStr] = None):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["state"] = self.resolve_state(state)
+        self._store(key, record)
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["data"] = copy.deepcopy(data or {})
+        self._store(key, record)
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None,
+                          **kwargs):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["data"].update(data or {}, **kwargs)
+        self._store(key, record)
+
+    async def reset_state(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          with_data: typing.Optional[bool] = True):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["state"] = None
+        if with_data:
+            record["data"] = {}
+        self._store(key, record)
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        record = self._load(self.resolve_address(chat, user))
+        return copy.deepcopy(record["bucket"] or default or {})
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["bucket"] = copy.deepcopy(bucket or {})
+        self._store(key, record)
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None,
+                            **kwargs):
+        key = self.resolve_address(chat, user)
+        record = self._load(key)
+        record["bucket"].update(bucket or {}, **kwargs)
+        self._store(key, record)
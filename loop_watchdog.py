@@ -0,0 +1,112 @@
+# loop_watchdog.py — event loop "qotib qolishi"ni kuzatuvchi alohida thread
+# -*- coding: utf-8 -*-
+# Thread har interval soniyada loop ga call_soon_threadsafe bilan "ping" yuboradi.
+# Javob threshold dan kechiksa, loop ni band qilib turgan kod aynan shu payt
+# ishlayapti — asosiy thread steki sys._current_frames() dan olinib jurnalga
+# yoziladi (log_interval da ko'pi bilan bir marta). Loop bo'shagach, to'liq
+# to'xtash davomiyligi histogramga tushadi va (ixtiyoriy) on_stall chaqiriladi —
+# u loop ichida ishlaydi, ya'ni adminga oddiy bot.send_message bilan yozish mumkin.
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+STALL_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = 0.25, interval: float = 0.1, log_interval: float = 60.0,
+                 on_stall: Optional[Callable[[float, str], Awaitable[Any]]] = None, alert_interval: float = 600.0):
+        self.threshold = threshold
+        self.interval = interval
+        self.log_interval = log_interval
+        self.on_stall = on_stall
+        self.alert_interval = alert_interval
+        self.histogram = Histogram("obmen_loop_stall_seconds", "Event loop to'xtab qolishlari davomiyligi",
+                                   buckets=STALL_BUCKETS)
+        self.stalls_total = 0
+        self.suppressed_total = 0
+        self.max_stall = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._pong = threading.Event()
+        self._last_log = float("-inf")
+        self._last_alert = float("-inf")
+
+    def start(self):
+        # Loop ichidan chaqiriladi — shu thread kuzatiladi
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        return "".join(traceback.format_stack(frame)) if frame is not None else "(stek topilmadi)"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._pong.clear()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(self._pong.set)
+            except RuntimeError:
+                # loop yopilgan
+                return
+            if self._pong.wait(self.threshold):
+                continue
+            # Loop band: stek hozir olinadi — aybdor kod aynan shu payt ishlayapti
+            stack = self._stack()
+            now = time.monotonic()
+            if now - self._last_log >= self.log_interval:
+                self._last_log = now
+                logger.warning("Event loop %.0f ms dan beri band (%d ta xabar o'tkazib yuborilgan). Stek:\n%s",
+                               (now - sent) * 1000, self.suppressed_total, stack)
+                self.suppressed_total = 0
+            else:
+                self.suppressed_total += 1
+            while not self._pong.wait(1.0):
+                if self._stop.is_set():
+                    return
+            # ping yuborilgan paytdan — haqiqiy to'xtash ko'pi bilan interval ga uzunroq
+            duration = time.monotonic() - sent
+            try:
+                self._loop.call_soon_threadsafe(self._report, duration, stack)
+            except RuntimeError:
+                return
+
+    def _report(self, duration: float, stack: str):
+        # Loop ichida: histogram va alert bir oqimda yangilanadi
+        self.stalls_total += 1
+        self.max_stall = max(self.max_stall, duration)
+        self.histogram.observe(duration)
+        logger.info("Event loop %.0f ms to'xtab qoldi", duration * 1000)
+        now = time.monotonic()
+        if self.on_stall is not None and now - self._last_alert >= self.alert_interval:
+            self._last_alert = now
+            asyncio.ensure_future(self._alert(duration, stack))
+
+    async def _alert(self, duration: float, stack: str):
+        try:
+            await self.on_stall(duration, stack)
+        except Exception as e:
+            logger.debug("on_stall xatosi: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stalls": self.stalls_total, "max_ms": round(self.max_stall * 1000, 1)}
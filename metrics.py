@@ -0,0 +1,283 @@
+# metrics.py — Prometheus matn formatidagi metrikalar (OBMEN_METRICS_PORT)
+# -*- coding: utf-8 -*-
+# prometheus_client o'rnatilmagan, shuning uchun kerakli qismi shu yerda:
+# Counter, Gauge (qiymat yoki scrape paytida chaqiriladigan funksiya) va
+# Histogram. Kuzatish (inc/observe) — bitta lug'at qidiruvi va bisect, ya'ni
+# update boshiga bir necha mikrosekund. Matn faqat /metrics so'ralganda yasaladi.
+#
+# Manbalar:
+#   * MetricsMiddleware — handler (funksiya nomi) kechikishi, FSM holati bo'yicha updatelar
+#   * PersistenceService.on_write — fayl bo'yicha yozish vaqti va baytlar
+#   * ScheduledBot.observer — Bot API metodlari kechikishi va xato kodlari
+#   * loop_lag_monitor — event loop kechikishi
+import os
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import types
+from aiogram.dispatcher.filters.builtin import StateFilter
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils import exceptions
+
+from router import resolve_handler
+
+logger = logging.getLogger(__name__)
+
+# soniyalarda
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Any]] = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+        # collect() — raqam yoki {label_tuple: raqam}; scrape paytida chaqiriladi
+        self._collect = collect
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        values = dict(self._values)
+        if self._collect is not None:
+            try:
+                collected = self._collect()
+            except Exception as e:
+                logger.debug("%s metrikasini yig'ib bo'lmadi: %s", self.name, e)
+                collected = None
+            if isinstance(collected, dict):
+                values.update(collected)
+            elif collected is not None:
+                values[()] = collected
+        return [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # label_tuple -> [bucket hisoblari..., +Inf, sum]
+        self._series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Any:
+        if metric.name in self._metrics:
+            raise ValueError(f"{metric.name} metrikasi allaqachon bor")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), collect=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, collect))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class BotMetrics:
+    # Bot uchun standart metrikalar to'plami
+    def __init__(self, registry: Optional[Registry] = None):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.handler_seconds = r.histogram("obmen_handler_seconds", "Handler bajarilish vaqti", ("handler",))
+        self.updates_total = r.counter("obmen_updates_total", "Updatelar soni (tur va FSM holati bo'yicha)",
+                                       ("type", "state"))
+        self.unhandled_total = r.counter("obmen_unhandled_updates_total", "Hech bir handler olmagan updatelar",
+                                         ("type",))
+        self.save_seconds = r.histogram("obmen_save_seconds", "Faylni atomar yozish vaqti", ("file",))
+        self.save_bytes = r.histogram("obmen_save_bytes", "Yozilgan fayl hajmi", ("file",), SIZE_BUCKETS)
+        self.save_errors_total = r.counter("obmen_save_errors_total", "Faylga yozish xatolari", ("file",))
+        self.api_seconds = r.histogram("obmen_telegram_api_seconds", "Bot API so'rovi vaqti", ("method",))
+        self.api_errors_total = r.counter("obmen_telegram_api_errors_total", "Bot API xatolari", ("method", "code"))
+        self.loop_lag_seconds = r.histogram("obmen_event_loop_lag_seconds", "Event loop kechikishi")
+        self.loop_lag_last = r.gauge("obmen_event_loop_lag_last_seconds", "Oxirgi o'lchangan loop kechikishi")
+
+    # --- Bot API (ScheduledBot.observer) ---
+    def observe_api(self, method: str, elapsed: float, error: Optional[BaseException]):
+        self.api_seconds.observe(elapsed, method)
+        if error is not None:
+            self.api_errors_total.inc(method, api_error_code(error))
+
+    # --- PersistenceService.on_write ---
+    def observe_write(self, file: str, elapsed: float, size: Optional[int]):
+        if size is None:
+            self.save_errors_total.inc(file)
+            return
+        self.save_seconds.observe(elapsed, file)
+        self.save_bytes.observe(size, file)
+
+
+def api_error_code(error: BaseException) -> str:
+    if isinstance(error, exceptions.RetryAfter):
+        return "429"
+    if isinstance(error, exceptions.BadRequest):
+        return "400"
+    if isinstance(error, exceptions.Unauthorized):
+        return "403"
+    if isinstance(error, exceptions.NetworkError):
+        return "network"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return type(error).__name__
+
+
+_UNKNOWN = "unknown"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    # Handler ishga tushishidan oldin vaqt va nom yoziladi, keyin kechikish kuzatiladi
+    def __init__(self, metrics: BotMetrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def _start(self, kind: str, data: dict):
+        data["_metrics_handler"] = getattr(resolve_handler(data), "__name__", "unknown")
+        data["_metrics_started"] = time.perf_counter()
+        # StateFilter (yoki ButtonRouter) o'qigan holat; hech kim o'qimagan bo'lsa storage ga bormaymiz
+        state = StateFilter.ctx_state.get(_UNKNOWN)
+        self.metrics.updates_total.inc(kind, state or "none")
+
+    def _finish(self, kind: str, data: dict):
+        started = data.pop("_metrics_started", None)
+        if started is None:
+            self.metrics.unhandled_total.inc(kind)
+            return
+        self.metrics.handler_seconds.observe(time.perf_counter() - started, data.pop("_metrics_handler"))
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._start("message", data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish("message", data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._start("callback_query", data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self._finish("callback_query", data)
+
+
+async def loop_lag_monitor(metrics: BotMetrics, interval: float = 0.5):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        metrics.loop_lag_seconds.observe(lag)
+        metrics.loop_lag_last.set(lag)
+
+
+async def start_metrics_server(registry: Registry, host: str, port: int) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Format": "prometheus-0.0.4"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrikalar: http://%s:%d/metrics", host, port)
+    return runner
+
+
+def file_label(path: str, root: str) -> str:
+    # bot_data/broadcasts/<id>.json kabi fayllar bitta yorliqqa yig'iladi (kardinallik cheklangan)
+    rel = os.path.relpath(path, root)
+    head, name = os.path.split(rel)
+    return f"{head}/*" if head else name
@@ -1,39 +1,176 @@
 # obmen_bot.py — to'liq ishlaydigan versiya (valyutalar yonma-yon, mantiq to'g'ri, foydalanuvchi ko'rishi mumkin)
 # -*- coding: utf-8 -*-
+import io
 import os
+import glob
+import html
 import json
 import time
+import atexit
+import asyncio
 import logging
 from datetime import datetime
+from itertools import chain
 import pytz
-from typing import Dict, Any
-from aiogram import Bot, Dispatcher, executor, types
+from typing import Any, Awaitable, Callable, Dict, Optional
+from aiogram import Dispatcher, executor, types
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher.filters.state import State, StatesGroup
 from aiogram.dispatcher import FSMContext
+from repository import open_repository, order_key
+from persistence import PersistenceService
+from broadcast import BroadcastManager, message_content
+from fsm_storage import SQLiteStorage
+from webhook import start_webhook
+from render_cache import RenderCache
+from order_ids import OrderIdAllocator, hwm_floor
+from reserve_ledger import ReserveLedger
+from pending_index import PendingIndex, PENDING_STATUS, AGE_BUCKETS
+from side_effects import SideEffectPipeline
+from profile_cache import ProfileCache
+from outbound import OutboundScheduler, ScheduledBot
+from router import ButtonRouter
+from recorder import Scrubber, UpdateRecorder, mask_text
+from metrics import BotMetrics, MetricsMiddleware, file_label, loop_lag_monitor, start_metrics_server
+from loop_watchdog import LoopWatchdog
+from tracing import Profiler, Tracer, TracingMiddleware, instrument, traced
+from shared_state import SharedState
+from scaleout import RefreshMiddleware, run_worker, shard_of
+from rate_history import RateHistory
+from user_index import SCORE_USERNAME, UserIndex
+from segments import SegmentIndex
+from trade_stats import DAY, FILE_PATTERN as STATS_PATTERN, HOUR, TradeStats, merged_summary
 
 API_TOKEN = os.getenv("OBMEN_BOT_TOKEN", "7644659937:AAHy_LuhZ8Wi_ba22MRp6Ksy4xV1xXV_6O8")
 ADMIN_ID = int(os.getenv("OBMEN_ADMIN_ID", "7973934849"))
 CHANNEL_USERNAME = "@tlovchek"
-
-DATA_DIR = "bot_data"
+# Bot API manzili: o'z Bot API serveringiz yoki bench/ dagi soxta server (bo'sh — api.telegram.org)
+API_SERVER = os.getenv("OBMEN_API_SERVER", "")
+
+DATA_DIR = os.getenv("OBMEN_DATA_DIR", "bot_data")
+# Ko'p jarayonli rejim (python scaleout.py): front updatelarni foydalanuvchi ID si bo'yicha
+# OBMEN_WORKERS ta ishchiga (OBMEN_ROLE=worker) taqsimlaydi; har ishchining o'z FSM bazasi va fayllari
+ROLE = os.getenv("OBMEN_ROLE", "single")
+WORKERS = int(os.getenv("OBMEN_WORKERS", "1")) if ROLE == "worker" else 1
+WORKER_INDEX = int(os.getenv("OBMEN_WORKER_INDEX", "0")) if ROLE == "worker" else 0
+WORKER_SOCKET = os.getenv("OBMEN_WORKER_SOCKET", os.path.join(DATA_DIR, "workers", f"worker-{WORKER_INDEX}.sock"))
+WORKER_SUFFIX = f"-{WORKER_INDEX}" if ROLE == "worker" else ""
 CURRENCIES_FILE = os.path.join(DATA_DIR, "currencies.json")
 USERS_FILE = os.path.join(DATA_DIR, "users.json")
 ORDERS_FILE = os.path.join(DATA_DIR, "orders.json")
 HELP_VIDEO_FILE = os.path.join(DATA_DIR, "help_video.json")
 RESERVES_FILE = os.path.join(DATA_DIR, "reserves.json")
 CARD_BALANCE_FILE = os.path.join(DATA_DIR, "card_balance.json")
+ORDER_ID_HWM_FILE = os.path.join(DATA_DIR, "order_id.hwm" + (f".{WORKER_INDEX}" if ROLE == "worker" else ""))
+RESERVE_HOLDS_FILE = os.path.join(DATA_DIR, "reserve_holds.json")
+# Kurslarning har bir o'zgarishi (buy_rate/sell_rate) — /rates_history
+RATE_HISTORY_DIR = os.path.join(DATA_DIR, "rate_history")
+RATE_HISTORY_DAYS = int(os.getenv("OBMEN_RATE_HISTORY_DAYS", "7"))
+STATS_FILE = os.path.join(DATA_DIR, f"trade_stats{WORKER_SUFFIX}.json")
+STATS_HOURLY_DAYS = int(os.getenv("OBMEN_STATS_HOURLY_DAYS", "14"))
+# Broadcast segmentlari: "active:N", "buy:USDT:N" kabi oynali belgilar uchun eng katta N (kun)
+SEGMENT_DAYS = int(os.getenv("OBMEN_SEGMENT_DAYS", "90"))
+# Segment tanlashda nechta valyuta uchun tayyor "olganlar/sotganlar" tugmalari
+SEGMENT_CURRENCY_PRESETS = int(os.getenv("OBMEN_SEGMENT_CURRENCY_PRESETS", "4"))
+RESERVE_HOLD_TTL = float(os.getenv("OBMEN_RESERVE_HOLD_TTL", str(24 * 3600)))
+SIDE_EFFECT_WORKERS = int(os.getenv("OBMEN_SIDE_EFFECT_WORKERS", "8"))
+SIDE_EFFECT_RETRIES = int(os.getenv("OBMEN_SIDE_EFFECT_RETRIES", "3"))
+# Chiquvchi xabarlar: umumiy limit, shaxsiy chat va kanal uchun limitlar (msg/s).
+# Umumiy va kanal limitlari ishchilar orasida teng bo'linadi; chat limiti bo'linmaydi — chat bitta ishchida
+SEND_RATE = float(os.getenv("OBMEN_SEND_RATE", "30")) / WORKERS
+SEND_PRIVATE_RATE = float(os.getenv("OBMEN_SEND_PRIVATE_RATE", "1"))
+SEND_CHANNEL_RATE = float(os.getenv("OBMEN_SEND_CHANNEL_RATE", str(20 / 60))) / WORKERS
+PROFILE_TTL = float(os.getenv("OBMEN_PROFILE_TTL", str(6 * 3600)))
+PROFILE_CACHE_SIZE = int(os.getenv("OBMEN_PROFILE_CACHE_SIZE", "20000"))
+FLUSH_INTERVAL = float(os.getenv("OBMEN_FLUSH_INTERVAL", "1.0"))
+BROADCASTS_DIR = os.path.join(DATA_DIR, "broadcasts")
+BROADCAST_CONCURRENCY = int(os.getenv("OBMEN_BROADCAST_CONCURRENCY", "20"))
+FSM_DB_FILE = os.path.join(DATA_DIR, f"fsm{WORKER_SUFFIX}.db")
+FSM_STORAGE = os.getenv("OBMEN_FSM_STORAGE", "sqlite")
+FSM_TTL = float(os.getenv("OBMEN_FSM_TTL", str(24 * 3600)))
+FSM_CACHE_SIZE = int(os.getenv("OBMEN_FSM_CACHE_SIZE", "5000"))
+
+# Ishga tushirish rejimi: polling (standart) yoki webhook
+RUN_MODE = os.getenv("OBMEN_MODE", "polling")
+WEBHOOK_URL = os.getenv("OBMEN_WEBHOOK_URL")
+WEBHOOK_PATH = os.getenv("OBMEN_WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("OBMEN_WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("OBMEN_WEBHOOK_PORT", os.getenv("PORT", "8080")))
+WEBHOOK_SECRET = os.getenv("OBMEN_WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("OBMEN_WEBHOOK_WORKERS", "32"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("OBMEN_WEBHOOK_QUEUE_SIZE", "1000"))
+
+# Kiruvchi updatelarni PII siz yozib olish (bench/replay_updates.py bilan qayta o'ynatiladi)
+RECORD_UPDATES = os.getenv("OBMEN_RECORD_UPDATES", "0") == "1"
+RECORDINGS_DIR = os.path.join(DATA_DIR, "recordings" + WORKER_SUFFIX)
+
+# Prometheus metrikalari: http://OBMEN_METRICS_HOST:OBMEN_METRICS_PORT/metrics (0 — o'chirilgan)
+METRICS_HOST = os.getenv("OBMEN_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("OBMEN_METRICS_PORT", "9101"))
+if METRICS_PORT and ROLE == "worker":
+    # har ishchi o'z portida: 9101, 9102, ...
+    METRICS_PORT += WORKER_INDEX
+
+# Update spanlari: OBMEN_TRACE_SAMPLE ulushi traces.jsonl ga, OBMEN_SLOW_UPDATE_MS dan uzoqlari
+# slow_updates.jsonl ga (ikkalasi 0 — o'chirilgan)
+TRACE_SAMPLE = float(os.getenv("OBMEN_TRACE_SAMPLE", "0.01"))
+SLOW_UPDATE_MS = float(os.getenv("OBMEN_SLOW_UPDATE_MS", "1000"))
+TRACE_LOG_FILE = os.path.join(DATA_DIR, f"traces{WORKER_SUFFIX}.jsonl")
+SLOW_LOG_FILE = os.path.join(DATA_DIR, f"slow_updates{WORKER_SUFFIX}.jsonl")
+PROFILE_SECONDS = int(os.getenv("OBMEN_PROFILE_SECONDS", "30"))
+
+# Event loop shuncha ms dan uzoq band bo'lsa — stek jurnalga (0 — o'chirilgan); OBMEN_STALL_ALERTS=1 — adminga ham
+STALL_MS = float(os.getenv("OBMEN_STALL_MS", "250"))
+STALL_ALERTS = os.getenv("OBMEN_STALL_ALERTS", "0") == "1"
+STALL_ALERT_INTERVAL = float(os.getenv("OBMEN_STALL_ALERT_INTERVAL", "600"))
+
+# Yakunlangan buyurtmalar shuncha kundan keyin arxivga o'tadi (faqat OBMEN_STORAGE=json)
+ARCHIVE_AFTER_DAYS = float(os.getenv("OBMEN_ARCHIVE_AFTER_DAYS", "7"))
+ARCHIVE_INTERVAL = float(os.getenv("OBMEN_ARCHIVE_INTERVAL", "3600"))
+FINAL_STATUSES = ("✅ Tasdiqlandi", "❌ Bekor qilindi")
+MY_ORDERS_PAGE = 10
+PENDING_PAGE = 8
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger(__name__)
 
-storage = MemoryStorage()
-bot = Bot(token=API_TOKEN)
+# Tugallanmagan suhbatlar qayta ishga tushganda yo'qolmasligi uchun SQLite (OBMEN_FSM_STORAGE=memory — eski usul)
+if FSM_STORAGE == "memory":
+    storage = MemoryStorage()
+else:
+    storage = SQLiteStorage(FSM_DB_FILE, ttl=FSM_TTL, cache_size=FSM_CACHE_SIZE)
+metrics = BotMetrics() if METRICS_PORT else None
+# Barcha yuborishlar (message.answer ham) bitta navbat orqali — 429 larning oldi olinadi
+outbound = OutboundScheduler(channel_ids=[CHANNEL_USERNAME], global_rate=SEND_RATE,
+                             private_rate=SEND_PRIVATE_RATE, group_rate=SEND_CHANNEL_RATE)
+bot = ScheduledBot(token=API_TOKEN, scheduler=outbound, observer=metrics.observe_api if metrics else None,
+                   server=TelegramAPIServer.from_base(API_SERVER) if API_SERVER else TELEGRAM_PRODUCTION)
 dp = Dispatcher(bot, storage=storage)
+# Menyu tugmalari: holat + aniq matn bo'yicha bitta lug'at (barcha handlerlardan oldin)
+router = ButtonRouter()
+router.register(dp)
+
+persistence = PersistenceService(
+    flush_interval=FLUSH_INTERVAL,
+    on_write=(lambda path, elapsed, size: metrics.observe_write(file_label(path, DATA_DIR), elapsed, size))
+    if metrics else None,
+)
+atexit.register(persistence.flush_sync)
+
+# Kurslar/zaxiralar ekranlari keshi — shu fayllar saqlanganda versiya oshadi
+render_cache = RenderCache()
+RENDER_SOURCES = {CURRENCIES_FILE, RESERVES_FILE, CARD_BALANCE_FILE, RESERVE_HOLDS_FILE}
+
+# Ishchilar orasida umumiy: fayl o'rniga bot.db dagi shared_state jadvali (nom — fayl nomi)
+SHARED_FILES = {CURRENCIES_FILE, RESERVES_FILE, CARD_BALANCE_FILE, RESERVE_HOLDS_FILE, HELP_VIDEO_FILE}
+shared = SharedState(os.path.join(DATA_DIR, "bot.db")) if ROLE == "worker" else None
 
 def load_json(path: str, default: Any):
+    if shared is not None and path in SHARED_FILES:
+        return shared.bind(os.path.basename(path), default, seed_path=path)
     if not os.path.exists(path):
         save_json(path, default)
         return default
@@ -45,18 +182,94 @@ def load_json(path: str, default: Any):
         return default
 
 def save_json(path: str, data: Any):
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.exception("Faylga yozishda xato (%s): %s", path, e)
+    # Darhol yozilmaydi: fon xizmati bir nechta o'zgarishni bitta atomar yozuvga birlashtiradi
+    if path in RENDER_SOURCES:
+        render_cache.bump()
+    if shared is not None and path in SHARED_FILES:
+        shared.save(os.path.basename(path), data)
+        return
+    persistence.mark_dirty(path, data)
 
 currencies = load_json(CURRENCIES_FILE, {})
-users = load_json(USERS_FILE, {})
-orders = load_json(ORDERS_FILE, {})
+# users/orders — OBMEN_STORAGE=json (standart) yoki sqlite
+repo = open_repository(DATA_DIR, load_json, save_json, backend="sqlite" if ROLE == "worker" else None)
+users = repo.users
+orders = repo.orders
 help_video_data = load_json(HELP_VIDEO_FILE, {"video": None, "text": "Qo'llanma hali qo'shilmagan."})
 reserves = load_json(RESERVES_FILE, {})
 card_balance = load_json(CARD_BALANCE_FILE, {"UZS": 0})
+# BUY buyurtmalar uchun band qilingan zaxiralar — bir zaxirani bir nechta xaridor ololmaydi
+ledger = ReserveLedger(reserves, load_json(RESERVE_HOLDS_FILE, {}), save_json,
+                       RESERVES_FILE, RESERVE_HOLDS_FILE, ttl=RESERVE_HOLD_TTL,
+                       transaction=shared.transaction if shared is not None else None)
+
+# Ishchi raqami ID ning quyi bitlarida; boshlang'ich chegara — barcha order_id.hwm* fayllarining eng kattasi
+order_ids = OrderIdAllocator(ORDER_ID_HWM_FILE, node=WORKER_INDEX, node_bits=(WORKERS - 1).bit_length(),
+                             floor=hwm_floor(os.path.join(DATA_DIR, "order_id.hwm*")))
+# Tasdiqlash/bekor qilishdan keyingi xabarlar va kanal postlari shu yerda bajariladi
+side_effects = SideEffectPipeline(workers=SIDE_EFFECT_WORKERS, retries=SIDE_EFFECT_RETRIES)
+# Admin ko'rib chiqishini kutayotgan buyurtmalar (/pending)
+pending = PendingIndex(repo.orders_by_status(PENDING_STATUS))
+# Admin updatelari shu ishchiga keladi: broadcastlar va fon vazifalari faqat shu yerda
+ADMIN_WORKER = shard_of(ADMIN_ID, WORKERS) == WORKER_INDEX
+# Kurslar tarixiga faqat admin ishchisi yozadi (kurslarni faqat admin o'zgartiradi)
+rate_history = RateHistory(RATE_HISTORY_DIR)
+if ADMIN_WORKER:
+    rate_history.sync(currencies)
+# Savdo statistikasi: har ishchi o'z faylida; hech qanday fayl bo'lmasa (birinchi ishga tushish) tarixdan quriladi
+trade_stats = TradeStats.load(STATS_FILE, tz_offset=5 * 3600, hourly_days=STATS_HOURLY_DAYS)
+if ADMIN_WORKER and not glob.glob(os.path.join(DATA_DIR, STATS_PATTERN)):
+    archive = getattr(repo, "archive", None)
+    rebuilt = trade_stats.rebuild(chain(orders.values(), archive.scan() if archive is not None else ()))
+    if rebuilt:
+        logger.info("Savdo statistikasi %d ta buyurtmadan qayta qurildi", rebuilt)
+    save_json(STATS_FILE, trade_stats)
+pending_generation = 0
+
+def on_shared_change(names):
+    # Boshqa ishchi kurslar/zaxiralar/bandlarni o'zgartirdi
+    render_cache.bump()
+    if "reserve_holds.json" in names or "reserves.json" in names:
+        ledger.reload()
+
+def sync_admin_view(update: types.Update):
+    # Buyurtmalarni boshqa ishchilar yozadi — admin ko'radigan /pending bazadan qaytadan yig'iladi
+    global pending_generation
+    event = update.message or update.callback_query
+    if event is None or not is_admin(event.from_user.id) or pending_generation == shared.generation:
+        return
+    pending.reset(repo.orders_by_status(PENDING_STATUS))
+    pending_generation = shared.generation
+
+if shared is not None:
+    shared.on_change = on_shared_change
+    dp.middleware.setup(RefreshMiddleware(shared, sync_admin_view if ADMIN_WORKER else None))
+broadcasts = BroadcastManager(bot, BROADCASTS_DIR, save_json, concurrency=BROADCAST_CONCURRENCY,
+                              on_blocked=lambda uid: mark_blocked(uid))
+# /find va bitta foydalanuvchiga xabar uchun qidiruv — faqat admin ishchisida (on_startup da quriladi)
+user_index = UserIndex()
+# Broadcast auditoriyasi (segmentlar) — ham faqat admin ishchisida
+segments = SegmentIndex(window_days=SEGMENT_DAYS, tz_offset=5 * 3600)
+# sqlite: indekslarga olingan oxirgi users.rowid va orders.rowid (boshqa ishchilar yozganlarini keyin qo'shish uchun)
+index_rowids = [0, 0]
+# qurib bo'lmagan indekslar: nomi -> oxirgi xato (admin javoblarida ko'rsatiladi)
+index_errors: Dict[str, str] = {}
+INDEX_BUILD_ATTEMPTS = 3
+
+async def fetch_profile(uid: int):
+    chat = await bot.get_chat(uid)
+    return chat.full_name or f"Foydalanuvchi {uid}", chat.username
+
+def stored_profile(uid: int):
+    record = users.get(str(uid))
+    if not record or not record.get("name"):
+        return None
+    return record["name"], record.get("username") or None
+
+# Kanal postlari uchun ism/username — har tasdiqlashda get_chat chaqirilmaydi
+profiles = ProfileCache(fetch_profile, stored_profile, ttl=PROFILE_TTL, maxsize=PROFILE_CACHE_SIZE)
+# on_startup da bir marta to'ldiriladi
+bot_link = None
 
 class BuyFSM(StatesGroup):
     choose_currency = State()
@@ -89,6 +302,7 @@ class AdminFSM(StatesGroup):
     card_set_amount = State()
     broadcast_choose = State()
     broadcast_target = State()
+    broadcast_segment = State()
     broadcast_media = State()
     help_video_set_video = State()
     help_video_set_text = State()
@@ -107,19 +321,163 @@ def is_admin(user_id):
 
 def ensure_user(uid, user=None):
     key = str(uid)
-    if key not in users:
-        users[key] = {
+    record = users.get(key)
+    if record is None:
+        record = {
             "id": int(uid),
             "name": user.full_name if user else "",
             "username": user.username if user else "",
             "joined_at": int(time.time()),
             "orders": []
         }
-        save_json(USERS_FILE, users)
-    return users[key]
+        repo.save_user(key, record)
+        index_user(uid, record)
+        if ADMIN_WORKER:
+            segments.add_user(int(uid), record)
+    elif user is not None and (record.get("name") or "", record.get("username") or "") != (user.full_name or "", user.username or ""):
+        # Ism/username o'zgargan — /find yangisi bo'yicha topsin
+        record["name"], record["username"] = user.full_name or "", user.username or ""
+        repo.save_user(key, record)
+        index_user(uid, record)
+    if user is not None:
+        # Update ichidagi ma'lumot eng yangisi — keshni bepul yangilaymiz
+        profiles.seed(uid, user.full_name or f"Foydalanuvchi {uid}", user.username)
+    return record
+
+def index_user(uid, record: dict):
+    if not ADMIN_WORKER:
+        return
+    user_index.add(int(uid), record.get("name"), record.get("username"))
+    if user_index.needs_compact:
+        asyncio.get_event_loop().create_task(user_index.compact())
+
+async def build_indexes():
+    # Ketma-ket: bitta CPU da ikkala qurish parallel ketsa ham tezlashmaydi, faqat xotira cho'qqisi oshadi
+    if hasattr(repo, "last_rowids"):
+        index_rowids[:] = repo.last_rowids()
+    await build_with_retry("users", lambda: user_index.build(repo.user_names()))
+    await build_with_retry("segments", lambda: segments.build(repo.iter_users(), repo.iter_orders()))
+
+async def build_with_retry(name: str, build: Callable[[], Awaitable[Any]]):
+    # Qurish (masalan, snapshot yozilayotgan paytdagi I/O xatosi) bir necha marta qayta urinadi;
+    # baribir bo'lmasa xato index_errors da qoladi va adminga ko'rsatiladi
+    for attempt in range(INDEX_BUILD_ATTEMPTS):
+        try:
+            await build()
+        except Exception as e:
+            index_errors[name] = str(e) or type(e).__name__
+            logger.exception("'%s' indeksini qurib bo'lmadi (%d/%d): %s", name, attempt + 1, INDEX_BUILD_ATTEMPTS, e)
+            if attempt + 1 < INDEX_BUILD_ATTEMPTS:
+                await asyncio.sleep(5 * 2 ** attempt)
+            continue
+        index_errors.pop(name, None)
+        return
+    logger.error("'%s' indeksi qurilmadi, qidiruv/segmentlar to'liq ishlamaydi", name)
+
+async def sync_indexes():
+    # sqlite: boshqa ishchilar qo'shgan yoki o'zgartirgan foydalanuvchilar va buyurtmalar (rowid bo'yicha)
+    if not hasattr(repo, "users_since"):
+        return
+    users_mark, orders_mark = index_rowids
+    user_rows, order_rows = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: (list(repo.users_since(users_mark)), list(repo.orders_since(orders_mark))))
+    for rowid, uid, user in user_rows:
+        user_index.add(uid, user.get("name"), user.get("username"))
+        segments.add_user(uid, user)
+        index_rowids[0] = max(index_rowids[0], rowid)
+    for rowid, order in order_rows:
+        # shu ishchining o'z buyurtmalari ikkinchi marta tushadi — bitmaplar uchun farqi yo'q
+        segments.add_order(order)
+        index_rowids[1] = max(index_rowids[1], rowid)
+    if user_index.needs_compact:
+        asyncio.get_event_loop().create_task(user_index.compact())
+
+def mark_blocked(uid: int):
+    # Broadcast paytida BotBlocked va shu kabilar — /start bosguncha segmentlarda "blocked"
+    record = users.get(str(uid))
+    if record is not None and not record.get("blocked_at"):
+        record["blocked_at"] = int(time.time())
+        repo.save_user(str(uid), record)
+    segments.set_blocked(uid)
+
+def peek_user(uid) -> Optional[dict]:
+    # Faqat o'qish uchun: yozuv keshga olinmaydi (SnapshotMap.peek) — qidiruv RSS ni o'stirmaydi
+    peek = getattr(users, "peek", users.get)
+    return peek(str(uid))
+
+async def find_users(query: str, limit: int = 8):
+    await sync_indexes()
+    return user_index.search(query, peek_user, limit=limit)
+
+def user_order_count(uid: int, record: Optional[dict] = None) -> int:
+    if record is None:
+        record = peek_user(uid) or {}
+    archive = getattr(repo, "archive", None)
+    return len(record.get("orders", [])) + (archive.user_count(uid) if archive is not None else 0)
+
+def render_user_matches(query: str, matches, truncated: bool, action: str):
+    # action: "message" — /find (xabar/buyurtmalar), "pick" — bitta foydalanuvchiga xabar oqimi
+    lines = [f"🔎 «{html.escape(query)}» bo'yicha {len(matches)} ta natija:\n\n"]
+    kb = types.InlineKeyboardMarkup()
+    for n, (uid, _) in enumerate(matches, 1):
+        record = peek_user(uid) or {}
+        name = record.get("name") or f"Foydalanuvchi {uid}"
+        handle = f" @{record['username']}" if record.get("username") else ""
+        lines.append(f"{n}. <b>{html.escape(name)}</b>{html.escape(handle)} — <code>{uid}</code>, "
+                     f"{user_order_count(uid, record)} ta buyurtma\n")
+        if action == "pick":
+            kb.add(types.InlineKeyboardButton(f"{n}. {name[:32]}", callback_data=f"find|pick|{uid}"))
+        else:
+            kb.row(types.InlineKeyboardButton(f"✉️ {n}. {name[:24]}", callback_data=f"admin_order|message_user|{uid}"),
+                   types.InlineKeyboardButton("📋 Buyurtmalar", callback_data=f"find|o|{uid}"))
+    if truncated:
+        lines.append("\nMos keladiganlar juda ko'p — aniqroq yozing.")
+    if "users" in index_errors:
+        lines.append(f"\n⚠️ Indeksni qurib bo'lmadi ({html.escape(index_errors['users'])}), natijalar to'liq emas.")
+    elif not user_index.ready:
+        lines.append("\n⏳ Indeks hali qurilmoqda, natijalar to'liq bo'lmasligi mumkin.")
+    return "".join(lines), kb
+
+def segment_presets():
+    # (nomi, ifoda) — tayyor segmentlar; bloklaganlar hech biriga kirmaydi
+    presets = [("🌍 Hammasi", "all & !blocked"),
+               ("🛒 Buyurtma berganlar", "ordered & !blocked"),
+               ("🆕 Hali buyurtma bermaganlar", "!ordered & !blocked"),
+               ("⚡ Faol, 7 kun", "active:7 & !blocked"),
+               ("📅 Faol, 30 kun", "active:30 & !blocked"),
+               ("👋 Yangi, 7 kun", "new:7 & !blocked")]
+    for code in list(currencies)[:SEGMENT_CURRENCY_PRESETS]:
+        presets.append((f"🟢 {code} olganlar, 30 kun", f"buy:{code}:30 & !blocked"))
+        presets.append((f"🔴 {code} sotganlar, 30 kun", f"sell:{code}:30 & !blocked"))
+    return presets
+
+def segment_counts(presets):
+    # Bloklovchi (1M foydalanuvchida bir necha o'n ms) — thread poolda chaqiriladi
+    counted = []
+    for label, expression in presets:
+        try:
+            counted.append((label, expression, segments.count(segments.evaluate(expression))))
+        except ValueError:
+            continue
+    return counted
+
+async def choose_segment(message: types.Message, state: FSMContext, expression: str):
+    await sync_indexes()
+    try:
+        audience = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: segments.count(segments.evaluate(expression)))
+    except ValueError as e:
+        return await message.answer(f"⚠️ {e}")
+    if not audience:
+        return await message.answer(f"«{expression}» segmentida hech kim yo'q. Boshqasini tanlang.")
+    await state.update_data(target="segment", segment=expression)
+    await message.answer(f"🎯 Segment: {expression}\n👥 Auditoriya: {audience} ta foydalanuvchi\n\n"
+                         "Xabarni yuboring (matn, rasm, video):")
+    await AdminFSM.broadcast_media.set()
 
 def new_order_id():
-    return str(int(time.time() * 1000))
+    # Bir millisekundda kelgan ikki buyurtma ham turli ID oladi
+    return order_ids.next_id()
 
 def is_working_hours():
     tz = pytz.timezone("Asia/Tashkent")
@@ -127,17 +485,22 @@ def is_working_hours():
     hour = now.hour
     return 8 <= hour < 22
 
-def main_menu_kb(uid=None):
+def _build_main_menu_kb(admin: bool):
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.row("📉 Sotish kursi", "📈 Sotib olish kursi")
     kb.row("💲 Sotib olish", "💰 Sotish")
     kb.row("📋 Mening buyurtmalarim", "🕒 Ish vaqti")
     kb.row("📖 Foydalanish qo'llanmasi", "💳 Karta va kripto zaxiralari")
     kb.row("📨 Adminga xabar yuborish")
-    if uid and is_admin(uid):
+    if admin:
         kb.add("⚙️ Admin Panel")
     return kb
 
+def main_menu_kb(uid=None):
+    # Ikki variant (admin / oddiy foydalanuvchi) bir marta yasaladi va qayta ishlatiladi
+    admin = bool(uid and is_admin(uid))
+    return render_cache.get(("main_menu_kb", admin), lambda: _build_main_menu_kb(admin), static=True)
+
 def back_kb():
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("⏹️ Bekor qilish")
@@ -155,60 +518,174 @@ def admin_order_kb(order_id: str, user_id: int) -> types.InlineKeyboardMarkup:
 # Shu uchun quyidagi ikkita handler o'zgarmaydi, lekin:
 # ✅ "💰 Sotish" va "💲 Sotib olish" tugmalariga bosganda — valyutalar yonma-yon chiqadi
 
-# ✅ Foydalanuvchiga kurslarni ko'rsatish
-@dp.message_handler(lambda m: "Sotish kursi" in m.text)
-async def show_sell_rates(message: types.Message):
-    if not currencies:
-        return await message.answer("⚠️ Hozircha valyuta mavjud emas.")
-    text = "📉 *Sotish kurslari (Siz bizga sotasiz — biz arzon sotib olamiz):*\n"
+def render_rates(title: str, field: str) -> str:
+    lines = [title]
     for code, info in currencies.items():
         name = info.get("name", code)
-        buy_rate = info.get("buy_rate", "—")
+        rate = info.get(field, "—")
         try:
-            formatted = f"{float(buy_rate):,}".replace(",", " ")
+            formatted = f"{float(rate):,}".replace(",", " ")
         except:
-            formatted = str(buy_rate)
-        text += f"{code} — {name}: {formatted} UZS\n"
+            formatted = str(rate)
+        lines.append(f"{code} — {name}: {formatted} UZS\n")
+    return "".join(lines)
+
+def record_rates(code: str):
+    # Tarixga yozishdagi xato kurs tahririni to'xtatmasin
+    info = currencies.get(code, {})
+    try:
+        rate_history.record(code, float(info.get("buy_rate")), float(info.get("sell_rate")))
+    except (TypeError, ValueError, OSError) as e:
+        logger.error("%s kursini tarixga yozib bo'lmadi: %s", code, e)
+
+def record_trade(order: dict, event: str, ts: Optional[int] = None, save: bool = True):
+    # Yig'ma hisoblagichlar (/stats); fayl fon xizmati orqali yoziladi.
+    # save=False — ommaviy ko'rib chiqishda fayl oxirida bir marta saqlanadi
+    trade_stats.record(order, event, ts)
+    if save:
+        save_json(STATS_FILE, trade_stats)
+    if ADMIN_WORKER:
+        # boshqa ishchilarning buyurtmalari segmentlarga sync_indexes orqali keladi
+        segments.record_order(order, event, ts)
+
+def fmt_rate(value: float) -> str:
+    return f"{value:,.2f}".rstrip("0").rstrip(".").replace(",", " ")
+
+def render_rates_history(code: str, days: int) -> str:
+    series = rate_history.series(code)
+    if not len(series):
+        return f"{code} uchun kurslar tarixi yo'q."
+    tz = 5 * 3600
+    _, buy, sell = series.last()
+    lines = [f"📈 {code} kurslari tarixi ({days} kun)\n",
+             f"Hozir: sotib olish {fmt_rate(buy)} · sotish {fmt_rate(sell)} · spread {fmt_rate(sell - buy)}\n",
+             f"Jami o'zgarishlar: {len(series)} ta, birinchisi "
+             f"{datetime.utcfromtimestamp(series.ts[0] + tz).strftime('%Y-%m-%d')}\n\n"]
+    lines.append("Kun: sotib olish | sotish | spread o'rtacha (min–max), o'zgarishlar\n")
+    for start, day in series.daily(days, tz_offset=tz):
+        def span(lo, hi):
+            return fmt_rate(lo) if lo == hi else f"{fmt_rate(lo)}–{fmt_rate(hi)}"
+        lines.append(
+            f"{datetime.utcfromtimestamp(start + tz).strftime('%d.%m')}: {span(day['buy_min'], day['buy_max'])} | "
+            f"{span(day['sell_min'], day['sell_max'])} | {fmt_rate(day['spread_mean'])} "
+            f"({span(day['spread_min'], day['spread_max'])}), {day['changes']}\n")
+    lines.append("\nOxirgi o'zgarishlar:\n")
+    for i in range(len(series) - 1, max(len(series) - 6, -1), -1):
+        when = datetime.utcfromtimestamp(series.ts[i] + tz).strftime("%d.%m %H:%M")
+        lines.append(f"• {when} — {fmt_rate(series.buy[i])} / {fmt_rate(series.sell[i])}\n")
+    return "".join(lines)
+
+def stats_period(arg: str, now: int):
+    # (grain, boshi, oxiri, nomi) yoki None: bugun | 24h | 7d | all
+    today = trade_stats.day_start(now)
+    arg = arg.lower()
+    if arg in ("", "today", "bugun"):
+        return "d", today, today + DAY, "bugun"
+    if arg[:-1].isdigit() and arg[-1] in "hd" and int(arg[:-1]) > 0:
+        n = int(arg[:-1])
+        if arg[-1] == "h":
+            if n > STATS_HOURLY_DAYS * 24:
+                return None
+            hour = now // HOUR * HOUR
+            return "h", hour - (n - 1) * HOUR, hour + HOUR, f"oxirgi {n} soat"
+        n = min(n, 3650)
+        return "d", today - (n - 1) * DAY, today + DAY, f"oxirgi {n} kun"
+    if arg in ("all", "hammasi"):
+        first = min((d for d in (p.first_day() for p in stats_parts()) if d is not None), default=today)
+        return "d", first, today + DAY, "butun davr"
+    return None
+
+def stats_parts():
+    # Shu ishchining hisoblagichlari + boshqa ishchilarning fayllari (ko'p ishchili rejim)
+    others = [path for path in glob.glob(os.path.join(DATA_DIR, STATS_PATTERN))
+              if os.path.abspath(path) != os.path.abspath(STATS_FILE)]
+    return [trade_stats] + [TradeStats.load(path, tz_offset=trade_stats.tz_offset) for path in others]
+
+def render_trade_stats(grain: str, start: int, end: int, label: str) -> str:
+    cells = merged_summary(stats_parts(), grain, start, end)
+    tz = trade_stats.tz_offset
+    lines = [f"📊 Savdo statistikasi — {label}\n",
+             f"{datetime.utcfromtimestamp(start + tz).strftime('%d.%m.%Y %H:%M')} – "
+             f"{datetime.utcfromtimestamp(end + tz).strftime('%d.%m.%Y %H:%M')}\n\n"]
+    if not cells:
+        lines.append("Bu davrda buyurtmalar yo'q.")
+        return "".join(lines)
+    turnover = {"buy": 0.0, "sell": 0.0}
+    for code in sorted({cur for cur, _, _ in cells}):
+        lines.append(f"<b>{code}</b>\n")
+        for order_type in ("buy", "sell"):
+            new, ok, no = (cells.get((code, order_type, event), [0, 0.0, 0.0]) for event in ("new", "ok", "no"))
+            if not (new[0] or ok[0] or no[0]):
+                continue
+            turnover[order_type] += ok[2]
+            lines.append(f"  {order_type.upper()}: 🆕 {new[0]} ta ({fmt_rate(new[1])}) · "
+                         f"✅ {ok[0]} ta ({fmt_rate(ok[1])}, {fmt_rate(ok[2])} UZS) · ❌ {no[0]} ta\n")
+    lines.append(f"\n💰 Tasdiqlangan aylanma: <b>{fmt_rate(sum(turnover.values()))}</b> UZS "
+                 f"(BUY {fmt_rate(turnover['buy'])}, SELL {fmt_rate(turnover['sell'])})")
+    return "".join(lines)
+
+def render_reserves() -> str:
+    lines = ["📦 *Kripto zaxiralari:*\n"]
+    if reserves:
+        for cur, amount in reserves.items():
+            held = ledger.held(cur)
+            if held:
+                lines.append(f"• {cur}: <code>{ledger.available(cur)}</code> (band: <code>{held}</code>)\n")
+            else:
+                lines.append(f"• {cur}: <code>{amount}</code>\n")
+    else:
+        lines.append("• Ma'lumot yo'q\n")
+    card_amt = card_balance.get("UZS", 0)
+    lines.append(f"\n💳 *Karta balansi:*\n• UZS: <code>{card_amt}</code>")
+    return "".join(lines)
+
+def render_currency_list() -> str:
+    lines = ["📄 *Valyutalar ro‘yxati:*\n"]
+    for code, info in currencies.items():
+        name = info.get("name", code)
+        lines.append(
+            f"💱 {code} — {name}\n"
+            f"  💰 Sotish (biz sotamiz): {info.get('sell_rate')}\n"
+            f"  💵 Sotib olish (biz sotib olamiz): {info.get('buy_rate')}\n"
+            f"  🏦 Sotish karta: {info.get('sell_card')}\n"
+            f"  💳 Sotib olish karta: {info.get('buy_card')}\n"
+        )
+    return "".join(lines)
+
+WORKING_HOURS_TEXT = (
+    "📅 **Ish vaqtimiz:**\n"
+    "Dushanbadan – Yakshanbagacha\n"
+    "🕗 08:00 – 🕙 22:00\n"
+    "⚠️ Eslatma: Tungi soat 22:00 dan ertalab 08:00 gacha buyurtma qabul qilinmaydi."
+)
+
+# ✅ Foydalanuvchiga kurslarni ko'rsatish
+@router.button("📉 Sotish kursi")
+async def show_sell_rates(message: types.Message):
+    if not currencies:
+        return await message.answer("⚠️ Hozircha valyuta mavjud emas.")
+    text = render_cache.get("sell_rates", lambda: render_rates(
+        "📉 *Sotish kurslari (Siz bizga sotasiz — biz arzon sotib olamiz):*\n", "buy_rate"))
     await message.answer(text, parse_mode="Markdown", reply_markup=main_menu_kb())
 
-@dp.message_handler(lambda m: "Sotib olish kursi" in m.text)
+@router.button("📈 Sotib olish kursi")
 async def show_buy_rates(message: types.Message):
     if not currencies:
         return await message.answer("⚠️ Hozircha valyuta mavjud emas.")
-    text = "📈 *Sotib olish kurslari (Siz bizdan sotib olasiz — biz qimmat sotasiz):*\n"
-    for code, info in currencies.items():
-        name = info.get("name", code)
-        sell_rate = info.get("sell_rate", "—")
-        try:
-            formatted = f"{float(sell_rate):,}".replace(",", " ")
-        except:
-            formatted = str(sell_rate)
-        text += f"{code} — {name}: {formatted} UZS\n"
+    text = render_cache.get("buy_rates", lambda: render_rates(
+        "📈 *Sotib olish kurslari (Siz bizdan sotib olasiz — biz qimmat sotasiz):*\n", "sell_rate"))
     await message.answer(text, parse_mode="Markdown", reply_markup=main_menu_kb())
 
-@dp.message_handler(text="🕒 Ish vaqti")
+@router.button("🕒 Ish vaqti")
 async def show_working_hours(message: types.Message):
-    text = (
-        "📅 **Ish vaqtimiz:**\n"
-        "Dushanbadan – Yakshanbagacha\n"
-        "🕗 08:00 – 🕙 22:00\n"
-        "⚠️ Eslatma: Tungi soat 22:00 dan ertalab 08:00 gacha buyurtma qabul qilinmaydi."
-    )
-    await message.answer(text, parse_mode="Markdown", reply_markup=main_menu_kb())
+    await message.answer(WORKING_HOURS_TEXT, parse_mode="Markdown", reply_markup=main_menu_kb())
 
-@dp.message_handler(text="💳 Karta va kripto zaxiralari")
+@router.button("💳 Karta va kripto zaxiralari")
 async def show_reserves(message: types.Message):
-    text = "📦 *Kripto zaxiralari:*\n"
-    if reserves:
-        for cur, amount in reserves.items():
-            text += f"• {cur}: <code>{amount}</code>\n"
-    else:
-        text += "• Ma'lumot yo'q\n"
-    card_amt = card_balance.get("UZS", 0)
-    text += f"\n💳 *Karta balansi:*\n• UZS: <code>{card_amt}</code>"
+    text = render_cache.get("reserves", render_reserves)
     await message.answer(text, parse_mode="HTML", reply_markup=main_menu_kb())
 
-@dp.message_handler(text="📖 Foydalanish qo'llanmasi")
+@router.button("📖 Foydalanish qo'llanmasi")
 async def show_help(message: types.Message):
     video = help_video_data.get("video")
     text = help_video_data.get("text", "Qo'llanma hali qo'shilmagan.")
@@ -225,7 +702,15 @@ async def show_help(message: types.Message):
 async def cmd_start(message: types.Message):
     uid_str = str(message.from_user.id)
     is_new = uid_str not in users
-    ensure_user(message.from_user.id, message.from_user)
+    record = ensure_user(message.from_user.id, message.from_user)
+    now = int(time.time())
+    # Faollik (segmentlardagi active:N) kuniga bir marta yoziladi; /start bosgan foydalanuvchi endi bloklamagan
+    if record.get("blocked_at") or segments.day(record.get("last_seen") or record.get("joined_at") or 0) != segments.day(now):
+        record["last_seen"] = now
+        record.pop("blocked_at", None)
+        repo.save_user(uid_str, record)
+        if ADMIN_WORKER:
+            segments.touch(message.from_user.id, now)
     if is_new:
         try:
             await bot.send_message(
@@ -242,18 +727,29 @@ async def cmd_start(message: types.Message):
         reply_markup=main_menu_kb(message.from_user.id)
     )
 
-@dp.message_handler(text="📋 Mening buyurtmalarim")
-async def my_orders(message: types.Message):
-    uid = str(message.from_user.id)
-    ensure_user(message.from_user.id, message.from_user)
-    user_orders = users.get(uid, {}).get("orders", [])
-    if not user_orders:
-        return await message.answer("📭 Sizda buyurtmalar mavjud emas.", reply_markup=main_menu_kb(uid))
-    text = "🧾 *Sizning so‘nggi buyurtmalaringiz:*\n"
-    for oid in user_orders[-10:][::-1]:
-        o = orders.get(oid)
-        if not o:
-            continue
+def render_orders_page(uid: str, before=None, after=None):
+    # (created_at, id) kursori bilan: "Eskiroq" — sahifadagi oxirgi buyurtmadan eski,
+    # "Yangiroq" — birinchisidan yangi buyurtmalar. Bitta ortiqcha buyurtma so'raymiz —
+    # shu yo'nalishda yana sahifa bormi, bilish uchun.
+    page = repo.user_orders(uid, MY_ORDERS_PAGE + 1, before=before, after=after)
+    if after is not None:
+        if len(page) <= MY_ORDERS_PAGE:
+            # eng yangi buyurtmalargacha yetdik — to'liq birinchi sahifa
+            return render_orders_page(uid)
+        has_newer = True
+        page = page[1:]
+    else:
+        has_older = len(page) > MY_ORDERS_PAGE
+        page = page[:MY_ORDERS_PAGE]
+    if not page:
+        return None, None
+    first, last = order_key(page[0]), order_key(page[-1])
+    if after is not None:
+        has_older = bool(repo.user_orders(uid, 1, before=last))
+    else:
+        has_newer = before is not None and bool(repo.user_orders(uid, 1, after=first))
+    text = "🧾 *Oldingi buyurtmalaringiz:*\n" if has_newer else "🧾 *Sizning so‘nggi buyurtmalaringiz:*\n"
+    for o in page:
         created = o["created_at"] + 5 * 3600
         date_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
         text += (
@@ -265,15 +761,56 @@ async def my_orders(message: types.Message):
             f"Yaratilgan: {date_str}\n"
             f"———————————————\n"
         )
-    await message.answer(text, parse_mode="Markdown", reply_markup=main_menu_kb(uid))
+    kb = None
+    if has_older or has_newer:
+        kb = types.InlineKeyboardMarkup()
+        buttons = []
+        if has_newer:
+            buttons.append(types.InlineKeyboardButton("➡️ Yangiroq", callback_data=f"my_orders|n|{first[0]}|{first[1]}"))
+        if has_older:
+            buttons.append(types.InlineKeyboardButton("⬅️ Eskiroq", callback_data=f"my_orders|o|{last[0]}|{last[1]}"))
+        kb.row(*buttons)
+    return text, kb
+
+@router.button("📋 Mening buyurtmalarim")
+async def my_orders(message: types.Message):
+    uid = str(message.from_user.id)
+    ensure_user(message.from_user.id, message.from_user)
+    text, kb = render_orders_page(uid)
+    if not text:
+        return await message.answer("📭 Sizda buyurtmalar mavjud emas.", reply_markup=main_menu_kb(uid))
+    await message.answer(text, parse_mode="Markdown", reply_markup=kb or main_menu_kb(uid))
+
+@dp.callback_query_handler(lambda c: c.data.startswith("my_orders|"))
+async def my_orders_page(call: types.CallbackQuery):
+    # my_orders|o|<created_at>|<id> — eskiroq, my_orders|n|... — yangiroq sahifa.
+    # Eski (offsetli) tugmalar birinchi sahifani ochadi.
+    parts = call.data.split("|")
+    cursor = None
+    if len(parts) == 4 and parts[1] in ("o", "n"):
+        try:
+            cursor = (int(parts[2]), parts[3])
+        except ValueError:
+            return await call.answer("Xato.")
+    if cursor is not None and parts[1] == "n":
+        text, kb = render_orders_page(str(call.from_user.id), after=cursor)
+    else:
+        text, kb = render_orders_page(str(call.from_user.id), before=cursor)
+    if not text:
+        return await call.answer("Boshqa buyurtma yo'q.")
+    try:
+        await call.message.edit_text(text, parse_mode="Markdown", reply_markup=kb)
+    except Exception as e:
+        logger.debug("Buyurtmalar sahifasini tahrirlashda xato: %s", e)
+    await call.answer()
 
 # ✅ "SOTIB OLISH" tugmasi — valyutalar yonma-yon chiqsin
-@dp.message_handler(lambda message: message.text == "💲 Sotib olish")
+@router.button("💲 Sotib olish")
 async def buy_start(message: types.Message):
     if not is_working_hours():
         await message.answer("🕗 Hozir ish vaqti emas.")
         return
-    available = [cur for cur in currencies.keys() if reserves.get(cur, 0) > 0]
+    available = [cur for cur in currencies.keys() if ledger.available(cur) > 0]
     if not available:
         await message.answer("⚠️ Zaxira yetarli emas.")
         return
@@ -285,7 +822,7 @@ async def buy_start(message: types.Message):
     await BuyFSM.choose_currency.set()
 
 # ✅ "SOTISH" tugmasi — valyutalar yonma-yon chiqsin
-@dp.message_handler(lambda m: m.text == "💰 Sotish")
+@router.button("💰 Sotish")
 async def sell_start(message: types.Message):
     if not is_working_hours():
         return await message.answer("Hozir ish vaqti emas.")
@@ -326,8 +863,8 @@ async def buy_amount(message: types.Message, state: FSMContext):
     if not currency:
         await state.finish()
         return await message.answer("Xatolik.")
-    if amt > reserves.get(currency, 0):
-        return await message.answer(f"Zaxira yetarli emas. Mavjud: {reserves.get(currency, 0)}")
+    if amt > ledger.available(currency):
+        return await message.answer(f"Zaxira yetarli emas. Mavjud: {ledger.available(currency)}")
     await state.update_data(amount=amt)
     await message.answer("Hamyon raqamingizni kiriting:", reply_markup=back_kb())
     await BuyFSM.next()
@@ -373,10 +910,31 @@ async def buy_confirm(message: types.Message, state: FSMContext):
     await message.answer("✅ Chekni yuboring:", reply_markup=back_kb())
     await BuyFSM.upload.set()
 
+def cancel_undelivered(order: dict, user: dict):
+    # Chek adminga yetib bormadi, foydalanuvchiga "xatolik" deyiladi — buyurtma /pending dan
+    # olinadi va bekor qilinadi, aks holda admin uni keyin tasdiqlab yuborishi mumkin edi
+    if order.get("status") in FINAL_STATUSES:
+        return
+    order["status"] = "❌ Bekor qilindi"
+    order["reviewed_at"] = int(time.time())
+    repo.save_order(order)
+    ledger.release(order["id"])
+    pending.remove(order["id"])
+    record_trade(order, "no")
+    if order["id"] in user.get("orders", []):
+        user["orders"].remove(order["id"])
+        repo.save_user(str(order["user_id"]), user)
+
 @dp.message_handler(content_types=['photo', 'document'], state=BuyFSM.upload)
 async def buy_upload(message: types.Message, state: FSMContext):
     data = await state.get_data()
     order_id = new_order_id()
+    # Zaxira shu yerda band qilinadi — tekshiruv va band qilish orasida boshqa xaridor o'tib ketolmaydi
+    if not ledger.place(order_id, data["currency"], data["amount"]):
+        await state.finish()
+        return await message.answer(
+            f"⚠️ Zaxira yetarli emas. Mavjud: {ledger.available(data['currency'])}",
+            reply_markup=main_menu_kb())
     order = {
         "id": order_id,
         "user_id": message.from_user.id,
@@ -390,12 +948,13 @@ async def buy_upload(message: types.Message, state: FSMContext):
         "photo_file_id": message.photo[-1].file_id if message.photo else None,
         "document_file_id": message.document.file_id if message.document else None,
     }
-    orders[order_id] = order
+    repo.save_order(order)
+    pending.add(order)
+    record_trade(order, "new")
     uid = str(message.from_user.id)
-    users.setdefault(uid, ensure_user(message.from_user.id, message.from_user))
-    users[uid].setdefault("orders", []).append(order_id)
-    save_json(ORDERS_FILE, orders)
-    save_json(USERS_FILE, users)
+    user = ensure_user(message.from_user.id, message.from_user)
+    user.setdefault("orders", []).append(order_id)
+    repo.save_user(uid, user)
     caption = f"🆕 Yangi BUY buyurtma\n👤 {message.from_user.full_name}\nID: {message.from_user.id}\nValyuta: {data['currency']}\nMiqdor: {data['amount']}\nHamyon: {data['wallet']}\nBuyurtma ID: {order_id}"
     kb = admin_order_kb(order_id, message.from_user.id)
     try:
@@ -405,6 +964,7 @@ async def buy_upload(message: types.Message, state: FSMContext):
             await bot.send_document(ADMIN_ID, message.document.file_id, caption=caption, reply_markup=kb)
     except Exception as e:
         logger.exception("Adminga yuborishda xato: %s", e)
+        cancel_undelivered(order, user)
         await message.answer("❌ Xatolik yuz berdi.")
         await state.finish()
         return
@@ -494,12 +1054,13 @@ async def sell_upload(message: types.Message, state: FSMContext):
         "photo_file_id": message.photo[-1].file_id if message.photo else None,
         "document_file_id": message.document.file_id if message.document else None,
     }
-    orders[order_id] = order
+    repo.save_order(order)
+    pending.add(order)
+    record_trade(order, "new")
     uid = str(message.from_user.id)
-    users.setdefault(uid, ensure_user(message.from_user.id, message.from_user))
-    users[uid].setdefault("orders", []).append(order_id)
-    save_json(ORDERS_FILE, orders)
-    save_json(USERS_FILE, users)
+    user = ensure_user(message.from_user.id, message.from_user)
+    user.setdefault("orders", []).append(order_id)
+    repo.save_user(uid, user)
     caption = f"🆕 Yangi SELL buyurtma\n👤 {message.from_user.full_name}\nID: {message.from_user.id}\nValyuta: {data['currency']}\nMiqdor: {data['amount']}\nHamyon: {data['wallet']}\nBuyurtma ID: {order_id}"
     kb = admin_order_kb(order_id, message.from_user.id)
     try:
@@ -509,12 +1070,57 @@ async def sell_upload(message: types.Message, state: FSMContext):
             await bot.send_document(ADMIN_ID, message.document.file_id, caption=caption, reply_markup=kb)
     except Exception as e:
         logger.exception("Adminga yuborishda xato: %s", e)
+        cancel_undelivered(order, user)
         await message.answer("❌ Xatolik yuz berdi.")
         await state.finish()
         return
     await message.answer("✅ Chek adminga yuborildi.", reply_markup=main_menu_kb())
     await state.finish()
 
+async def post_order_to_channel(order: dict):
+    global bot_link
+    full_name, username = await profiles.get(order["user_id"])
+    if bot_link is None:
+        bot_link = f"https://t.me/{(await bot.me).username}"
+    created_ts = order["created_at"] + 5 * 3600
+    date_str = time.strftime('%Y-%m-%d %H:%M', time.localtime(created_ts))
+    action_text = "sotib oldi!" if order["type"] == "buy" else "sotdi!"
+    caption = f"👤 <b>{full_name}</b> <code>{order['amount']}</code> {order['currency']} {action_text}\n💳 Hamyon: <code>{order['wallet']}</code>\n📅 Sana: {date_str}"
+    channel_kb = types.InlineKeyboardMarkup()
+    channel_kb.add(types.InlineKeyboardButton("🤖 Botga o'tish", url=bot_link))
+    if username:
+        user_link = f"https://t.me/{username}"
+        channel_kb.add(types.InlineKeyboardButton("👤 Foydalanuvchiga o'tish", url=user_link))
+    if order.get("photo_file_id"):
+        await bot.send_photo(CHANNEL_USERNAME, order["photo_file_id"], caption=caption, parse_mode="HTML", reply_markup=channel_kb)
+    elif order.get("document_file_id"):
+        await bot.send_document(CHANNEL_USERNAME, order["document_file_id"], caption=caption, parse_mode="HTML", reply_markup=channel_kb)
+    else:
+        await bot.send_message(CHANNEL_USERNAME, caption, parse_mode="HTML", reply_markup=channel_kb)
+
+async def report_channel_error(error: BaseException):
+    logger.error("Kanalga yuborishda xato: %s", error)
+    await bot.send_message(ADMIN_ID, f"❌ Xato:\n<code>{str(error)}</code>", parse_mode="HTML")
+
+async def mark_admin_message(message: types.Message, suffix: str):
+    # Admin chatidagi buyurtma xabariga natijani qo'shib qo'yish
+    if message.caption is not None or message.photo or message.document:
+        await message.edit_caption(f"{message.caption or ''}\n{suffix}", parse_mode="HTML")
+    else:
+        await message.edit_text(f"{message.text or ''}\n{suffix}", parse_mode="HTML")
+
+def queue_order_effects(order: dict, confirmed: bool, admin_message: Optional[types.Message] = None):
+    # Holat allaqachon saqlangan — qolgani fon ishchilarida, qayta urinishlar bilan
+    uid, order_id = order["user_id"], order["id"]
+    if confirmed:
+        side_effects.submit("notify_user", lambda: bot.send_message(uid, f"✅ Buyurtmangiz tasdiqlandi.\nID: {order_id}"))
+        side_effects.submit("channel_post", lambda: post_order_to_channel(order), on_failure=report_channel_error)
+    else:
+        side_effects.submit("notify_user", lambda: bot.send_message(uid, f"❌ Bekor qilindi.\nID: {order_id}"))
+    if admin_message is not None:
+        suffix = "✅ Tasdiqlandi." if confirmed else "❌ Bekor qilindi."
+        side_effects.submit("edit_caption", lambda: mark_admin_message(admin_message, suffix))
+
 @dp.callback_query_handler(lambda c: c.data.startswith("admin_order"))
 async def admin_order_callback(call: types.CallbackQuery, state: FSMContext):
     parts = call.data.split("|")
@@ -530,73 +1136,190 @@ async def admin_order_callback(call: types.CallbackQuery, state: FSMContext):
     order_id = parts[2]
     order = orders.get(order_id)
     if not order:
-        return await call.answer("Buyurtma topilmadi.")
-    uid = order["user_id"]
+        return await call.answer("Buyurtma topilmadi yoki arxivlangan.")
+    if order.get("status") in FINAL_STATUSES:
+        return await call.answer("Bu buyurtma allaqachon ko'rib chiqilgan.")
     if action == "confirm":
+        if order["type"] == "buy" and not ledger.commit(order_id, order["currency"], order["amount"]):
+            return await call.answer(
+                f"⚠️ Zaxira yetarli emas ({order['currency']}: {ledger.available(order['currency'])}).",
+                show_alert=True)
         order["status"] = "✅ Tasdiqlandi"
-        save_json(ORDERS_FILE, orders)
-        if order["type"] == "buy":
-            cur = order["currency"]
-            amt = order["amount"]
-            reserves[cur] = reserves.get(cur, 0) - amt
-            if reserves[cur] < 0:
-                reserves[cur] = 0
-            save_json(RESERVES_FILE, reserves)
-        try:
-            await bot.send_message(uid, f"✅ Buyurtmangiz tasdiqlandi.\nID: {order_id}")
-        except:
-            pass
-        try:
-            user = await bot.get_chat(uid)
-            full_name = user.full_name or f"Foydalanuvchi {uid}"
-            username = user.username
-            bot_info = await bot.me
-            bot_link = f"https://t.me/{bot_info.username}"
-            created_ts = order["created_at"] + 5 * 3600
-            date_str = time.strftime('%Y-%m-%d %H:%M', time.localtime(created_ts))
-            action_text = "sotib oldi!" if order["type"] == "buy" else "sotdi!"
-            caption = f"👤 <b>{full_name}</b> <code>{order['amount']}</code> {order['currency']} {action_text}\n💳 Hamyon: <code>{order['wallet']}</code>\n📅 Sana: {date_str}"
-            channel_kb = types.InlineKeyboardMarkup()
-            channel_kb.add(types.InlineKeyboardButton("🤖 Botga o'tish", url=bot_link))
-            if username:
-                user_link = f"https://t.me/{username}"
-                channel_kb.add(types.InlineKeyboardButton("👤 Foydalanuvchiga o'tish", url=user_link))
-            if order.get("photo_file_id"):
-                await bot.send_photo(CHANNEL_USERNAME, order["photo_file_id"], caption=caption, parse_mode="HTML", reply_markup=channel_kb)
-            elif order.get("document_file_id"):
-                await bot.send_document(CHANNEL_USERNAME, order["document_file_id"], caption=caption, parse_mode="HTML", reply_markup=channel_kb)
-            else:
-                await bot.send_message(CHANNEL_USERNAME, caption, parse_mode="HTML", reply_markup=channel_kb)
-        except Exception as e:
-            logger.exception("Kanalga yuborishda xato: %s", e)
-            await bot.send_message(ADMIN_ID, f"❌ Xato:\n<code>{str(e)}</code>", parse_mode="HTML")
-        try:
-            await call.message.edit_caption(f"{call.message.caption}\n✅ Tasdiqlandi.", parse_mode="HTML")
-        except:
-            try:
-                await call.message.edit_text(f"{call.message.text}\n✅ Tasdiqlandi.", parse_mode="HTML")
-            except:
-                pass
+        order["reviewed_at"] = int(time.time())
+        repo.save_order(order)
+        pending.remove(order_id)
+        record_trade(order, "ok")
+        # Tugmaga darhol javob — xabarlar va kanal posti fon rejimida
         await call.answer("Tasdiqlandi.")
+        queue_order_effects(order, True, call.message)
     elif action == "reject":
         order["status"] = "❌ Bekor qilindi"
-        save_json(ORDERS_FILE, orders)
-        try:
-            await bot.send_message(uid, f"❌ Bekor qilindi.\nID: {order_id}")
-        except:
-            pass
-        try:
-            caption = call.message.caption or call.message.text
-            await call.message.edit_caption(f"{caption}\n❌ Bekor qilindi.", parse_mode="HTML")
-        except:
-            try:
-                text = call.message.text or ""
-                await call.message.edit_text(f"{text}\n❌ Bekor qilindi.", parse_mode="HTML")
-            except:
-                pass
+        order["reviewed_at"] = int(time.time())
+        repo.save_order(order)
+        ledger.release(order_id)
+        pending.remove(order_id)
+        record_trade(order, "no")
         await call.answer("Bekor qilindi.")
+        queue_order_effects(order, False, call.message)
+
+# ---------- /pending — kutilayotgan buyurtmalar konsoli (ommaviy tasdiqlash) ----------
+
+# admin_id -> {"selected": set, "filter": None yoki (tur, qiymat), "page": int}
+pending_consoles: Dict[int, Dict[str, Any]] = {}
+
+def format_age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{int(seconds // 60)} daq"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} soat"
+    return f"{int(seconds // 86400)} kun"
+
+def pending_filtered(flt):
+    if flt is None:
+        return pending.list()
+    kind, value = flt
+    if kind == "c":
+        return pending.list(currency=value)
+    if kind == "t":
+        return pending.list(order_type=value)
+    return pending.list(age=AGE_BUCKETS[int(value)][1])
+
+def filter_label(flt) -> str:
+    if flt is None:
+        return "hammasi"
+    kind, value = flt
+    if kind == "a":
+        return AGE_BUCKETS[int(value)][1]
+    return value.upper()
+
+def render_pending_console(admin_id: int):
+    console = pending_consoles.setdefault(admin_id, {"selected": set(), "filter": None, "page": 0})
+    console["selected"] = {oid for oid in console["selected"] if oid in pending}
+    selected = console["selected"]
+    items = pending_filtered(console["filter"])
+    pages = max((len(items) + PENDING_PAGE - 1) // PENDING_PAGE, 1)
+    page = min(max(console["page"], 0), pages - 1)
+    console["page"] = page
+    now = time.time()
+    facets = pending.facets(now)
+    text = (
+        f"🗂 Kutilayotgan buyurtmalar: {len(pending)}\n"
+        f"💱 Valyuta: {', '.join(f'{k} {v}' for k, v in facets['currency'].items()) or '—'}\n"
+        f"🔁 Turi: {', '.join(f'{k.upper()} {v}' for k, v in facets['type'].items()) or '—'}\n"
+        f"⏳ Yoshi: {', '.join(f'{k}: {v}' for k, v in facets['age'].items()) or '—'}\n"
+        f"🔎 Filtr: {filter_label(console['filter'])} ({len(items)} ta)\n"
+        f"☑️ Tanlangan: {len(selected)}"
+    )
+    kb = types.InlineKeyboardMarkup()
+    for item in items[page * PENDING_PAGE:(page + 1) * PENDING_PAGE]:
+        mark = "☑️" if item["id"] in selected else "⬜"
+        kb.add(types.InlineKeyboardButton(
+            f"{mark} {item['type'].upper()} {item['amount']} {item['currency']} · {format_age(now - item['created_at'])}",
+            callback_data=f"pend|t|{item['id']}"))
+    kb.row(
+        types.InlineKeyboardButton("◀️", callback_data=f"pend|p|{page - 1}"),
+        types.InlineKeyboardButton(f"{page + 1}/{pages}", callback_data="pend|noop"),
+        types.InlineKeyboardButton("▶️", callback_data=f"pend|p|{page + 1}"),
+    )
+    kb.row(
+        types.InlineKeyboardButton("Hammasi", callback_data="pend|f|-"),
+        types.InlineKeyboardButton("BUY", callback_data="pend|f|t|buy"),
+        types.InlineKeyboardButton("SELL", callback_data="pend|f|t|sell"),
+    )
+    if facets["currency"]:
+        kb.row(*[types.InlineKeyboardButton(cur, callback_data=f"pend|f|c|{cur}") for cur in facets["currency"]][:8])
+    kb.row(*[types.InlineKeyboardButton(name, callback_data=f"pend|f|a|{i}") for i, (_, name) in enumerate(AGE_BUCKETS)])
+    kb.row(
+        types.InlineKeyboardButton("☑️ Sahifani tanlash", callback_data="pend|sp"),
+        types.InlineKeyboardButton("🧹 Tozalash", callback_data="pend|clr"),
+    )
+    kb.row(
+        types.InlineKeyboardButton(f"✅ Tasdiqlash ({len(selected)})", callback_data="pend|ok"),
+        types.InlineKeyboardButton(f"❌ Bekor qilish ({len(selected)})", callback_data="pend|no"),
+    )
+    return text, kb
+
+async def bulk_review(order_ids, confirm: bool):
+    # Tanlangan buyurtmalarni bitta paketda ko'rib chiqish
+    candidates = []
+    for oid in order_ids:
+        order = orders.get(oid)
+        if order and order.get("status") not in FINAL_STATUSES:
+            candidates.append(order)
+    refused = []
+    if confirm:
+        _, refused = ledger.commit_many([(o["id"], o["currency"], o["amount"]) for o in candidates if o["type"] == "buy"])
+        done = [o for o in candidates if o["id"] not in set(refused)]
+        status = "✅ Tasdiqlandi"
+    else:
+        ledger.release_many([o["id"] for o in candidates])
+        done = candidates
+        status = "❌ Bekor qilindi"
+    reviewed_at = int(time.time())
+    for order in done:
+        order["status"] = status
+        order["reviewed_at"] = reviewed_at
+        pending.remove(order["id"])
+        record_trade(order, "ok" if confirm else "no", reviewed_at, save=False)
+    if done:
+        repo.save_orders(done)
+        save_json(STATS_FILE, trade_stats)
+    for order in done:
+        queue_order_effects(order, confirm)
+    return done, refused
+
+@dp.message_handler(commands=["pending"], state="*")
+async def pending_cmd(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Sizda admin huquqi yo‘q.")
+    pending_consoles.setdefault(message.from_user.id, {"selected": set(), "filter": None, "page": 0})["page"] = 0
+    text, kb = render_pending_console(message.from_user.id)
+    await message.answer(text, reply_markup=kb)
+
+@dp.callback_query_handler(lambda c: c.data.startswith("pend|"), state="*")
+async def pending_callback(call: types.CallbackQuery):
+    if not is_admin(call.from_user.id):
+        return await call.answer("Siz admin emassiz.")
+    admin_id = call.from_user.id
+    console = pending_consoles.setdefault(admin_id, {"selected": set(), "filter": None, "page": 0})
+    parts = call.data.split("|")
+    action = parts[1]
+    notice = None
+    if action == "noop":
+        return await call.answer()
+    if action == "t":
+        console["selected"] ^= {parts[2]}
+    elif action == "p":
+        console["page"] = int(parts[2])
+    elif action == "f":
+        console["filter"] = None if parts[2] == "-" else (parts[2], parts[3])
+        console["page"] = 0
+    elif action == "sp":
+        items = pending_filtered(console["filter"])
+        page = console["page"]
+        console["selected"].update(i["id"] for i in items[page * PENDING_PAGE:(page + 1) * PENDING_PAGE])
+    elif action == "clr":
+        console["selected"].clear()
+    elif action in ("ok", "no"):
+        if not console["selected"]:
+            return await call.answer("Hech narsa tanlanmagan.")
+        await call.answer("⏳ Bajarilmoqda...")
+        done, refused = await bulk_review(sorted(console["selected"]), confirm=action == "ok")
+        console["selected"].clear()
+        notice = f"{'✅ Tasdiqlandi' if action == 'ok' else '❌ Bekor qilindi'}: {len(done)} ta"
+        if refused:
+            notice += f"\n⚠️ Zaxira yetmadi: {', '.join(refused)}"
+    text, kb = render_pending_console(admin_id)
+    if notice:
+        text = f"{notice}\n\n{text}"
+    try:
+        await call.message.edit_text(text, reply_markup=kb)
+    except Exception as e:
+        logger.debug("Pending konsolini tahrirlashda xato: %s", e)
+    if action not in ("ok", "no"):
+        await call.answer()
 
-@dp.message_handler(lambda m: m.text == "⚙️ Admin Panel")
+@router.button("⚙️ Admin Panel")
 async def admin_panel(message: types.Message):
     if not is_admin(message.from_user.id):
         return await message.answer("⛔ Sizda admin huquqi yo‘q.")
@@ -609,7 +1332,7 @@ async def admin_panel(message: types.Message):
     await message.answer("⚙️ Admin panel:", reply_markup=kb)
     await AdminFSM.main.set()
 
-@dp.message_handler(lambda m: m.text == "➕ Valyuta qo‘shish", state=AdminFSM.main)
+@router.button("➕ Valyuta qo‘shish", state=AdminFSM.main)
 async def add_currency_code(message: types.Message):
     await message.answer("Valyuta kodini kiriting (masalan: USDT):", reply_markup=back_kb())
     await AdminFSM.add_choose_code.set()
@@ -678,6 +1401,7 @@ async def add_sell_card(message: types.Message, state: FSMContext):
         "sell_card": message.text.strip()
     }
     save_json(CURRENCIES_FILE, currencies)
+    record_rates(data["code"])
     if data["code"] not in reserves:
         reserves[data["code"]] = 0
         save_json(RESERVES_FILE, reserves)
@@ -686,7 +1410,7 @@ async def add_sell_card(message: types.Message, state: FSMContext):
 
 # QOLGAN QISMLAR — O'ZGARMASDAN
 
-@dp.message_handler(lambda m: m.text == "✏️ Valyutani tahrirlash", state=AdminFSM.main)
+@router.button("✏️ Valyutani tahrirlash", state=AdminFSM.main)
 async def admin_edit_currency_start(message: types.Message):
     if not currencies:
         return await message.answer("Hech qanday valyuta mavjud emas.")
@@ -740,10 +1464,12 @@ async def admin_edit_value_set(message: types.Message, state: FSMContext):
             return await message.answer("Raqam kiriting.")
     currencies[currency][field] = val
     save_json(CURRENCIES_FILE, currencies)
+    if field in ["buy_rate", "sell_rate"]:
+        record_rates(currency)
     await message.answer(f"✅ {currency} valyutasi yangilandi ({field} = {val}).", reply_markup=main_menu_kb())
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "🗑️ Valyutani o‘chirish", state=AdminFSM.main)
+@router.button("🗑️ Valyutani o‘chirish", state=AdminFSM.main)
 async def admin_delete_currency(message: types.Message):
     if not currencies:
         return await message.answer("Valyutalar yo‘q.")
@@ -771,23 +1497,14 @@ async def admin_delete_currency_choose(message: types.Message, state: FSMContext
     await message.answer(f"🗑️ {name} o‘chirildi.", reply_markup=main_menu_kb())
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "📄 Valyutalar ro‘yxati", state=AdminFSM.main)
+@router.button("📄 Valyutalar ro‘yxati", state=AdminFSM.main)
 async def admin_list_currencies(message: types.Message):
     if not currencies:
         return await message.answer("Hozircha valyuta mavjud emas.")
-    text = "📄 *Valyutalar ro‘yxati:*\n"
-    for code, info in currencies.items():
-        name = info.get("name", code)
-        text += (
-            f"💱 {code} — {name}\n"
-            f"  💰 Sotish (biz sotamiz): {info.get('sell_rate')}\n"
-            f"  💵 Sotib olish (biz sotib olamiz): {info.get('buy_rate')}\n"
-            f"  🏦 Sotish karta: {info.get('sell_card')}\n"
-            f"  💳 Sotib olish karta: {info.get('buy_card')}\n"
-        )
+    text = render_cache.get("currency_list", render_currency_list)
     await message.answer(text, parse_mode="Markdown")
 
-@dp.message_handler(lambda m: m.text == "📦 Kripto zaxiralari", state=AdminFSM.main)
+@router.button("📦 Kripto zaxiralari", state=AdminFSM.main)
 async def admin_reserves_start(message: types.Message):
     if not currencies:
         return await message.answer("Avval valyuta qo'shing.")
@@ -829,7 +1546,7 @@ async def admin_reserves_amount(message: types.Message, state: FSMContext):
     await message.answer(f"✅ {currency} zaxirasi: {amount}", reply_markup=main_menu_kb())
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "💳 Karta balansi", state=AdminFSM.main)
+@router.button("💳 Karta balansi", state=AdminFSM.main)
 async def admin_card_balance_start(message: types.Message):
     current = card_balance.get("UZS", 0)
     await message.answer(f"Joriy karta balansi: {current} UZS\nYangi balansni kiriting:", reply_markup=back_kb())
@@ -852,7 +1569,7 @@ async def admin_card_balance_set(message: types.Message, state: FSMContext):
     await message.answer(f"✅ Karta balansi yangilandi: {amount} UZS", reply_markup=main_menu_kb())
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "🎥 Qo'llanma sozlamalari", state=AdminFSM.main)
+@router.button("🎥 Qo'llanma sozlamalari", state=AdminFSM.main)
 async def help_video_start(message: types.Message):
     await message.answer("📽️ Qo'llanma uchun videoni yuboring (yoki 'O‘chirish' deb yozing):", reply_markup=back_kb())
     await AdminFSM.help_video_set_video.set()
@@ -888,11 +1605,12 @@ async def help_video_set_text(message: types.Message, state: FSMContext):
     await message.answer("✅ Qo'llanma muvaffaqiyatli saqlandi.", reply_markup=main_menu_kb())
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "📩 Foydalanuvchilarga xabar", state=AdminFSM.main)
+@router.button("📩 Foydalanuvchilarga xabar", state=AdminFSM.main)
 async def admin_msg_choose(message: types.Message):
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("👤 Bitta foydalanuvchiga")
     kb.add("🌍 Barchasiga")
+    kb.add("🎯 Segment")
     kb.add("⏹️ Bekor qilish")
     await message.answer("Kimga xabar yubormoqchisiz?", reply_markup=kb)
     await AdminFSM.broadcast_choose.set()
@@ -905,31 +1623,88 @@ async def admin_msg_target_type(message: types.Message, state: FSMContext):
         return
     if message.text == "👤 Bitta foydalanuvchiga":
         await state.update_data(target="single")
-        await message.answer("Foydalanuvchi ID sini kiriting:")
+        await message.answer("Foydalanuvchi ID si, @username yoki ismini kiriting:")
         await AdminFSM.broadcast_target.set()
     elif message.text == "🌍 Barchasiga":
         await state.update_data(target="all")
         await message.answer("Xabarni yuboring (matn, rasm, video):")
         await AdminFSM.broadcast_media.set()
+    elif message.text == "🎯 Segment":
+        if "segments" in index_errors:
+            return await message.answer(f"⚠️ Segment indeksini qurib bo'lmadi: {index_errors['segments']}\n"
+                                        "Loglarni tekshiring; bot qayta ishga tushganda yana quriladi.")
+        if not segments.ready:
+            return await message.answer("⏳ Segment indeksi hali qurilmoqda, birozdan keyin urinib ko'ring.")
+        await sync_indexes()
+        counted = await asyncio.get_running_loop().run_in_executor(None, segment_counts, segment_presets())
+        await state.update_data(segment_presets=[expression for _, expression, _ in counted])
+        kb = types.InlineKeyboardMarkup()
+        for i, (label, _, audience) in enumerate(counted):
+            kb.add(types.InlineKeyboardButton(f"{label} — {audience}", callback_data=f"seg|{i}"))
+        await message.answer(
+            "Segmentni tanlang yoki ifoda yozing:\n"
+            f"<code>all, ordered, blocked, active:N, new:N, buy:KOD[:N], sell:KOD[:N]</code> (N ≤ {SEGMENT_DAYS})\n"
+            "&amp; — va, | — yoki, ! — emas, ( ) — guruhlash.\n"
+            "Misol: <code>buy:USDT:30 &amp; !sell:USDT &amp; !blocked</code>",
+            parse_mode="HTML", reply_markup=kb)
+        await AdminFSM.broadcast_segment.set()
     else:
         await message.answer("Noto‘g‘ri tanlov.")
 
+@dp.message_handler(state=AdminFSM.broadcast_segment)
+async def admin_msg_segment_expression(message: types.Message, state: FSMContext):
+    if message.text == "⏹️ Bekor qilish":
+        await admin_panel(message)
+        await state.finish()
+        return
+    expression = (message.text or "").strip()
+    if not expression:
+        return await message.answer("Iltimos, segment ifodasini yozing yoki ro'yxatdan tanlang.")
+    await choose_segment(message, state, expression)
+
+@dp.callback_query_handler(lambda c: c.data.startswith("seg|"), state=AdminFSM.broadcast_segment)
+async def admin_msg_segment_pick(call: types.CallbackQuery, state: FSMContext):
+    if not is_admin(call.from_user.id):
+        return await call.answer("Siz admin emassiz.")
+    presets = (await state.get_data()).get("segment_presets") or []
+    i = int(call.data.split("|")[1])
+    if i >= len(presets):
+        return await call.answer("Ro'yxat eskirgan, qaytadan tanlang.")
+    await choose_segment(call.message, state, presets[i])
+    await call.answer()
+
 @dp.message_handler(state=AdminFSM.broadcast_target)
 async def admin_msg_single_id(message: types.Message, state: FSMContext):
     if message.text == "⏹️ Bekor qilish":
         await admin_panel(message)
         await state.finish()
         return
-    try:
-        uid = int(message.text.strip())
-        if str(uid) not in users:
-            await message.answer("Bunday foydalanuvchi topilmadi.")
-            return
+    query = (message.text or "").strip()
+    if not query:
+        return await message.answer("Iltimos, ID, @username yoki ism kiriting.")
+    matches, truncated = await find_users(query)
+    if not matches:
+        return await message.answer("Bunday foydalanuvchi topilmadi.")
+    # Aniq ID/username yoki yagona natija — darhol tanlanadi, aks holda ro'yxatdan tanlash
+    if len(matches) == 1 or matches[0][1] >= SCORE_USERNAME:
+        uid = matches[0][0]
         await state.update_data(user_id=uid)
-        await message.answer("Xabarni yuboring (matn, rasm, video):")
+        name = (peek_user(uid) or {}).get("name") or uid
+        await message.answer(f"👤 {name} ({uid}) tanlandi.\nXabarni yuboring (matn, rasm, video):")
         await AdminFSM.broadcast_media.set()
-    except:
-        await message.answer("Iltimos, to'g'ri ID kiriting.")
+        return
+    text, kb = render_user_matches(query, matches, truncated, "pick")
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+@dp.callback_query_handler(lambda c: c.data.startswith("find|pick|"), state=AdminFSM.broadcast_target)
+async def admin_msg_pick_user(call: types.CallbackQuery, state: FSMContext):
+    if not is_admin(call.from_user.id):
+        return await call.answer("Siz admin emassiz.")
+    uid = int(call.data.split("|")[2])
+    await state.update_data(user_id=uid)
+    await AdminFSM.broadcast_media.set()
+    await call.message.answer(f"👤 {uid} tanlandi.\nXabarni yuboring (matn, rasm, video):")
+    await call.answer()
 
 @dp.message_handler(content_types=types.ContentTypes.ANY, state=AdminFSM.broadcast_media)
 async def admin_msg_send_final(message: types.Message, state: FSMContext):
@@ -948,12 +1723,25 @@ async def admin_msg_send_final(message: types.Message, state: FSMContext):
             return True
         except:
             return False
-    success = 0
     if target == "all":
-        for uid_str in users.keys():
-            if await send_to(int(uid_str)):
-                success += 1
-        await message.answer(f"✅ Xabar {success} ta foydalanuvchiga yuborildi.", reply_markup=main_menu_kb())
+        content = message_content(message)
+        if not content:
+            return await message.answer("⚠️ Bu turdagi xabarni yuborib bo'lmaydi.")
+        # Yuborish fon rejimida — admin panel band bo'lib qolmaydi
+        await broadcasts.start(content, [int(uid_str) for uid_str in users.keys()], message.chat.id)
+        await message.answer("📤 Yuborish boshlandi. Jarayon yuqoridagi xabarda ko'rsatib boriladi.", reply_markup=main_menu_kb())
+    elif target == "segment":
+        content = message_content(message)
+        if not content:
+            return await message.answer("⚠️ Bu turdagi xabarni yuborib bo'lmaydi.")
+        # Auditoriya yuborish paytida qayta hisoblanadi — tanlangandan keyin qo'shilganlar ham kiradi
+        await sync_indexes()
+        expression = data.get("segment")
+        targets = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: segments.members(segments.evaluate(expression)))
+        await broadcasts.start(content, targets, message.chat.id)
+        await message.answer(f"📤 «{expression}» segmentiga ({len(targets)} ta) yuborish boshlandi.",
+                             reply_markup=main_menu_kb())
     else:
         uid = data.get("user_id")
         if await send_to(uid):
@@ -962,7 +1750,7 @@ async def admin_msg_send_final(message: types.Message, state: FSMContext):
             await message.answer("❌ Xabar yuborilmadi.")
     await state.finish()
 
-@dp.message_handler(lambda m: m.text == "📨 Adminga xabar yuborish")
+@router.button("📨 Adminga xabar yuborish")
 async def contact_admin_start(message: types.Message):
     await message.answer("Xabaringizni yuboring (matn, rasm, video):", reply_markup=back_kb())
     await ContactAdminFSM.wait_message.set()
@@ -1024,10 +1812,241 @@ async def admin_reply_send(message: types.Message, state: FSMContext):
         await message.answer("❌ Xabar yuborib bo‘lmadi.")
     await state.finish()
 
+# ---------- /profile — event loop ni N soniya cProfile bilan o'lchash ----------
+profiler = Profiler()
+
+async def send_profile(report: str):
+    document = types.InputFile(io.BytesIO(report.encode("utf-8")), filename=f"profile-{int(time.time())}.txt")
+    try:
+        await bot.send_document(ADMIN_ID, document, caption="📊 Profil natijasi")
+    except Exception as e:
+        logger.exception("Profil natijasini yuborib bo'lmadi: %s", e)
+
+@dp.message_handler(commands=["profile"], state="*")
+async def profile_cmd(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Sizda admin huquqi yo‘q.")
+    # Ishlayotgan bo'lsa — to'xtatib natijani hozir yuborish
+    if profiler.running:
+        profiler.cancel()
+        return await message.answer("⏹ Profil to'xtatildi, natija yuborilmoqda...")
+    arg = message.get_args().strip()
+    seconds = min(max(int(arg), 1), 600) if arg.isdigit() else PROFILE_SECONDS
+    profiler.start(seconds, send_profile)
+    await message.answer(f"▶️ Profil {seconds} soniya yoziladi. Oldinroq to'xtatish uchun /profile ni qayta yuboring.")
+
+@dp.message_handler(commands=["rates_history"], state="*")
+async def rates_history_cmd(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Sizda admin huquqi yo‘q.")
+    args = message.get_args().split()
+    if not args:
+        known = ", ".join(sorted(set(rate_history.known()) | set(currencies))) or "—"
+        return await message.answer(f"Foydalanish: /rates_history KOD [kunlar]\nValyutalar: {known}")
+    code = args[0].upper()
+    days = min(max(int(args[1]), 1), 90) if len(args) > 1 and args[1].isdigit() else RATE_HISTORY_DAYS
+    try:
+        text = render_rates_history(code, days)
+    except ValueError:
+        text = "Bunday valyuta topilmadi."
+    await message.answer(text)
+
+@dp.message_handler(commands=["find"], state="*")
+async def find_cmd(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Sizda admin huquqi yo‘q.")
+    query = message.get_args().strip()
+    if not query:
+        return await message.answer("Foydalanish: /find ID | @username | ism")
+    matches, truncated = await find_users(query, limit=10)
+    if not matches:
+        return await message.answer("Hech kim topilmadi.")
+    text, kb = render_user_matches(query, matches, truncated, "message")
+    await message.answer(text, parse_mode="HTML", reply_markup=kb)
+
+@dp.callback_query_handler(lambda c: c.data.startswith("find|o|"), state="*")
+async def find_orders_callback(call: types.CallbackQuery):
+    if not is_admin(call.from_user.id):
+        return await call.answer("Siz admin emassiz.")
+    uid = int(call.data.split("|")[2])
+    page = repo.user_orders(uid, MY_ORDERS_PAGE)
+    if not page:
+        return await call.answer("Bu foydalanuvchida buyurtmalar yo'q.", show_alert=True)
+    lines = [f"🧾 {uid} ning so'nggi buyurtmalari:\n"]
+    for o in page:
+        date_str = datetime.utcfromtimestamp(o["created_at"] + 5 * 3600).strftime("%d.%m.%Y %H:%M")
+        lines.append(f"• {o['type'].upper()} {o['amount']} {o['currency']} — {o.get('status', '—')}, {date_str}, ID {o['id']}\n")
+    await call.message.answer("".join(lines))
+    await call.answer()
+
+@dp.message_handler(commands=["stats"], state="*")
+async def stats_cmd(message: types.Message):
+    if not is_admin(message.from_user.id):
+        return await message.answer("⛔ Sizda admin huquqi yo‘q.")
+    period = stats_period(message.get_args().strip(), int(time.time()))
+    if period is None:
+        return await message.answer(
+            f"Foydalanish: /stats [bugun | 24h | 7d | 30d | all]\nSoatlik ma'lumot oxirgi {STATS_HOURLY_DAYS} kun uchun saqlanadi.")
+    await message.answer(render_trade_stats(*period), parse_mode="HTML")
+
 @dp.message_handler()
 async def unknown(message: types.Message):
     await message.answer("❓ Noma'lum buyruq.", reply_markup=main_menu_kb())
 
+async def archive_orders_once() -> int:
+    cutoff = int(time.time() - ARCHIVE_AFTER_DAYS * 86400)
+    done = repo.archivable_orders(cutoff, FINAL_STATUSES)
+    if not done:
+        return 0
+    # fayl yozuvi thread poolda, lug'atlarni o'zgartirish esa event loopda
+    await asyncio.get_running_loop().run_in_executor(None, repo.archive.append, done)
+    repo.forget_orders(done)
+    logger.info("%d ta yakunlangan buyurtma arxivga ko'chirildi", len(done))
+    return len(done)
+
+async def archive_orders_loop():
+    while True:
+        try:
+            await archive_orders_once()
+        except Exception as e:
+            logger.exception("Buyurtmalarni arxivlashda xato: %s", e)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+async def expire_holds_loop():
+    while True:
+        try:
+            ledger.expire()
+        except Exception as e:
+            logger.exception("Muddati o'tgan zaxiralarni bo'shatishda xato: %s", e)
+        await asyncio.sleep(60)
+
+# Yozib olishda o'zgarmasdan qoladigan matnlar: tugmalar va valyuta kodlari
+KEYBOARD_TEXTS = {"⏹️ Bekor qilish", "✅ Chek yuborish", "⬅️ Orqaga", "👤 Bitta foydalanuvchiga", "🌍 Barchasiga",
+                  "🎯 Segment", "name", "buy_rate", "sell_rate", "buy_card", "sell_card"}
+
+# Tugmalar matnlari — birinchi chaqiruvda bir marta (barcha handlerlar shu paytgacha ro'yxatdan o'tgan)
+safe_texts: Optional[frozenset] = None
+
+def is_safe_text(text: str) -> bool:
+    global safe_texts
+    if safe_texts is None:
+        safe_texts = frozenset(KEYBOARD_TEXTS | router.texts())
+    # valyutalar admin tomonidan o'zgarishi mumkin — har safar joriy lug'atdan
+    return text in safe_texts or text in currencies
+
+recorder = None
+if RECORD_UPDATES:
+    # Sarlavhada qayta o'ynatish uchun sozlamalar (karta raqamlari yashiriladi)
+    recorder = UpdateRecorder(RECORDINGS_DIR, Scrubber(is_safe_text, keep_ids=[ADMIN_ID]), header={
+        "admin_id": ADMIN_ID,
+        "currencies": {code: {k: mask_text(v) if k.endswith("_card") else v for k, v in info.items()}
+                       for code, info in currencies.items()},
+        "reserves": reserves,
+    }, amount_states={s.state for s in (BuyFSM.amount, SellFSM.amount, AdminFSM.add_set_buy_rate,
+                                        AdminFSM.add_set_sell_rate, AdminFSM.edit_set_value,
+                                        AdminFSM.reserves_set_amount, AdminFSM.card_set_amount)})
+    dp.middleware.setup(recorder)
+
+def active_fsm_sessions() -> int:
+    if isinstance(storage, SQLiteStorage):
+        return storage.stats()["stored"]
+    return len(storage.data)
+
+def outbound_queue_depth() -> Dict[tuple, int]:
+    return {(name,): s["queue_depth"] for name, s in outbound.stats()["priorities"].items()}
+
+tracer = None
+if TRACE_SAMPLE > 0 or SLOW_UPDATE_MS > 0:
+    tracer = Tracer(TRACE_SAMPLE, SLOW_UPDATE_MS, TRACE_LOG_FILE, SLOW_LOG_FILE)
+    dp.middleware.setup(TracingMiddleware(tracer))
+    # Span beradigan chaqiruvlar: FSM storage, save_json, repozitoriy, har bir Bot API so'rovi
+    instrument(storage, "storage", ("get_state", "get_data", "set_state", "set_data", "update_data", "reset_state"))
+    instrument(repo, "repo", ("save_user", "save_order", "save_orders", "user_orders", "orders_by_status"))
+    persistence.mark_dirty = traced(persistence.mark_dirty, "save_json")
+    # api.<metod> — navbatda kutish (OutboundScheduler) bilan birga
+    bot.request = traced(bot.request, "api", label_arg=0)
+
+async def alert_stall(duration: float, stack: str):
+    # Oddiy yuborish yo'li (OutboundScheduler) orqali; stekning oxirgi qismi yetarli
+    await bot.send_message(ADMIN_ID, f"⚠️ Event loop {duration * 1000:.0f} ms to'xtab qoldi.\n\n{stack[-3000:]}")
+
+watchdog = None
+if STALL_MS > 0:
+    watchdog = LoopWatchdog(STALL_MS / 1000, on_stall=alert_stall if STALL_ALERTS else None,
+                            alert_interval=STALL_ALERT_INTERVAL)
+
+metrics_runner = None
+if metrics is not None:
+    dp.middleware.setup(MetricsMiddleware(metrics))
+    metrics.registry.gauge("obmen_fsm_sessions", "Faol FSM suhbatlari", collect=active_fsm_sessions)
+    metrics.registry.gauge("obmen_pending_orders", "Admin tasdig'ini kutayotgan buyurtmalar", collect=lambda: len(pending))
+    metrics.registry.gauge("obmen_save_queue", "Diskka yozilishini kutayotgan fayllar",
+                           collect=lambda: persistence.pending)
+    metrics.registry.gauge("obmen_side_effects_queue", "Fon vazifalari navbati", collect=lambda: side_effects.depth)
+    metrics.registry.gauge("obmen_outbound_queue", "Yuborish navbatidagi so'rovlar", ("priority",),
+                           collect=outbound_queue_depth)
+    if watchdog is not None:
+        metrics.registry.register(watchdog.histogram)
+
+async def on_startup(dp: Dispatcher):
+    global bot_link, metrics_runner
+    bot_link = f"https://t.me/{(await bot.me).username}"
+    if watchdog is not None:
+        watchdog.start()
+    if metrics is not None:
+        asyncio.get_event_loop().create_task(loop_lag_monitor(metrics))
+        try:
+            metrics_runner = await start_metrics_server(metrics.registry, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logger.error("Metrikalar serverini ishga tushirib bo'lmadi (%s:%d): %s", METRICS_HOST, METRICS_PORT, e)
+    persistence.start()
+    side_effects.start()
+    if not ADMIN_WORKER:
+        return
+    asyncio.get_event_loop().create_task(expire_holds_loop())
+    asyncio.get_event_loop().create_task(build_indexes())
+    asyncio.get_event_loop().create_task(archive_orders_loop())
+    resumed = broadcasts.resume_all()
+    if resumed:
+        logger.info("%d ta broadcast davom ettirildi", resumed)
+
+async def on_shutdown(dp: Dispatcher):
+    if watchdog is not None:
+        watchdog.stop()
+        logger.info("Event loop to'xtashlari: %s", watchdog.stats())
+    await side_effects.stop()
+    logger.info("Fon vazifalari statistikasi: %s", side_effects.stats())
+    await broadcasts.stop()
+    await persistence.stop()
+    logger.info("Saqlash statistikasi: %s", persistence.stats())
+    logger.info("Render kesh statistikasi: %s", render_cache.stats())
+    logger.info("Profil kesh statistikasi: %s", profiles.stats())
+    if ADMIN_WORKER:
+        logger.info("Foydalanuvchilar indeksi: %s", user_index.stats())
+        logger.info("Segment indeksi: %s", segments.stats())
+    logger.info("Chiquvchi xabarlar statistikasi: %s", outbound.stats())
+    if tracer is not None:
+        logger.info("Trace statistikasi: %s", tracer.stats())
+    if recorder is not None:
+        recorder.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    if shared is not None:
+        logger.info("Umumiy holat statistikasi: %s", shared.stats())
+        shared.close()
+
 if __name__ == "__main__":
     print("🤖 Obmen bot ishga tushmoqda...")
-    executor.start_polling(dp, skip_updates=True)
+    if ROLE == "worker":
+        # updatelar scaleout.py frontidan unix socket orqali keladi
+        run_worker(dp, WORKER_SOCKET, on_startup=on_startup, on_shutdown=on_shutdown,
+                   workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE)
+    elif RUN_MODE == "webhook":
+        start_webhook(
+            dp, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT,
+            secret=WEBHOOK_SECRET, url=WEBHOOK_URL,
+            on_startup=on_startup, on_shutdown=on_shutdown,
+            workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE_SIZE,
+        )
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -0,0 +1,139 @@
+# order_archive.py — yakunlangan buyurtmalar uchun faqat qo'shiladigan (append-only) arxiv
+# -*- coding: utf-8 -*-
+# orders_archive.jsonl — har qatorda bitta buyurtma (ixcham JSON)
+# orders_archive.idx   — qat'iy o'lchamli yozuvlar: (user_id, offset, length)
+# Xotirada faqat foydalanuvchi -> offsetlar massivi saqlanadi, buyurtmalarning
+# o'zi kerak bo'lganda (masalan, "Eskiroq" sahifasi) fayldan o'qiladi.
+import os
+import json
+import struct
+import threading
+import logging
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_RECORD = struct.Struct("<qqq")
+
+
+class OrderArchive:
+    def __init__(self, data_path: str, index_path: str):
+        self.data_path = data_path
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        # user_id -> [offset0, length0, offset1, length1, ...] (eskidan yangiga)
+        self._by_user: Dict[int, array] = {}
+        self._count = 0
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        data_size = os.path.getsize(self.data_path) if os.path.exists(self.data_path) else 0
+        with open(self.index_path, "rb") as f:
+            raw = f.read()
+        usable = len(raw) - len(raw) % INDEX_RECORD.size
+        if usable != len(raw):
+            # keyingi yozuvlar to'g'ri chegaradan boshlanishi uchun kesilgan qismni olib tashlaymiz
+            logger.warning("Arxiv indeksining oxiri kesilgan, %d bayt olib tashlandi", len(raw) - usable)
+            with open(self.index_path, "r+b") as f:
+                f.truncate(usable)
+        for user_id, offset, length in INDEX_RECORD.iter_unpack(raw[:usable]):
+            if offset + length > data_size:
+                # ma'lumot yozilmay qolgan yozuv (jarayon yozish paytida to'xtagan)
+                continue
+            self._by_user.setdefault(user_id, array("q")).extend((offset, length))
+            self._count += 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def user_count(self, user_id) -> int:
+        with self._lock:
+            return len(self._by_user.get(int(user_id), ())) // 2
+
+    def append(self, orders: Iterable[dict]) -> int:
+        # Bloklovchi I/O — event loopdan run_in_executor orqali chaqiriladi
+        lines = [(int(o["user_id"]), (json.dumps(o, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+                 for o in orders]
+        if not lines:
+            return 0
+        entries = []
+        with self._lock:
+            with open(self.data_path, "ab") as data:
+                offset = data.tell()
+                for user_id, line in lines:
+                    data.write(line)
+                    entries.append((user_id, offset, len(line)))
+                    offset += len(line)
+                data.flush()
+                os.fsync(data.fileno())
+            with open(self.index_path, "ab") as index:
+                index.write(b"".join(INDEX_RECORD.pack(*e) for e in entries))
+                index.flush()
+                os.fsync(index.fileno())
+            for user_id, offset, length in entries:
+                self._by_user.setdefault(user_id, array("q")).extend((offset, length))
+            self._count += len(entries)
+        return len(entries)
+
+    def user_orders(self, user_id, limit: int, before: Optional[Tuple[int, str]] = None,
+                    after: Optional[Tuple[int, str]] = None) -> List[dict]:
+        # Foydalanuvchining arxivdagi buyurtmalari, yangidan eskiga.
+        # before/after — (created_at, id) kursori: undan qat'iy eski / qat'iy yangi buyurtmalar.
+        # Arxiv har bir foydalanuvchi uchun (created_at, id) tartibida yoziladi (archivable_orders
+        # saralab beradi), shuning uchun kursor o'rni ikkilik qidiruv bilan, log(n) ta o'qishda topiladi.
+        with self._lock:
+            spans = self._by_user.get(int(user_id))
+            if not spans:
+                return []
+            spans = array("q", spans)
+        total = len(spans) // 2
+        fd = os.open(self.data_path, os.O_RDONLY)
+        try:
+            loaded: Dict[int, dict] = {}
+
+            def load(i: int) -> dict:
+                if i not in loaded:
+                    loaded[i] = json.loads(os.pread(fd, spans[2 * i + 1], spans[2 * i]))
+                return loaded[i]
+
+            if after is not None:
+                start = self._bisect(total, load, after, strict=True)
+                positions = range(min(start + limit, total) - 1, start - 1, -1)
+            else:
+                end = total if before is None else self._bisect(total, load, before, strict=False)
+                positions = range(end - 1, max(end - limit, 0) - 1, -1)
+            return [load(i) for i in positions]
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _bisect(total: int, load: Callable[[int], dict], cursor: Tuple[int, str], strict: bool) -> int:
+        # Kursordan kichik (strict=True bo'lsa: kichik yoki teng) yozuvlar soni
+        lo, hi = 0, total
+        while lo < hi:
+            mid = (lo + hi) // 2
+            o = load(mid)
+            key = (o.get("created_at", 0), str(o["id"]))
+            if key < cursor or (strict and key == cursor):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def scan(self) -> Iterator[dict]:
+        # Arxivdagi barcha buyurtmalar, yozilish tartibida (statistikani qayta qurish uchun)
+        with self._lock:
+            size = self._count and os.path.getsize(self.data_path)
+        if not size:
+            return
+        with open(self.data_path, "rb") as f:
+            consumed = 0
+            for line in f:
+                consumed += len(line)
+                # indeksga yozilmay qolgan (uzilgan) oxirgi qator o'qilmaydi
+                if consumed > size or not line.endswith(b"\n"):
+                    break
+                yield json.loads(line)
@@ -0,0 +1,100 @@
+# order_ids.py — takrorlanmaydigan, o'suvchi buyurtma ID generatori (snowflake uslubida)
+# -*- coding: utf-8 -*-
+# ID = (EPOCH dan beri millisekundlar << SEQUENCE_BITS) | ketma-ketlik raqami
+# * bitta millisekundda 4096 tagacha ID; to'lib qolsa keyingi millisekund "qarzga" olinadi
+# * soat orqaga ketsa ham ID kamaymaydi (oxirgi vaqt belgisidan davom etadi)
+# * yuqori chegara (high-water mark) faylga yoziladi: qayta ishga tushgandan keyin
+#   ham yangi ID lar avvalgilaridan katta bo'ladi
+# ID 15-16 xonali son — callback_data (64 bayt) ga bemalol sig'adi va eski
+# time.time()*1000 ko'rinishidagi 13 xonali ID lardan doim katta.
+# Bir nechta ishchi jarayonda ketma-ketlikning quyi node_bits biti ishchi raqami
+# (node): har ishchi o'z chegara faylini yuritadi, ID lar esa hech qachon to'qnashmaydi.
+import os
+import glob
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+SEQUENCE_BITS = 12
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+LEASE_MS = 60_000
+
+
+def hwm_floor(pattern: str) -> int:
+    # Barcha ishchilar (va bitta jarayonli rejim) chegaralarining eng kattasi
+    floor = 0
+    for path in glob.glob(pattern):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                floor = max(floor, int(f.read().strip() or 0))
+        except (OSError, ValueError):
+            continue
+    return floor
+
+
+class OrderIdAllocator:
+    def __init__(self, hwm_path: str, lease_ms: int = LEASE_MS, node: int = 0, node_bits: int = 0,
+                 floor: int = 0):
+        if node >= 1 << node_bits or node_bits >= SEQUENCE_BITS:
+            raise ValueError(f"node={node} {node_bits} bitga sig'maydi")
+        self.hwm_path = hwm_path
+        self.lease_ms = lease_ms
+        self.node = node
+        self.node_bits = node_bits
+        self._sequence_mask = SEQUENCE_MASK >> node_bits
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+        self._leased_until = max(self._read_hwm(), floor)
+        # oldingi ishga tushirishda berilgan barcha ID lar shu chegaradan kichik
+        self._last_ms = self._leased_until
+        self.issued = 0
+
+    def _read_hwm(self) -> int:
+        try:
+            with open(self.hwm_path, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.error("ID chegarasini o'qishda xato (%s): %s", self.hwm_path, e)
+            return 0
+
+    def _write_hwm(self, value: int):
+        tmp_path = self.hwm_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(str(value))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.hwm_path)
+        except OSError as e:
+            logger.error("ID chegarasini yozishda xato (%s): %s", self.hwm_path, e)
+
+    @staticmethod
+    def _now_ms() -> int:
+        return int(time.time() * 1000) - EPOCH_MS
+
+    def next_int(self) -> int:
+        with self._lock:
+            now = self._now_ms()
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            else:
+                self._sequence = (self._sequence + 1) & self._sequence_mask
+                if self._sequence == 0:
+                    # shu millisekunddagi ketma-ketlik tugadi — keyingisini qarzga olamiz
+                    self._last_ms += 1
+            if self._last_ms >= self._leased_until:
+                # faylga kamdan-kam yoziladi: har lease_ms da bir marta
+                self._leased_until = self._last_ms + self.lease_ms
+                self._write_hwm(self._leased_until)
+            self.issued += 1
+            return (self._last_ms << SEQUENCE_BITS) | (self._sequence << self.node_bits) | self.node
+
+    def next_id(self) -> str:
+        return str(self.next_int())
@@ -0,0 +1,276 @@
+# outbound.py — Telegramga chiquvchi barcha xabarlar uchun yagona navbat
+# -*- coding: utf-8 -*-
+# ScheduledBot.request() orqali har bir yuborish/tahrirlash so'rovi
+# OutboundScheduler dan o'tadi (message.answer va call.message.edit_* ham):
+#   * har bir chat uchun alohida token bucket (shaxsiy chat ~1 msg/s,
+#     kanal/guruh ~20 msg/min) — bitta chatga ketma-ket xabarlar navbatda turadi
+#   * umumiy token bucket (~30 msg/s) ustuvorlik bo'yicha beriladi:
+#     foydalanuvchiga javob > kanal posti > broadcast
+#   * RetryAfter kelsa shu chat ham, umumiy navbat ham kutadi (Telegram limiti
+#     bot bo'yicha) va so'rov qayta yuboriladi
+#   * har ustuvorlik uchun navbat chuqurligi va kutish vaqti statistikasi
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.utils import exceptions
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_USER = 0
+PRIORITY_CHANNEL = 1
+PRIORITY_BROADCAST = 2
+PRIORITY_NAMES = {PRIORITY_USER: "user", PRIORITY_CHANNEL: "channel", PRIORITY_BROADCAST: "broadcast"}
+
+# Chatga xabar chiqaradigan metodlar; qolganlari (answerCallbackQuery, getChat, ...) navbatsiz
+THROTTLED_METHODS = frozenset({
+    "sendMessage", "sendPhoto", "sendVideo", "sendDocument", "sendAudio", "sendAnimation",
+    "sendVoice", "sendSticker", "sendMediaGroup", "copyMessage", "forwardMessage",
+    "editMessageText", "editMessageCaption", "editMessageReplyMarkup", "editMessageMedia",
+})
+
+_priority: ContextVar[Optional[int]] = ContextVar("send_priority", default=None)
+
+
+@contextmanager
+def send_priority(level: int):
+    # Shu blok ichidagi barcha yuborishlar berilgan ustuvorlikda navbatga turadi
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_private_chat(chat_id: Any) -> bool:
+    # Shaxsiy chat ID lari musbat; kanal/guruh — manfiy yoki "@username"
+    try:
+        return int(chat_id) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def busy(self) -> bool:
+        # kimdir token kutmoqda
+        return self._lock.locked()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class PriorityGate:
+    # Token bucket, lekin kutayotganlar orasidan eng yuqori ustuvorlikdagisi birinchi oladi
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority: int):
+        now = time.monotonic()
+        self._refill(now)
+        if not self._waiters and now >= self._paused_until and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._run())
+        await future
+
+    async def _run(self):
+        while self._waiters:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+
+class PriorityStats:
+    __slots__ = ("waiting", "sent", "errors", "wait_ms", "max_wait_ms")
+
+    def __init__(self):
+        self.waiting = 0
+        self.sent = 0
+        self.errors = 0
+        self.wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        done = self.sent + self.errors
+        return {
+            "queue_depth": self.waiting,
+            "sent": self.sent,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.wait_ms / done, 3) if done else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+
+class OutboundScheduler:
+    def __init__(self, channel_ids=(), global_rate: float = 30,
+                 private_rate: float = 1.0, private_burst: float = 3,
+                 group_rate: float = 20 / 60, group_burst: float = 3,
+                 max_retries: int = 3, idle_buckets: int = 5000):
+        self.channel_ids = {str(c) for c in channel_ids}
+        self.gate = PriorityGate(global_rate)
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.idle_buckets = idle_buckets
+        self._buckets: Dict[str, Tuple[TokenBucket, float]] = {}
+        self._stats = {level: PriorityStats() for level in PRIORITY_NAMES}
+        self.retry_after_total = 0
+        self.retry_after_seconds = 0.0
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        key = str(chat_id)
+        entry = self._buckets.get(key)
+        if entry is None:
+            if len(self._buckets) >= self.idle_buckets:
+                self._prune()
+            if is_private_chat(chat_id):
+                bucket = TokenBucket(self.private_rate, self.private_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+        else:
+            bucket = entry[0]
+        self._buckets[key] = (bucket, time.monotonic())
+        return bucket
+
+    def _prune(self):
+        # Bir daqiqadan beri ishlatilmagan chat bucketlari to'lgan bo'ladi — yangisi bilan bir xil
+        cutoff = time.monotonic() - 60
+        for key in [k for k, (bucket, used) in self._buckets.items() if used < cutoff and not bucket.busy]:
+            del self._buckets[key]
+
+    def classify(self, chat_id: Any) -> int:
+        level = _priority.get()
+        if level is not None:
+            return level
+        if str(chat_id) in self.channel_ids:
+            return PRIORITY_CHANNEL
+        return PRIORITY_USER
+
+    async def call(self, chat_id: Any, send: Callable[[], Awaitable[Any]]) -> Any:
+        level = self.classify(chat_id)
+        stats = self._stats[level]
+        bucket = self._bucket(chat_id)
+        queued_at = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            stats.waiting += 1
+            try:
+                await bucket.acquire()
+                await self.gate.acquire(level)
+            finally:
+                stats.waiting -= 1
+            if attempt == 0:
+                waited = (time.perf_counter() - queued_at) * 1000
+                stats.wait_ms += waited
+                stats.max_wait_ms = max(stats.max_wait_ms, waited)
+            try:
+                result = await send()
+            except exceptions.RetryAfter as e:
+                self.retry_after_total += 1
+                self.retry_after_seconds += e.timeout
+                logger.warning("Chat %s uchun RetryAfter %s s (%s)", chat_id, e.timeout, PRIORITY_NAMES[level])
+                bucket.pause(e.timeout)
+                self.gate.pause(e.timeout)
+                if attempt == self.max_retries:
+                    stats.errors += 1
+                    raise
+                continue
+            except Exception:
+                stats.errors += 1
+                raise
+            stats.sent += 1
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chats": len(self._buckets),
+            "retry_after_total": self.retry_after_total,
+            "retry_after_seconds": round(self.retry_after_seconds, 3),
+            "priorities": {PRIORITY_NAMES[level]: s.as_dict() for level, s in self._stats.items()},
+        }
+
+
+class ScheduledBot(Bot):
+    # Bot API ga boradigan yagona nuqta — chatga yozadigan so'rovlar navbatdan o'tadi
+    def __init__(self, *args, scheduler: Optional[OutboundScheduler] = None,
+                 observer: Optional[Callable[[str, float, Optional[BaseException]], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.scheduler = scheduler
+        # observer(metod, soniya, xato | None) — har bir HTTP so'rov uchun (metrikalar)
+        self.observer = observer
+
+    async def _observed(self, method, data, files, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return await super().request(method, data, files, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            try:
+                self.observer(method, time.perf_counter() - started, error)
+            except Exception as e:
+                logger.debug("observer xatosi: %s", e)
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        request = super().request if self.observer is None else self._observed
+        if self.scheduler is None or method not in THROTTLED_METHODS or not data or "chat_id" not in data:
+            return await request(method, data, files, **kwargs)
+        return await self.scheduler.call(data["chat_id"], lambda: request(method, data, files, **kwargs))
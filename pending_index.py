@@ -0,0 +1,117 @@
+# pending_index.py — admin ko'rib chiqishini kutayotgan buyurtmalar indeksi
+# -*- coding: utf-8 -*-
+# Xotirada faqat "waiting_admin" holatidagi buyurtmalarning qisqa ma'lumoti turadi.
+# Chek yuborilganda add(), holat o'zgarganda remove() chaqiriladi.
+# Valyuta va tur bo'yicha facetlar doim yangilanib boradi, yosh bo'yicha
+# guruhlar esa so'rov paytida hisoblanadi.
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+PENDING_STATUS = "waiting_admin"
+
+# (yuqori chegara soniyada, nomi)
+AGE_BUCKETS = (
+    (3600, "<1 soat"),
+    (6 * 3600, "1–6 soat"),
+    (24 * 3600, "6–24 soat"),
+    (None, ">1 kun"),
+)
+
+
+def age_bucket(age: float) -> str:
+    for limit, name in AGE_BUCKETS:
+        if limit is None or age < limit:
+            return name
+    return AGE_BUCKETS[-1][1]
+
+
+class PendingIndex:
+    def __init__(self, orders: Iterable[dict] = ()):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._by_currency: Dict[str, Set[str]] = {}
+        self._by_type: Dict[str, Set[str]] = {}
+        for order in orders:
+            self.add(order)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, order_id) -> bool:
+        return order_id in self._items
+
+    def get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return self._items.get(order_id)
+
+    def add(self, order: dict):
+        if order.get("status") != PENDING_STATUS:
+            return
+        order_id = order["id"]
+        if order_id in self._items:
+            self.remove(order_id)
+        item = {
+            "id": order_id,
+            "user_id": order["user_id"],
+            "type": order["type"],
+            "currency": order["currency"],
+            "amount": order["amount"],
+            "created_at": order.get("created_at", 0),
+        }
+        self._items[order_id] = item
+        self._by_currency.setdefault(item["currency"], set()).add(order_id)
+        self._by_type.setdefault(item["type"], set()).add(order_id)
+
+    def remove(self, order_id: str) -> bool:
+        item = self._items.pop(order_id, None)
+        if item is None:
+            return False
+        for facet, key in ((self._by_currency, item["currency"]), (self._by_type, item["type"])):
+            ids = facet.get(key)
+            if ids is not None:
+                ids.discard(order_id)
+                if not ids:
+                    del facet[key]
+        return True
+
+    def reset(self, orders: Iterable[dict]):
+        # Bazadan qaytadan: boshqa ishchi jarayonlar qo'shgan buyurtmalar bilan (OBMEN_WORKERS > 1)
+        self._items.clear()
+        self._by_currency.clear()
+        self._by_type.clear()
+        for order in orders:
+            self.add(order)
+
+    def update(self, order: dict):
+        if order.get("status") == PENDING_STATUS:
+            self.add(order)
+        else:
+            self.remove(order["id"])
+
+    def list(self, currency: Optional[str] = None, order_type: Optional[str] = None,
+             age: Optional[str] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Eng eskisi birinchi — admin avval uzoq kutganlarni ko'radi
+        if currency is not None:
+            ids: Iterable[str] = self._by_currency.get(currency, ())
+        elif order_type is not None:
+            ids = self._by_type.get(order_type, ())
+        else:
+            ids = self._items.keys()
+        items = [self._items[i] for i in ids]
+        if currency is not None and order_type is not None:
+            items = [i for i in items if i["type"] == order_type]
+        if age is not None:
+            now = now or time.time()
+            items = [i for i in items if age_bucket(now - i["created_at"]) == age]
+        items.sort(key=lambda i: (i["created_at"], i["id"]))
+        return items
+
+    def facets(self, now: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        now = now or time.time()
+        ages: Dict[str, int] = {}
+        for item in self._items.values():
+            bucket = age_bucket(now - item["created_at"])
+            ages[bucket] = ages.get(bucket, 0) + 1
+        return {
+            "currency": {k: len(v) for k, v in sorted(self._by_currency.items())},
+            "type": {k: len(v) for k, v in sorted(self._by_type.items())},
+            "age": {name: ages[name] for _, name in AGE_BUCKETS if name in ages},
+        }
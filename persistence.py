@@ -0,0 +1,217 @@
+# persistence.py — JSON fayllarni fon rejimida (write-behind) saqlash xizmati
+# -*- coding: utf-8 -*-
+# Handlerlar faqat faylni "iflos" deb belgilaydi (mark_dirty). Fon vazifasi har
+# flush_interval soniyada yig'ilgan o'zgarishlarni fayl boshiga bitta yozuvga
+# birlashtiradi va uni thread poolda atomar yozadi (vaqtinchalik fayl + os.replace).
+# Ma'lumot baytlarga event loop oqimida aylantiriladi (handlerlar bilan bir oqimda —
+# yarim o'zgargan lug'at yozilib qolmaydi), thread poolga faqat tayyor baytlar beriladi.
+# O'z formatida yoziladigan obyektlar prepare_write() -> (yozuvchi, yakun) beradi:
+#   yozuvchi(path) -> baytlar soni — thread poolda; yakun(ok) yoki None — yana loopda.
+import os
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+Writer = Callable[[str], int]
+Done = Optional[Callable[[bool], None]]
+
+
+def encode_json(data: Any, indent: Optional[int] = None) -> bytes:
+    # indent=None — bo'shliqsiz ixcham JSON (C enkoder, indent bilan esa sof Python)
+    separators = None if indent is not None else (",", ":")
+    return json.dumps(data, ensure_ascii=False, indent=indent, separators=separators).encode("utf-8")
+
+
+def write_bytes_atomic(path: str, payload: bytes, suffix: str = ".json") -> int:
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(payload)
+
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = 2) -> int:
+    # Sinxron yozish (skriptlar); data shu paytda boshqa oqimda o'zgarmasligi kerak
+    return write_bytes_atomic(path, encode_json(data, indent))
+
+
+def prepare_write(data: Any) -> Tuple[Writer, Done]:
+    # Event loop oqimida chaqiriladi: natija thread poolda xavfsiz yoziladi
+    prepare = getattr(data, "prepare_write", None)
+    if prepare is not None:
+        return prepare()
+    payload = encode_json(data)
+    return (lambda path: write_bytes_atomic(path, payload)), None
+
+
+class PersistenceService:
+    def __init__(self, flush_interval: float = 1.0, max_workers: int = 2,
+                 on_write: Optional[Callable[[str, float, Optional[int]], None]] = None):
+        self.flush_interval = flush_interval
+        # on_write(path, soniya, baytlar | None xatoda) — event loop oqimida chaqiriladi (metrikalar)
+        self.on_write = on_write
+        self._dirty: Dict[str, Any] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="persist")
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # hisoblagichlar
+        self.marks_total = 0
+        self.writes_total = 0
+        self.errors_total = 0
+        self.bytes_total = 0
+        self.flushes_total = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._flush_ms_sum = 0.0
+
+    def mark_dirty(self, path: str, data: Any):
+        self._dirty[path] = data
+        self.marks_total += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_writes": self.pending,
+            "marks_total": self.marks_total,
+            "writes_total": self.writes_total,
+            "coalesced_total": max(self.marks_total - self.writes_total - self.pending, 0),
+            "errors_total": self.errors_total,
+            "bytes_total": self.bytes_total,
+            "flushes_total": self.flushes_total,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self._flush_ms_sum / self.flushes_total, 3) if self.flushes_total else 0.0,
+        }
+
+    @staticmethod
+    def _write(path: str, writer: Writer):
+        # (baytlar, soniya) — vaqt thread poolda navbat kutishsiz o'lchanadi
+        started = time.perf_counter()
+        size = writer(path)
+        return size, time.perf_counter() - started
+
+    def _prepare(self, batch: Dict[str, Any]) -> Dict[str, Tuple[Writer, Done]]:
+        prepared = {}
+        for path, data in batch.items():
+            try:
+                prepared[path] = prepare_write(data)
+            except Exception as e:
+                self.errors_total += 1
+                self._observe(path, 0.0, None)
+                logger.exception("Yozishga tayyorlashda xato (%s): %s", path, e)
+                # yozish xatosidagi kabi: keyingi flushda qayta urinamiz (yangiroq ma'lumot bo'lsa, o'sha qoladi)
+                self._dirty.setdefault(path, data)
+        return prepared
+
+    @staticmethod
+    def _done(done: Done, ok: bool):
+        if done is not None:
+            done(ok)
+
+    def _observe(self, path: str, elapsed: float, size: Optional[int]):
+        if self.on_write is not None:
+            try:
+                self.on_write(path, elapsed, size)
+            except Exception as e:
+                logger.debug("on_write xatosi: %s", e)
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            batch, self._dirty = self._dirty, {}
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            # shu yergacha loopda: holat baytlarga aylantirilgan, keyingi o'zgarishlar unga tegmaydi
+            prepared = self._prepare(batch)
+            results = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, self._write, path, writer)
+                  for path, (writer, _) in prepared.items()),
+                return_exceptions=True,
+            )
+            for (path, (_, done)), result in zip(prepared.items(), results):
+                self._done(done, not isinstance(result, BaseException))
+                if isinstance(result, BaseException):
+                    self.errors_total += 1
+                    self._observe(path, 0.0, None)
+                    logger.error("Faylga yozishda xato (%s): %s", path, result)
+                    # keyingi flushda qayta urinib ko'ramiz (yangiroq ma'lumot bo'lsa, o'sha qoladi)
+                    self._dirty.setdefault(path, batch[path])
+                else:
+                    size, elapsed = result
+                    self.writes_total += 1
+                    self.bytes_total += size
+                    self._observe(path, elapsed, size)
+            self._record_flush((time.perf_counter() - started) * 1000)
+
+    def flush_sync(self):
+        # Event loop ishlamayotgan paytda (skriptlar, jarayon oxiri) ishlatiladi
+        batch, self._dirty = self._dirty, {}
+        started = time.perf_counter()
+        for path, (writer, done) in self._prepare(batch).items():
+            try:
+                size, elapsed = self._write(path, writer)
+            except Exception as e:
+                self._done(done, False)
+                self.errors_total += 1
+                self._observe(path, 0.0, None)
+                logger.exception("Faylga yozishda xato (%s): %s", path, e)
+                continue
+            self._done(done, True)
+            self.bytes_total += size
+            self.writes_total += 1
+            self._observe(path, elapsed, size)
+        if batch:
+            self._record_flush((time.perf_counter() - started) * 1000)
+
+    def _record_flush(self, elapsed_ms: float):
+        self.flushes_total += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._flush_ms_sum += elapsed_ms
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Fon saqlashda xato: %s", e)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_event_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # majburiy oxirgi flush
+        await self.flush()
+        self._executor.shutdown(wait=True)
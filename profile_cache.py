@@ -0,0 +1,106 @@
+# profile_cache.py — kanal postlari uchun foydalanuvchi ism/username keshi
+# -*- coding: utf-8 -*-
+# Har tasdiqlashda bot.get_chat(uid) chaqirmaslik uchun profillar LRU + TTL
+# keshida saqlanadi. Kesh ensure_user dagi yangi ma'lumot bilan to'ldiriladi,
+# keshda yo'q foydalanuvchi uchun esa avval users yozuvi (stored) ishlatiladi.
+# Muddati o'tgan yozuv darhol qaytariladi va fonda yangilanadi
+# (stale-while-revalidate); faqat umuman yo'q profil uchun so'rov kutiladi.
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (full_name, username)
+Profile = Tuple[str, Optional[str]]
+
+
+class ProfileCache:
+    def __init__(self, fetch: Callable[[int], Awaitable[Profile]],
+                 stored: Optional[Callable[[int], Optional[Profile]]] = None,
+                 ttl: float = 6 * 3600, maxsize: int = 20000):
+        self._fetch = fetch
+        self._stored = stored
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # uid -> (profile, fetched_at)
+        self._entries: "OrderedDict[int, Tuple[Profile, float]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def seed(self, uid: int, full_name: str, username: Optional[str], fetched_at: Optional[float] = None):
+        # fetched_at=0 — eski ma'lumot: ishlatiladi, lekin birinchi so'rovda yangilanadi
+        self._store(int(uid), (full_name, username or None), time.time() if fetched_at is None else fetched_at)
+
+    def _store(self, uid: int, profile: Profile, fetched_at: float):
+        self._entries[uid] = (profile, fetched_at)
+        self._entries.move_to_end(uid)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self, uid: int) -> asyncio.Future:
+        # Bir uid uchun bir vaqtda faqat bitta so'rov
+        future = self._inflight.get(uid)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(uid))
+            self._inflight[uid] = future
+        return future
+
+    async def _refresh(self, uid: int) -> Profile:
+        try:
+            profile = await self._fetch(uid)
+            self.refreshes += 1
+            self._store(uid, profile, time.time())
+            return profile
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._inflight.pop(uid, None)
+
+    async def get(self, uid: int) -> Profile:
+        uid = int(uid)
+        entry = self._entries.get(uid)
+        if entry is None and self._stored is not None:
+            profile = self._stored(uid)
+            if profile is not None:
+                entry = (profile, 0.0)
+                self._store(uid, profile, 0.0)
+        if entry is None:
+            self.misses += 1
+            return await self._load(uid)
+        profile, fetched_at = entry
+        self._entries.move_to_end(uid)
+        if time.time() - fetched_at < self.ttl:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+            future = self._load(uid)
+            future.add_done_callback(self._log_refresh_error)
+        return profile
+
+    @staticmethod
+    def _log_refresh_error(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug("Profilni fonda yangilab bo'lmadi: %s", future.exception())
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+        }
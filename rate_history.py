@@ -0,0 +1,147 @@
+# rate_history.py — valyuta kurslari tarixi (har o'zgarish — bitta yozuv)
+# -*- coding: utf-8 -*-
+# Har valyuta uchun bot_data/rate_history/ da uchta ustun fayli:
+#   <KOD>.ts   — int64, unix vaqt (o'suvchi)
+#   <KOD>.buy  — float64, buy_rate
+#   <KOD>.sell — float64, sell_rate
+# Fayllar mmap qilinadi va memoryview orqali o'qiladi (nusxa olinmaydi):
+#   at(ts)       — shu paytdagi kurs, bisect bilan O(log n)
+#   daily(...)   — kunlik min/max va vaqt bo'yicha o'rtacha spread; har kun uchun
+#                  ikkita bisect va faqat shu kundagi o'zgarishlar ko'riladi
+# Yozuv faqat kurs o'zgarganda qo'shiladi (admin tahriri); ustunlar uzunligi
+# har xil bo'lib qolsa (yozish paytida uzilish) — eng qisqasigacha kesiladi.
+import os
+import mmap
+import time
+import struct
+import logging
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (("ts", "q"), ("buy", "d"), ("sell", "d"))
+ITEM_SIZE = 8
+
+
+def _view(path: str, fmt: str, count: int) -> Any:
+    if count == 0:
+        return memoryview(b"").cast(fmt)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), count * ITEM_SIZE, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(fmt)
+
+
+class RateSeries:
+    def __init__(self, directory: str, code: str):
+        self.code = code
+        self.paths = {name: os.path.join(directory, f"{code}.{name}") for name, _ in COLUMNS}
+        self._map()
+
+    def _map(self):
+        sizes = [os.path.getsize(p) // ITEM_SIZE if os.path.exists(p) else 0 for p in self.paths.values()]
+        count = min(sizes)
+        for (name, _), size in zip(COLUMNS, sizes):
+            if size > count:
+                logger.warning("%s: %s ustuni %d -> %d yozuvga kesildi", self.code, name, size, count)
+                with open(self.paths[name], "r+b") as f:
+                    f.truncate(count * ITEM_SIZE)
+        # eski mmap lar havolalar yo'qolganda yopiladi
+        self.ts, self.buy, self.sell = (_view(self.paths[name], fmt, count) for name, fmt in COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def last(self) -> Optional[Tuple[int, float, float]]:
+        if not len(self.ts):
+            return None
+        return self.ts[-1], self.buy[-1], self.sell[-1]
+
+    def append(self, ts: int, buy: float, sell: float):
+        if len(self.ts) and ts < self.ts[-1]:
+            # soat orqaga ketsa ham ustun o'suvchi qoladi (bisect uchun)
+            ts = self.ts[-1]
+        # vaqt ustuni oxirida: uzilishda qolgan ortiqcha qiymatlar keyingi ochilishda kesiladi
+        for (name, fmt), value in zip(reversed(COLUMNS), (sell, buy, ts)):
+            with open(self.paths[name], "ab") as f:
+                f.write(struct.pack("=" + fmt, value))
+                f.flush()
+                os.fsync(f.fileno())
+        self._map()
+
+    def at(self, ts: int) -> Optional[Tuple[int, float, float]]:
+        # ts paytida amalda bo'lgan kurs (o'zgargan vaqti bilan)
+        i = bisect_right(self.ts, ts) - 1
+        if i < 0:
+            return None
+        return self.ts[i], self.buy[i], self.sell[i]
+
+    def window(self, start: int, end: int) -> Optional[Dict[str, Any]]:
+        # Oraliqda amalda bo'lgan barcha qiymatlar: boshidagi kurs + ichidagi o'zgarishlar
+        after = bisect_right(self.ts, start)
+        hi = bisect_left(self.ts, end)
+        first = max(after - 1, 0)
+        if first >= hi:
+            return None
+        buy, sell = self.buy[first:hi], self.sell[first:hi]
+        spreads = [s - b for b, s in zip(buy, sell)]
+        # spread vaqt bo'yicha o'rtacha: har qiymat keyingi o'zgarishgacha amalda
+        bounds = [max(t, start) for t in self.ts[first:hi]] + [end]
+        weighted = sum(spread * (bounds[k + 1] - bounds[k]) for k, spread in enumerate(spreads))
+        covered = end - bounds[0]
+        return {
+            "buy_min": min(buy), "buy_max": max(buy),
+            "sell_min": min(sell), "sell_max": max(sell),
+            "spread_min": min(spreads), "spread_max": max(spreads),
+            "spread_mean": weighted / covered if covered > 0 else spreads[-1],
+            "changes": hi - bisect_left(self.ts, start),
+        }
+
+    def daily(self, days: int, now: Optional[float] = None, tz_offset: int = 0) -> List[Tuple[int, Dict[str, Any]]]:
+        # Oxirgi `days` kun (mahalliy vaqt bo'yicha, bugun — to'liq bo'lmagan kun), eskisidan yangisiga
+        now = int(now or time.time())
+        today = (now + tz_offset) // 86400 * 86400 - tz_offset
+        result = []
+        for k in range(days - 1, -1, -1):
+            start = today - k * 86400
+            stats = self.window(start, min(start + 86400, now + 1))
+            if stats is not None:
+                result.append((start, stats))
+        return result
+
+
+class RateHistory:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._series: Dict[str, RateSeries] = {}
+
+    def series(self, code: str) -> RateSeries:
+        series = self._series.get(code)
+        if series is None:
+            if not code or not code.replace("_", "").replace("-", "").isalnum():
+                raise ValueError(f"Valyuta kodi fayl nomiga yaramaydi: {code!r}")
+            series = self._series[code] = RateSeries(self.directory, code)
+        return series
+
+    def known(self) -> List[str]:
+        return sorted({name.rsplit(".", 1)[0] for name in os.listdir(self.directory) if name.endswith(".ts")})
+
+    def record(self, code: str, buy: float, sell: float, ts: Optional[int] = None) -> bool:
+        series = self.series(code)
+        last = series.last()
+        if last is not None and last[1] == buy and last[2] == sell:
+            return False
+        series.append(int(ts or time.time()), buy, sell)
+        return True
+
+    def sync(self, currencies: Dict[str, Dict[str, Any]]) -> int:
+        # Ishga tushishda: tarixi yo'q yoki tarixsiz o'zgartirilgan valyutalar uchun joriy kurs yoziladi
+        recorded = 0
+        for code, info in currencies.items():
+            try:
+                buy, sell = float(info.get("buy_rate")), float(info.get("sell_rate"))
+            except (TypeError, ValueError):
+                continue
+            recorded += self.record(code, buy, sell)
+        return recorded
@@ -0,0 +1,165 @@
+# recorder.py — kiruvchi updatelarni yozib olish (OBMEN_RECORD_UPDATES=1)
+# -*- coding: utf-8 -*-
+# Har bir update vaqt belgisi bilan gzip JSONL faylga yoziladi; keyin
+# bench/replay_updates.py uni Dispatcher ga xuddi shu ritmda (yoki tezroq)
+# qayta beradi. Yozishdan oldin shaxsiy ma'lumotlar tozalanadi:
+#   * foydalanuvchi ID lari yozuvga xos kalit bilan psevdonimlanadi (admin ID si o'zgarmaydi)
+#   * ism, familiya, username, telefon, kontakt, joylashuv olib tashlanadi
+#   * fayl ID lari psevdonimlanadi (chek rasmlarini yuklab bo'lmaydi)
+#   * xavfsiz deb topilmagan matnlarda harf → "x", raqam → "0" (hamyon, karta)
+#   * raqamli matn (miqdor) faqat miqdor kiritiladigan FSM holatlarida o'zgarmaydi —
+#     boshqa joyda u telefon raqami bo'lishi mumkin ("901234567")
+# Fayl formati: birinchi qator — {"type": "header", ...}, keyin {"t": unix_vaqt, "update": {...}}.
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, Optional, Tuple
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+# forward_sender_name — yashirin profildan forward qilingan xabar egasining ismi,
+# *_signature — kanal postlari muallifi
+NAME_KEYS = {"first_name", "last_name", "title", "bio", "forward_sender_name", "author_signature", "forward_signature"}
+DROP_KEYS = {"phone_number", "vcard", "email", "contact", "location", "venue", "url", "invite_link"}
+FILE_KEYS = {"file_id", "file_unique_id"}
+TEXT_KEYS = {"text", "caption"}
+AMOUNT_RE = re.compile(r"^\d{1,9}([.,]\d{1,8})?$")
+# callback_data ichidagi foydalanuvchi ID lari (buyurtma ID lari ancha uzun)
+USER_ID_TOKEN_RE = re.compile(r"^\d{5,12}$")
+
+
+def mask_text(text: str) -> str:
+    # Uzunlik va shakl saqlanadi (ishlov berish narxi o'zgarmasin), mazmun yo'qoladi
+    return "".join("0" if ch.isdigit() else "x" if ch.isalnum() else ch for ch in text)
+
+
+class Scrubber:
+    def __init__(self, safe_text: Optional[Callable[[str], bool]] = None, keep_ids: Iterable[int] = (),
+                 key: Optional[bytes] = None):
+        self.safe_text = safe_text or (lambda text: False)
+        self.keep_ids = {int(i) for i in keep_ids}
+        # Kalit faylga yozilmaydi — psevdonimlarni asl ID ga qaytarib bo'lmaydi
+        self._key = key or os.urandom(32)
+
+    def _digest(self, value: str) -> int:
+        return int.from_bytes(hmac.new(self._key, value.encode(), hashlib.sha256).digest()[:8], "big")
+
+    def user_id(self, value: int) -> int:
+        value = int(value)
+        if value in self.keep_ids or value <= 0:
+            return value
+        return 10 ** 9 + self._digest(str(value)) % (9 * 10 ** 9)
+
+    def text(self, text: str, amounts: bool = False) -> str:
+        if text.startswith("/"):
+            return text.split()[0]
+        if (amounts and AMOUNT_RE.match(text)) or self.safe_text(text):
+            return text
+        return mask_text(text)
+
+    def callback_data(self, data: str) -> str:
+        return "|".join(str(self.user_id(int(t))) if USER_ID_TOKEN_RE.match(t) else t for t in data.split("|"))
+
+    def scrub(self, obj: Any, amounts: bool = False) -> Any:
+        # amounts — update miqdor kiritiladigan holatda keldi (raqamli matn saqlanadi)
+        if isinstance(obj, list):
+            return [self.scrub(item, amounts) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        # User (is_bot bor) yoki shaxsiy chat — ID psevdonimlanadi
+        is_person = "is_bot" in obj or obj.get("type") == "private"
+        result = {}
+        for key, value in obj.items():
+            if key in DROP_KEYS:
+                continue
+            if key == "id" and is_person:
+                result[key] = self.user_id(value)
+            elif key in NAME_KEYS and isinstance(value, str):
+                result[key] = "User" if is_person else mask_text(value)
+            elif key == "username" and is_person:
+                result[key] = f"u{self._digest(value) % 10 ** 8:08d}"
+            elif key in FILE_KEYS and isinstance(value, str):
+                result[key] = f"f{self._digest(value):016x}"
+            elif key in TEXT_KEYS and isinstance(value, str):
+                result[key] = self.text(value, amounts)
+            elif key == "data" and isinstance(value, str):
+                result[key] = self.callback_data(value)
+            else:
+                result[key] = self.scrub(value, amounts)
+        return result
+
+
+class UpdateRecorder(BaseMiddleware):
+    def __init__(self, directory: str, scrubber: Scrubber, header: Optional[Dict[str, Any]] = None,
+                 flush_every: int = 200, amount_states: Collection[str] = ()):
+        super().__init__()
+        self.amount_states = set(amount_states)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"updates-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+        self.scrubber = scrubber
+        self.flush_every = flush_every
+        self.recorded = 0
+        self.errors = 0
+        self._file = gzip.open(self.path, "at", encoding="utf-8")
+        self._write({"type": "header", "version": FORMAT_VERSION, "started_at": time.time(), **(header or {})})
+        logger.info("Updatelar yozib olinmoqda: %s", self.path)
+
+    def _write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        self._file.write("\n")
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        if self._file is None:
+            return
+        try:
+            amounts = await self._in_amount_state(update)
+            self._write({"t": round(time.time(), 3), "update": self.scrubber.scrub(update.to_python(), amounts)})
+            self.recorded += 1
+            if self.recorded % self.flush_every == 0:
+                self._file.flush()
+        except Exception as e:
+            # Yozib olish hech qachon update ni qayta ishlashga xalaqit bermasin
+            self.errors += 1
+            logger.debug("Update ni yozib bo'lmadi: %s", e)
+
+    async def _in_amount_state(self, update: types.Update) -> bool:
+        # FSM holati faqat raqamli matn kelganda o'qiladi
+        message = update.message
+        if not self.amount_states or message is None or not AMOUNT_RE.match(message.text or ""):
+            return False
+        state = self.manager.dispatcher.current_state(chat=message.chat.id, user=message.from_user.id)
+        return await state.get_state() in self.amount_states
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info("Yozib olish tugadi: %s (%d ta update)", self.path, self.recorded)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "recorded": self.recorded, "errors": self.errors}
+
+
+def read_recording(path: str) -> Tuple[Dict[str, Any], Iterator[Tuple[float, Dict[str, Any]]]]:
+    # (header, (t, update) lar iteratori)
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline() or "{}")
+    if header.get("type") != "header":
+        raise ValueError(f"{path}: yozuv sarlavhasi topilmadi")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record["t"], record["update"]
+    return header, records()
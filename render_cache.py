@@ -0,0 +1,41 @@
+# render_cache.py — tez-tez bosiladigan ekranlar uchun tayyor matn va klaviaturalar keshi
+# -*- coding: utf-8 -*-
+# Kesh versiya hisoblagichiga bog'langan: currencies / reserves / card_balance
+# o'zgarganda bump() chaqiriladi va keyingi so'rovda matn qayta yasaladi.
+# static=True yozuvlar (masalan, asosiy menyu klaviaturasi) versiyaga bog'liq emas.
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class RenderCache:
+    def __init__(self):
+        self.version = 0
+        self._entries: Dict[Hashable, Tuple[int, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.bumps = 0
+
+    def bump(self):
+        self.version += 1
+        self.bumps += 1
+
+    def get(self, key: Hashable, build: Callable[[], Any], static: bool = False) -> Any:
+        version = -1 if static else self.version
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = build()
+        self._entries[key] = (version, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bumps": self.bumps,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
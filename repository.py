@@ -0,0 +1,441 @@
+# repository.py — users va orders uchun saqlash qatlami
+# -*- coding: utf-8 -*-
+# Ikki xil backend bor:
+#   json   — eski usul: har o'zgarishda butun users.json / orders.json qayta yoziladi
+#   sqlite — bot_data/bot.db (WAL rejimi), faqat o'zgargan qator yoziladi,
+#            buyurtmalar user_id, status va created_at bo'yicha indekslangan
+# Backend OBMEN_STORAGE muhit o'zgaruvchisi bilan tanlanadi (standart: json).
+# JSON backendda yakunlangan eski buyurtmalar order_archive.OrderArchive ga
+# ko'chiriladi, shunda xotirada faqat faol buyurtmalar qoladi. OBMEN_LAZY_LOAD=1
+# (standart) bo'lsa users/orders snapshot_store.SnapshotMap orqali dangasa ochiladi.
+import os
+import sys
+import json
+import sqlite3
+import threading
+import logging
+from collections.abc import MutableMapping
+from typing import Any, Callable, Collection, Dict, Iterator, List, Optional, Tuple
+
+from order_archive import OrderArchive
+from snapshot_store import SnapshotMap
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "bot.db"
+# Buyurtmalarni decode qilmasdan filtrlash uchun snapshot ustunlari
+ORDER_FIELDS = ("status", "created_at")
+# Buyurtmalarni sahifalash kursori: (created_at, id)
+Cursor = Tuple[int, str]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def order_key(order: dict) -> Cursor:
+    return (int(order.get("created_at", 0)), str(order["id"]))
+
+
+class JsonRepository:
+    kind = "json"
+
+    def __init__(self, users_file: str, orders_file: str, load: Callable, save: Callable,
+                 archive: Optional[OrderArchive] = None):
+        self.users_file = users_file
+        self.orders_file = orders_file
+        self._save = save
+        self.archive = archive
+        self.users: Dict[str, Any] = load(users_file, {})
+        self.orders: Dict[str, Any] = load(orders_file, {})
+
+    def save_user(self, uid, user: Optional[dict] = None):
+        if user is not None:
+            self.users[str(uid)] = user
+        self._save(self.users_file, self.users)
+
+    def save_order(self, order: dict):
+        self.orders[order["id"]] = order
+        self._save(self.orders_file, self.orders)
+
+    def save_orders(self, batch: List[dict]):
+        for order in batch:
+            self.orders[order["id"]] = order
+        self._save(self.orders_file, self.orders)
+
+    def user_orders(self, uid, limit: int = 10, before: Optional[Cursor] = None,
+                    after: Optional[Cursor] = None) -> List[dict]:
+        # Avval xotiradagi (faol) buyurtmalar, keyin arxivdagilar — yangidan eskiga.
+        # before/after — (created_at, id) kursori; faol buyurtmalar created_at ustuni bo'yicha
+        # saralanadi va faqat sahifaga tushganlari decode qilinadi.
+        ids = self.users.get(str(uid), {}).get("orders", [])
+        hot = [(self._created_at(oid), str(oid)) for oid in ids if oid in self.orders]
+        if before is not None:
+            hot = [k for k in hot if k < before]
+        if after is not None:
+            hot = [k for k in hot if k > after]
+        # after: kursorga eng yaqin (eng eski) `limit` tasi, aks holda eng yangilari
+        hot.sort(reverse=after is None)
+        candidates = [(k, None) for k in hot[:limit]]
+        if self.archive is not None:
+            archived = self.archive.user_orders(uid, limit, before=before, after=after)
+            # arxivga yozilib, orders.json hali saqlanmay qolgan bo'lsa takrorlanmasin
+            candidates.extend((order_key(o), o) for o in archived if o["id"] not in self.orders)
+        candidates.sort(key=lambda c: c[0], reverse=after is None)
+        page = candidates[:limit]
+        if after is not None:
+            page.reverse()
+        return [o if o is not None else self.orders[key[1]] for key, o in page]
+
+    def _with_status(self, statuses: Collection[str]) -> List[str]:
+        # SnapshotMap da status ustuni bo'yicha — yozuvlar decode qilinmaydi
+        if isinstance(self.orders, SnapshotMap):
+            return self.orders.keys_where("status", statuses)
+        return [k for k, o in self.orders.items() if o.get("status") in statuses]
+
+    def _created_at(self, key: str) -> int:
+        if isinstance(self.orders, SnapshotMap):
+            return self.orders.field(key, "created_at", 0) or 0
+        return self.orders[key].get("created_at", 0)
+
+    def archivable_orders(self, cutoff: int, final_statuses: Collection[str]) -> List[dict]:
+        if self.archive is None:
+            return []
+        keys = [(self._created_at(k), k) for k in self._with_status(final_statuses)]
+        # arxiv har bir foydalanuvchi uchun (created_at, id) tartibida bo'lishi kerak (kursorli sahifalash)
+        return [self.orders[k] for k in sorted(k for k in keys if k[0] < cutoff)]
+
+    def forget_orders(self, archived: List[dict]):
+        # Arxivga yozilgan buyurtmalarni xotiradan va foydalanuvchi ro'yxatidan olib tashlash
+        by_user: Dict[str, set] = {}
+        for o in archived:
+            self.orders.pop(o["id"], None)
+            by_user.setdefault(str(o["user_id"]), set()).add(o["id"])
+        for uid, ids in by_user.items():
+            user = self.users.get(uid)
+            if user and user.get("orders"):
+                user["orders"] = [oid for oid in user["orders"] if oid not in ids]
+                # qayta o'rnatiladi — SnapshotMap faqat o'rnatilgan yozuvlarni qayta yozadi
+                self.users[uid] = user
+        self._save(self.orders_file, self.orders)
+        self._save(self.users_file, self.users)
+
+    def orders_by_status(self, status: str, limit: Optional[int] = None) -> List[dict]:
+        keys = sorted(self._with_status((status,)), key=self._created_at)
+        return [self.orders[k] for k in (keys[:limit] if limit else keys)]
+
+    def iter_users(self) -> Iterator[Tuple[int, dict]]:
+        # To'liq skanlar (indekslarni qurish) uchun, thread poolda. SnapshotMap yozuvlari
+        # keshga olinmasdan o'qiladi (peek); kalitlar ro'yxati va har bir yozuv flush bilan
+        # almashayotgan ko'rinishdan izchil olinadi, oraliqda o'chirilganlari o'tkazib yuboriladi
+        peek = getattr(self.users, "peek", self.users.get)
+        for key in list(self.users):
+            user = peek(key)
+            if user:
+                yield int(key), user
+
+    def iter_orders(self) -> Iterator[dict]:
+        # Faol buyurtmalar + arxiv (arxivga ko'chirilayotgan paytda ikkalasida bo'lishi mumkin).
+        # iter_users kabi: kalitlar izchil ro'yxatdan, yozuvlar peek bilan — oraliqda arxivga
+        # ko'chirilib o'chirilgani bu yerda o'tkazib yuboriladi va arxiv skanida chiqadi
+        peek = getattr(self.orders, "peek", self.orders.get)
+        for key in list(self.orders):
+            order = peek(key)
+            if order:
+                yield order
+        if self.archive is not None:
+            yield from self.archive.scan()
+
+    def user_names(self) -> Iterator[Tuple[int, str, str]]:
+        for uid, user in self.iter_users():
+            yield uid, user.get("name") or "", user.get("username") or ""
+
+    def close(self):
+        pass
+
+
+class SqliteTable(MutableMapping):
+    # dict o'rniga ishlatiladi: har bir kalit bitta qatorga murojaat qiladi,
+    # butun jadval xotiraga yuklanmaydi
+    def __init__(self, repo: "SqliteRepository", table: str, put: Callable[[str, Any], None]):
+        self._repo = repo
+        self._table = table
+        self._put = put
+
+    def __getitem__(self, key):
+        row = self._repo._one(f"SELECT data FROM {self._table} WHERE id = ?", (str(key),))
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self._put(str(key), value)
+
+    def __delitem__(self, key):
+        with self._repo._lock:
+            cur = self._repo._conn.execute(f"DELETE FROM {self._table} WHERE id = ?", (str(key),))
+            self._repo._conn.commit()
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self._repo._one(f"SELECT 1 FROM {self._table} WHERE id = ?", (str(key),)) is not None
+
+    def __iter__(self):
+        with self._repo._lock:
+            rows = self._repo._conn.execute(f"SELECT id FROM {self._table}").fetchall()
+        return iter(r[0] for r in rows)
+
+    def __len__(self):
+        return self._repo._one(f"SELECT COUNT(*) FROM {self._table}")[0]
+
+
+class SqliteRepository:
+    kind = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self.users = SqliteTable(self, "users", self._put_user)
+        self.orders = SqliteTable(self, "orders", lambda key, value: self._put_order(value))
+
+    def _one(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _put_user(self, key: str, user: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+                (key, _dumps(user)),
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _order_row(order: dict) -> tuple:
+        return (str(order["id"]), int(order["user_id"]), order.get("status", ""),
+                int(order.get("created_at", 0)), _dumps(order))
+
+    def _put_order(self, order: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO orders (id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                self._order_row(order),
+            )
+            self._conn.commit()
+
+    def save_user(self, uid, user: Optional[dict] = None):
+        if user is None:
+            return
+        self._put_user(str(uid), user)
+
+    def save_order(self, order: dict):
+        self._put_order(order)
+
+    def save_orders(self, batch: List[dict]):
+        # bitta tranzaksiyada
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO orders (id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                [self._order_row(o) for o in batch],
+            )
+            self._conn.commit()
+
+    def user_orders(self, uid, limit: int = 10, before: Optional[Cursor] = None,
+                    after: Optional[Cursor] = None) -> List[dict]:
+        # (created_at, id) kursori bo'yicha — OFFSET siz, har sahifa indeksdan boshlanadi
+        if after is not None:
+            sql = ("SELECT data FROM orders WHERE user_id = ? AND (created_at, id) > (?, ?) "
+                   "ORDER BY created_at, id LIMIT ?")
+            params: tuple = (int(uid), int(after[0]), str(after[1]), limit)
+        elif before is not None:
+            sql = ("SELECT data FROM orders WHERE user_id = ? AND (created_at, id) < (?, ?) "
+                   "ORDER BY created_at DESC, id DESC LIMIT ?")
+            params = (int(uid), int(before[0]), str(before[1]), limit)
+        else:
+            sql = "SELECT data FROM orders WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+            params = (int(uid), limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        page = [json.loads(r[0]) for r in rows]
+        if after is not None:
+            page.reverse()
+        return page
+
+    def archivable_orders(self, cutoff: int, final_statuses: Collection[str]) -> List[dict]:
+        # SQLite da buyurtmalar xotirada turmaydi — arxivlashga hojat yo'q
+        return []
+
+    def forget_orders(self, archived: List[dict]):
+        pass
+
+    def orders_by_status(self, status: str, limit: Optional[int] = None) -> List[dict]:
+        sql = "SELECT data FROM orders WHERE status = ? ORDER BY created_at"
+        params: tuple = (status,)
+        if limit:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def _rows_since(self, sql: str, rowid: int, batch: int) -> Iterator[tuple]:
+        # Qulf har paket uchun alohida olinadi — uzun skan yozuvlarni to'xtatib qo'ymaydi
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, (rowid, batch)).fetchall()
+            yield from rows
+            if len(rows) < batch:
+                return
+            rowid = rows[-1][0]
+
+    def users_since(self, rowid: int = 0, batch: int = 5000) -> Iterator[Tuple[int, int, dict]]:
+        # (rowid, user_id, yozuv). INSERT OR REPLACE qatorga yangi rowid beradi —
+        # shuning uchun rowid > belgi = shu vaqtdan beri qo'shilgan yoki o'zgargan foydalanuvchilar
+        # (boshqa ishchilar yozganlari ham)
+        for rowid, key, data in self._rows_since(
+                "SELECT rowid, id, data FROM users WHERE rowid > ? ORDER BY rowid LIMIT ?", rowid, batch):
+            yield rowid, int(key), json.loads(data)
+
+    def orders_since(self, rowid: int = 0, batch: int = 5000) -> Iterator[Tuple[int, dict]]:
+        # users_since kabi: yangi va holati o'zgargan buyurtmalar
+        for rowid, data in self._rows_since(
+                "SELECT rowid, data FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?", rowid, batch):
+            yield rowid, json.loads(data)
+
+    def last_rowids(self) -> Tuple[int, int]:
+        # (users, orders) — skan boshlanishidan oldingi belgi
+        return (self._one("SELECT COALESCE(MAX(rowid), 0) FROM users")[0],
+                self._one("SELECT COALESCE(MAX(rowid), 0) FROM orders")[0])
+
+    def iter_users(self) -> Iterator[Tuple[int, dict]]:
+        for _, uid, user in self.users_since(0):
+            yield uid, user
+
+    def iter_orders(self) -> Iterator[dict]:
+        for _, order in self.orders_since(0):
+            yield order
+
+    def user_names(self) -> Iterator[Tuple[int, str, str]]:
+        for uid, user in self.iter_users():
+            yield uid, user.get("name") or "", user.get("username") or ""
+
+    def is_empty(self) -> bool:
+        return (self._one("SELECT COUNT(*) FROM users")[0] == 0
+                and self._one("SELECT COUNT(*) FROM orders")[0] == 0)
+
+    def import_data(self, users: Dict[str, Any], orders: Dict[str, Any]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+                ((str(k), _dumps(v)) for k, v in users.items()),
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO orders (id, user_id, status, created_at, data) VALUES (?, ?, ?, ?, ?)",
+                (self._order_row(dict(o, id=k)) for k, o in orders.items()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _read_json(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_source(data_dir: str, name: str) -> dict:
+    # OBMEN_LAZY_LOAD rejimida oxirgi holat <nom>.snap da — u bo'lsa JSON (eski zaxira) o'qilmaydi
+    json_path = os.path.join(data_dir, name + ".json")
+    snap_path = os.path.join(data_dir, name + ".snap")
+    if os.path.exists(snap_path):
+        snapshot = SnapshotMap(snap_path)
+        return {k: snapshot[k] for k in snapshot}
+    return _read_json(json_path)
+
+
+def migrate_json(data_dir: str, db_path: Optional[str] = None, force: bool = False) -> SqliteRepository:
+    # bot_data/users.json va orders.json (yoki .snap) dan bir martalik ko'chirish.
+    # JSON fayllar o'chirilmaydi — zaxira sifatida qoladi.
+    repo = SqliteRepository(db_path or os.path.join(data_dir, DB_NAME))
+    if not force and not repo.is_empty():
+        logger.debug("SQLite bazasi bo'sh emas, ko'chirish o'tkazib yuborildi: %s", repo.db_path)
+        return repo
+    users = _read_source(data_dir, "users")
+    orders = _read_source(data_dir, "orders")
+    repo.import_data(users, orders)
+    logger.info("Ko'chirildi: %d foydalanuvchi, %d buyurtma -> %s", len(users), len(orders), repo.db_path)
+    return repo
+
+
+def open_repository(data_dir: str, load: Callable, save: Callable, backend: Optional[str] = None,
+                    lazy: Optional[bool] = None):
+    backend = (backend or os.getenv("OBMEN_STORAGE", "json")).lower()
+    if backend == "sqlite":
+        return migrate_json(data_dir)
+    if lazy is None:
+        lazy = os.getenv("OBMEN_LAZY_LOAD", "1") == "1"
+    users_file = os.path.join(data_dir, "users.json")
+    orders_file = os.path.join(data_dir, "orders.json")
+    if not lazy:
+        for json_path in (users_file, orders_file):
+            snap_path = json_path[:-len(".json")] + ".snap"
+            if os.path.exists(snap_path) and not os.path.exists(json_path):
+                # Oxirgi holat snapshotda — bo'sh ma'lumot bilan ishga tushmaymiz
+                raise RuntimeError(f"{json_path} yo'q, lekin {snap_path} bor: avval "
+                                   f"python snapshot_store.py export {snap_path} {json_path}")
+    if lazy:
+        # users.snap / orders.snap — birinchi ishga tushishda JSON dan bir marta ko'chiriladi
+        users_snap = os.path.join(data_dir, "users.snap")
+        orders_snap = os.path.join(data_dir, "orders.snap")
+        maps = {
+            users_snap: SnapshotMap.open(users_snap, users_file),
+            orders_snap: SnapshotMap.open(orders_snap, orders_file, ORDER_FIELDS),
+        }
+        users_file, orders_file, load = users_snap, orders_snap, maps.get
+    return JsonRepository(
+        users_file,
+        orders_file,
+        load,
+        save,
+        archive=OrderArchive(
+            os.path.join(data_dir, "orders_archive.jsonl"),
+            os.path.join(data_dir, "orders_archive.idx"),
+        ),
+    )
+
+
+if __name__ == "__main__":
+    # python repository.py migrate [bot_data] [--force]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args or args[0] != "migrate":
+        print("Foydalanish: python repository.py migrate [bot_data] [--force]")
+        sys.exit(1)
+    migrate_json(args[1] if len(args) > 1 else "bot_data", force="--force" in sys.argv).close()
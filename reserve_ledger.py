@@ -0,0 +1,157 @@
+# reserve_ledger.py — kripto zaxiralari uchun band qilish (hold) daftari
+# -*- coding: utf-8 -*-
+# BUY buyurtma chek bilan yuborilganda miqdor zaxiradan "band" qilinadi:
+#   place   — chek yuborilganda (mavjud miqdor yetmasa buyurtma qabul qilinmaydi)
+#   commit  — admin tasdiqlaganda zaxiradan haqiqatan ayiriladi
+#   release — admin bekor qilganda yoki muddati o'tganda bo'shatiladi
+# available(cur) = reserves[cur] - held(cur), ikkalasi ham O(1).
+# Bir nechta ishchi jarayonda transaction = SharedState.transaction: har amal
+# yozish qulfi ostida, boshqa ishchilarning oxirgi bandlari bilan bajariladi.
+import time
+import threading
+import logging
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-9
+
+
+class ReserveLedger:
+    def __init__(self, reserves: Dict[str, float], holds: Dict[str, Dict[str, Any]],
+                 save: Callable[[str, Any], None], reserves_file: str, holds_file: str,
+                 ttl: float = 24 * 3600, transaction: Optional[Callable[[], ContextManager]] = None):
+        self.reserves = reserves
+        # order_id -> {"currency", "amount", "expires_at"}
+        self.holds = holds
+        self._save = save
+        self.reserves_file = reserves_file
+        self.holds_file = holds_file
+        self.ttl = ttl
+        self._transaction = transaction or nullcontext
+        self._lock = threading.Lock()
+        self._held: Dict[str, float] = {}
+        self.reload()
+
+    def reload(self):
+        # holds boshqa jarayon tomonidan o'zgartirilgan (SharedState.refresh) — yig'indilar qaytadan
+        held: Dict[str, float] = {}
+        for hold in self.holds.values():
+            held[hold["currency"]] = round(held.get(hold["currency"], 0) + hold["amount"], 8)
+        self._held = {cur: value for cur, value in held.items() if value > EPSILON}
+
+    def _add_held(self, currency: str, delta: float):
+        value = round(self._held.get(currency, 0) + delta, 8)
+        if value <= EPSILON:
+            self._held.pop(currency, None)
+        else:
+            self._held[currency] = value
+
+    def held(self, currency: str) -> float:
+        return self._held.get(currency, 0)
+
+    def available(self, currency: str) -> float:
+        return max(round(self.reserves.get(currency, 0) - self._held.get(currency, 0), 8), 0)
+
+    def place(self, order_id: str, currency: str, amount: float, now: Optional[float] = None) -> bool:
+        with self._transaction():
+            with self._lock:
+                if order_id in self.holds:
+                    return True
+                if amount > self.available(currency) + EPSILON:
+                    return False
+                self.holds[order_id] = {
+                    "currency": currency,
+                    "amount": amount,
+                    "expires_at": int((now or time.time()) + self.ttl),
+                }
+                self._add_held(currency, amount)
+            self._save(self.holds_file, self.holds)
+            return True
+
+    def release(self, order_id: str) -> bool:
+        with self._transaction():
+            with self._lock:
+                hold = self.holds.pop(order_id, None)
+                if hold is None:
+                    return False
+                self._add_held(hold["currency"], -hold["amount"])
+            self._save(self.holds_file, self.holds)
+            return True
+
+    def _commit_locked(self, order_id: str, currency: str, amount: float) -> Optional[bool]:
+        # None — bajarilmadi, True/False — band bor edimi
+        hold = self.holds.get(order_id)
+        if hold is not None:
+            currency, amount = hold["currency"], hold["amount"]
+            if self.reserves.get(currency, 0) + EPSILON < amount:
+                return None
+        elif amount > self.available(currency) + EPSILON:
+            return None
+        self.reserves[currency] = max(round(self.reserves.get(currency, 0) - amount, 8), 0)
+        if hold is not None:
+            del self.holds[order_id]
+            self._add_held(currency, -amount)
+        return hold is not None
+
+    def commit(self, order_id: str, currency: str, amount: float) -> bool:
+        # Band qilingan miqdorni zaxiradan ayirish. Band qilinmagan (eski yoki muddati
+        # o'tgan) buyurtma uchun mavjud miqdor yetarli bo'lsagina ayiriladi.
+        with self._transaction():
+            with self._lock:
+                held = self._commit_locked(order_id, currency, amount)
+            if held is None:
+                return False
+            self._save(self.reserves_file, self.reserves)
+            if held:
+                self._save(self.holds_file, self.holds)
+            return True
+
+    def commit_many(self, items: List[Tuple[str, str, float]]) -> Tuple[List[str], List[str]]:
+        # Bir nechta buyurtmani bitta paketda: zaxira va bandlar bir martadan saqlanadi
+        committed, refused = [], []
+        with self._transaction():
+            with self._lock:
+                for order_id, currency, amount in items:
+                    if self._commit_locked(order_id, currency, amount) is None:
+                        refused.append(order_id)
+                    else:
+                        committed.append(order_id)
+            if committed:
+                self._save(self.reserves_file, self.reserves)
+                self._save(self.holds_file, self.holds)
+            return committed, refused
+
+    def release_many(self, order_ids: List[str]) -> int:
+        with self._transaction():
+            with self._lock:
+                released = 0
+                for order_id in order_ids:
+                    hold = self.holds.pop(order_id, None)
+                    if hold is not None:
+                        self._add_held(hold["currency"], -hold["amount"])
+                        released += 1
+            if released:
+                self._save(self.holds_file, self.holds)
+            return released
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        now = now or time.time()
+        with self._transaction():
+            with self._lock:
+                expired = [oid for oid, hold in self.holds.items() if hold["expires_at"] <= now]
+                for oid in expired:
+                    hold = self.holds.pop(oid)
+                    self._add_held(hold["currency"], -hold["amount"])
+            if expired:
+                self._save(self.holds_file, self.holds)
+                logger.info("%d ta zaxira bandi muddati o'tgani uchun bo'shatildi", len(expired))
+            return expired
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        currencies = set(self.reserves) | set(self._held)
+        return {
+            cur: {"total": self.reserves.get(cur, 0), "held": self.held(cur), "available": self.available(cur)}
+            for cur in sorted(currencies)
+        }
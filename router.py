@@ -0,0 +1,77 @@
+# router.py — tugma matnlari bo'yicha O(1) marshrutlash jadvali
+# -*- coding: utf-8 -*-
+# Asosiy menyu va admin panel tugmalari uchun alohida @dp.message_handler
+# filtrlari zanjiri o'rniga bitta handler ro'yxatdan o'tadi: holat (FSM state)
+# va aniq matn bo'yicha lug'atdan handler topiladi. Jadvalda yo'q matn
+# keyingi handlerlarga (FSM qadamlari, unknown) o'tib ketadi.
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import Dispatcher, types
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.builtin import StateFilter
+from aiogram.dispatcher.filters.state import State
+from aiogram.dispatcher.handler import current_handler
+
+Handler = Callable[..., Awaitable[Any]]
+
+
+def resolve_handler(data: dict) -> Optional[Handler]:
+    # Middlewarelar uchun: router orqali kelgan bo'lsa — asl tugma handleri, aks holda aiogram tanlagani
+    route = data.get("route")
+    return route[0] if route is not None else current_handler.get(None)
+
+
+class ButtonRouter:
+    def __init__(self):
+        # state (None — holatsiz) -> matn -> (handler, state argumentini oladimi)
+        self._routes: Dict[Optional[str], Dict[str, Tuple[Handler, bool]]] = {}
+        self.dispatcher: Optional[Dispatcher] = None
+
+    def __len__(self) -> int:
+        return sum(len(table) for table in self._routes.values())
+
+    def texts(self) -> set:
+        return {text for table in self._routes.values() for text in table}
+
+    def button(self, text: str, state: Optional[State] = None):
+        # @router.button("💰 Sotish") yoki @router.button("📦 ...", state=AdminFSM.main)
+        key = state.state if isinstance(state, State) else state
+
+        def decorator(handler: Handler) -> Handler:
+            table = self._routes.setdefault(key, {})
+            if text in table:
+                raise ValueError(f"{text!r} tugmasi {key} holatida allaqachon ro'yxatdan o'tgan")
+            table[text] = (handler, "state" in inspect.signature(handler).parameters)
+            return handler
+        return decorator
+
+    async def _current_state(self, message: types.Message) -> Optional[str]:
+        # StateFilter bilan bir xil kontekst keshi — storage bitta update uchun bir marta o'qiladi
+        try:
+            return StateFilter.ctx_state.get()
+        except LookupError:
+            user = message.from_user.id if message.from_user else None
+            state = await self.dispatcher.storage.get_state(chat=message.chat.id, user=user)
+            StateFilter.ctx_state.set(state)
+            return state
+
+    async def match(self, message: types.Message):
+        if not message.text:
+            return False
+        table = self._routes.get(await self._current_state(message))
+        if not table:
+            return False
+        route = table.get(message.text)
+        return {"route": route} if route else False
+
+    async def _dispatch(self, message: types.Message, route: Tuple[Handler, bool], state: FSMContext):
+        handler, wants_state = route
+        if wants_state:
+            return await handler(message, state=state)
+        return await handler(message)
+
+    def register(self, dp: Dispatcher):
+        # Boshqa handlerlardan oldin chaqirilishi kerak — jadval keyin ham to'ldirilaveradi
+        self.dispatcher = dp
+        dp.register_message_handler(self._dispatch, self.match, state="*")
@@ -0,0 +1,356 @@
+# scaleout.py — bir nechta ishchi jarayon (OBMEN_WORKERS > 1)
+# -*- coding: utf-8 -*-
+# Front jarayon updatelarni oladi (polling yoki webhook) va har birini
+# foydalanuvchi ID si bo'yicha (uid % N) bitta ishchiga yuboradi — bitta
+# foydalanuvchining FSM holati doim bitta ishchida. Ishchilar obmen_bot_full.py
+# ning o'zi (OBMEN_ROLE=worker), front bilan unix socket orqali gaplashadi:
+#   front -> ishchi: har qatorda bitta update (Telegram JSON)
+#   ishchi -> front: qayta ishlangach {"update_id", "ok", "ms"} (window — tasdiqlanmaganlar chegarasi)
+# Umumiy holat: users/orders — bot.db (OBMEN_STORAGE=sqlite, WAL), kurslar,
+# zaxiralar va bandlar — shared_state.SharedState (o'sha bazada).
+#   python scaleout.py                 — OBMEN_WORKERS ta ishchi bilan front (OBMEN_MODE=polling|webhook)
+import os
+import sys
+import hmac
+import json
+import time
+import signal
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from aiogram.bot import api
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils import exceptions
+
+from shared_state import SharedState
+from webhook import SECRET_TOKEN_HEADER, UpdateQueue
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# bitta update qatori uchun chegara (StreamReader.readline)
+MAX_FRAME = 4 * 1024 * 1024
+# Foydalanuvchi qaysi maydonda: message.from, callback_query.from, poll_answer.user ...
+SENDER_FIELDS = ("message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+                 "shipping_query", "pre_checkout_query", "my_chat_member", "chat_member", "chat_join_request",
+                 "poll_answer", "channel_post", "edited_channel_post")
+
+
+def shard_of(user_id: int, workers: int) -> int:
+    return user_id % workers
+
+
+def update_sender(update: Dict[str, Any]) -> int:
+    for field in SENDER_FIELDS:
+        event = update.get(field)
+        if event is None:
+            continue
+        user = event.get("from") or event.get("user")
+        if user:
+            return int(user["id"])
+        chat = event.get("chat")
+        if chat:
+            return int(chat["id"])
+    return 0
+
+
+def _encode(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+# --- ishchi tomoni (obmen_bot_full.py, OBMEN_ROLE=worker) ---
+
+class RefreshMiddleware(BaseMiddleware):
+    # Har update boshida boshqa ishchilar yozgan umumiy holat (o'zgarmagan bo'lsa — bitta PRAGMA)
+    def __init__(self, shared: SharedState, on_update: Optional[Callable[[types.Update], None]] = None):
+        super().__init__()
+        self.shared = shared
+        self.on_update = on_update
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        self.shared.refresh()
+        if self.on_update is not None:
+            self.on_update(update)
+
+
+async def serve_worker(dispatcher: Dispatcher, socket_path: str,
+                       on_startup: Optional[Callable[[Dispatcher], Awaitable]] = None,
+                       on_shutdown: Optional[Callable[[Dispatcher], Awaitable]] = None,
+                       workers: int = 32, queue_size: int = 1000):
+    Dispatcher.set_current(dispatcher)
+    Bot.set_current(dispatcher.bot)
+    queue = UpdateQueue(dispatcher, workers=workers, maxsize=queue_size)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def done(update: types.Update, ok: bool, elapsed: float):
+            if not writer.is_closing():
+                writer.write(_encode({"update_id": update.update_id, "ok": ok, "ms": round(elapsed * 1000, 3)}))
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    update = types.Update(**json.loads(line))
+                except ValueError as e:
+                    logger.error("Noto'g'ri update qatori: %s", e)
+                    continue
+                # navbat to'lsa front dan o'qish to'xtaydi — socket orqali bosim frontga qaytadi
+                await queue.put(update, done)
+        finally:
+            # front yopildi (yoki o'ldi) — ishchi ham to'xtaydi
+            stop.set()
+
+    if on_startup is not None:
+        await on_startup(dispatcher)
+    queue.start()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path, limit=MAX_FRAME)
+    logger.info("Ishchi tayyor: %s", socket_path)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        await queue.stop()
+        logger.info("Ishchi: %d ta update qayta ishlandi, %d ta xato", queue.processed, queue.errors)
+        if on_shutdown is not None:
+            await on_shutdown(dispatcher)
+        await dispatcher.storage.close()
+        await dispatcher.storage.wait_closed()
+        await (await dispatcher.bot.get_session()).close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def run_worker(dispatcher: Dispatcher, socket_path: str, **kwargs):
+    asyncio.get_event_loop().run_until_complete(serve_worker(dispatcher, socket_path, **kwargs))
+
+
+# --- front tomoni ---
+
+class WorkerLink:
+    def __init__(self, index: int, socket_path: str, window: int):
+        self.index = index
+        self.socket_path = socket_path
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.slots = asyncio.Semaphore(window)
+        self.inflight: Dict[int, asyncio.Future] = {}
+        self.sent = 0
+        self.acked = 0
+        self.errors = 0
+
+
+class Front:
+    def __init__(self, workers: int, socket_dir: str, command: Optional[List[str]] = None,
+                 env: Optional[Dict[str, str]] = None, window: int = 1000, connect_timeout: float = 120):
+        self.workers = workers
+        self.socket_dir = socket_dir
+        self.command = command or [sys.executable, os.path.join(ROOT, "obmen_bot_full.py")]
+        self.env = env
+        self.connect_timeout = connect_timeout
+        self.links = [WorkerLink(i, os.path.join(socket_dir, f"worker-{i}.sock"), window) for i in range(workers)]
+        self._readers: List[asyncio.Task] = []
+        self._stopping = False
+        # ishchi kutilmaganda to'xtasa o'rnatiladi — front ham to'xtaydi (supervisor qayta ishga tushiradi)
+        self.failed = asyncio.Event()
+
+    def _worker_env(self, link: WorkerLink) -> Dict[str, str]:
+        env = dict(self.env if self.env is not None else os.environ)
+        env.update({"OBMEN_ROLE": "worker", "OBMEN_WORKERS": str(self.workers),
+                    "OBMEN_WORKER_INDEX": str(link.index), "OBMEN_WORKER_SOCKET": link.socket_path,
+                    "OBMEN_STORAGE": "sqlite"})
+        return env
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        for link in self.links:
+            if os.path.exists(link.socket_path):
+                os.unlink(link.socket_path)
+            link.process = await asyncio.create_subprocess_exec(*self.command, env=self._worker_env(link), cwd=ROOT)
+        await asyncio.gather(*(self._connect(link) for link in self.links))
+        self._readers = [asyncio.ensure_future(self._read_acks(link)) for link in self.links]
+        logger.info("%d ta ishchi ishga tushdi", self.workers)
+
+    async def _connect(self, link: WorkerLink):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            if link.process.returncode is not None:
+                raise RuntimeError(f"Ishchi {link.index} ishga tushmadi (kod {link.process.returncode})")
+            try:
+                link.reader, link.writer = await asyncio.open_unix_connection(link.socket_path, limit=MAX_FRAME)
+                return
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Ishchi {link.index} ga ulanib bo'lmadi: {link.socket_path}")
+                await asyncio.sleep(0.1)
+
+    async def _read_acks(self, link: WorkerLink):
+        while True:
+            line = await link.reader.readline()
+            if not line:
+                break
+            ack = json.loads(line)
+            future = link.inflight.pop(ack["update_id"], None)
+            link.acked += 1
+            if not ack["ok"]:
+                link.errors += 1
+            link.slots.release()
+            if future is not None and not future.done():
+                future.set_result(ack)
+        if not self._stopping:
+            logger.error("Ishchi %d aloqani uzdi (kod %s)", link.index, link.process.returncode)
+            self.failed.set()
+        for future in link.inflight.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"ishchi {link.index} to'xtadi"))
+        link.inflight.clear()
+
+    async def submit(self, update: Dict[str, Any]) -> asyncio.Future:
+        # Update ishchiga yozilgach qaytadi; future — ishchi qayta ishlab bo'lganda
+        link = self.links[shard_of(update_sender(update), self.workers)]
+        await link.slots.acquire()
+        future = asyncio.get_running_loop().create_future()
+        link.inflight[update["update_id"]] = future
+        link.writer.write(_encode(update))
+        link.sent += 1
+        await link.writer.drain()
+        return future
+
+    @property
+    def inflight(self) -> int:
+        return sum(len(link.inflight) for link in self.links)
+
+    async def stop(self, timeout: float = 30):
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        while self.inflight and time.monotonic() < deadline and not self.failed.is_set():
+            await asyncio.sleep(0.05)
+        # socket yopilishi — ishchiga to'xtash belgisi (navbatini tugatib, on_shutdown)
+        for link in self.links:
+            if link.writer is not None:
+                link.writer.close()
+        for link in self.links:
+            if link.process is None:
+                continue
+            try:
+                await asyncio.wait_for(link.process.wait(), max(deadline - time.monotonic(), 5))
+            except asyncio.TimeoutError:
+                logger.warning("Ishchi %d to'xtamadi, SIGKILL", link.index)
+                link.process.kill()
+                await link.process.wait()
+        for task in self._readers:
+            task.cancel()
+        await asyncio.gather(*self._readers, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {f"worker-{link.index}": {"sent": link.sent, "acked": link.acked, "errors": link.errors,
+                                         "inflight": len(link.inflight)} for link in self.links}
+
+
+async def poll_updates(front: Front, bot: Bot, skip_updates: bool = True, timeout: int = 20):
+    # Update obyektlari yasalmaydi: getUpdates javobi (dict) to'g'ridan-to'g'ri ishchiga
+    offset = None
+    if skip_updates:
+        pending = await bot.request(api.Methods.GET_UPDATES, {"offset": -1, "timeout": 0})
+        if pending:
+            offset = pending[-1]["update_id"] + 1
+    while True:
+        payload = {"timeout": timeout} if offset is None else {"offset": offset, "timeout": timeout}
+        try:
+            with bot.request_timeout(timeout + 5):
+                updates = await bot.request(api.Methods.GET_UPDATES, payload)
+        except (exceptions.NetworkError, asyncio.TimeoutError) as e:
+            logger.warning("getUpdates: %s", e)
+            await asyncio.sleep(1)
+            continue
+        except exceptions.TelegramAPIError as e:
+            logger.error("getUpdates: %s", e)
+            await asyncio.sleep(5)
+            continue
+        for update in updates:
+            await front.submit(update)
+            offset = update["update_id"] + 1
+
+
+async def serve_webhook(front: Front, path: str, host: str, port: int, secret: Optional[str] = None) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        if secret and not hmac.compare_digest(request.headers.get(SECRET_TOKEN_HEADER, ""), secret):
+            return web.Response(status=401, text="unauthorized")
+        await front.submit(await request.json())
+        return web.Response(text="ok")
+
+    app = web.Application(client_max_size=MAX_FRAME)
+    app.router.add_post(path, handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Webhook front: http://%s:%d%s", host, port, path)
+    return runner
+
+
+async def run_front():
+    from repository import migrate_json
+
+    workers = int(os.getenv("OBMEN_WORKERS", "2"))
+    data_dir = os.getenv("OBMEN_DATA_DIR", "bot_data")
+    mode = os.getenv("OBMEN_MODE", "polling")
+    token = os.getenv("OBMEN_BOT_TOKEN")
+    if not token:
+        raise SystemExit("OBMEN_BOT_TOKEN o'rnatilmagan")
+    api_server = os.getenv("OBMEN_API_SERVER", "")
+    os.makedirs(data_dir, exist_ok=True)
+    # Ishchilar ishga tushishidan oldin: users/orders bot.db ga (bir marta) ko'chiriladi
+    migrate_json(data_dir).close()
+
+    bot = Bot(token=token, server=TelegramAPIServer.from_base(api_server) if api_server else TELEGRAM_PRODUCTION)
+    front = Front(workers, os.path.join(data_dir, "workers"), window=int(os.getenv("OBMEN_WORKER_WINDOW", "1000")))
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    await front.start()
+    runner = None
+    if mode == "webhook":
+        path = os.getenv("OBMEN_WEBHOOK_PATH", "/webhook")
+        secret = os.getenv("OBMEN_WEBHOOK_SECRET")
+        runner = await serve_webhook(front, path, os.getenv("OBMEN_WEBHOOK_HOST", "0.0.0.0"),
+                                     int(os.getenv("OBMEN_WEBHOOK_PORT", os.getenv("PORT", "8080"))), secret)
+        url = os.getenv("OBMEN_WEBHOOK_URL")
+        if url:
+            await bot.set_webhook(url.rstrip("/") + path, secret_token=secret, drop_pending_updates=True)
+        source = None
+    else:
+        source = asyncio.ensure_future(poll_updates(front, bot))
+
+    waiters = [asyncio.ensure_future(stop.wait()), asyncio.ensure_future(front.failed.wait())]
+    if source is not None:
+        waiters.append(source)
+    await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for task in waiters:
+        task.cancel()
+    if runner is not None:
+        await runner.cleanup()
+    await front.stop()
+    logger.info("Front statistikasi: %s", front.stats())
+    await (await bot.get_session()).close()
+    if front.failed.is_set():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(run_front())
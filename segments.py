@@ -0,0 +1,295 @@
+# segments.py — broadcast auditoriyalari uchun bitmap indeks (segmentlar)
+# -*- coding: utf-8 -*-
+# Har foydalanuvchiga zich tartib raqami (ordinal) beriladi: 0, 1, 2, ... Belgilar
+# shu raqamlar bo'yicha bitsetlarda turadi:
+#   doimiy  — bytearray bitmaplar: ordered (buyurtma bergan), buy:KOD / sell:KOD
+#             (tasdiqlangan xarid/sotuv), blocked (botni bloklagan)
+#   oynali  — kun bo'yicha siyrak ro'yxatlar (array("I") ordinal lar), faqat oxirgi
+#             window_days kun: active (buyurtma yoki /start), new (qo'shilgan), buy:KOD, sell:KOD
+# So'rovda bitmaplar Python int ga aylanadi va &, |, ~ bilan birlashtiriladi;
+# 1M foydalanuvchida bitta bitmap ~125 KB, hisoblash — bir necha millisekund.
+# Ifoda tili (evaluate):
+#   all | ordered | blocked | buy:USDT | sell:TON | active:30 | new:7 | buy:USDT:30
+#   &  — va,  |  — yoki,  !  — emas,  ( ) — guruhlash
+#   misol: buy:USDT:30 & !blocked,  !ordered & active:7
+import re
+import time
+import asyncio
+import logging
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+FINAL_EVENTS = {"✅ Tasdiqlandi": "ok", "❌ Bekor qilindi": "no"}
+TOKEN_RE = re.compile(r"\s*(?:([()&|!])|([A-Za-z0-9_:]+))")
+ATOM_RE = re.compile(r"^(all|ordered|blocked|active:\d+|new:\d+|(?:buy|sell):[A-Za-z0-9_]+(?::\d+)?)$")
+NONZERO_RE = re.compile(rb"[^\x00]")
+
+
+def popcount(bits: int) -> int:
+    counter = getattr(bits, "bit_count", None)
+    return counter() if counter is not None else bin(bits).count("1")
+
+
+class SegmentIndex:
+    def __init__(self, window_days: int = 90, tz_offset: int = 0):
+        self.window_days = window_days
+        self.tz_offset = tz_offset
+        self._ordinals: Dict[int, int] = {}
+        self._uids = array("q")
+        self._bitmaps: Dict[str, bytearray] = {}
+        # (belgi, kun) -> ordinal lar (takrorlanishi mumkin — OR uchun farqi yo'q)
+        self._days: Dict[Tuple[str, int], array] = {}
+        self._newest_day = 0
+        # qurilayotgan paytdagi o'zgarishlar — tayyor bo'lgach qayta qo'llanadi
+        self._backlog: Optional[List[Tuple[Callable, tuple]]] = None
+        self.ready = False
+        self.build_s = 0.0
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+    def day(self, ts: float) -> int:
+        return (int(ts) + self.tz_offset) // DAY
+
+    # --- yozish ---
+    def _ordinal(self, uid: int) -> int:
+        ordinal = self._ordinals.get(uid)
+        if ordinal is None:
+            ordinal = self._ordinals[uid] = len(self._uids)
+            self._uids.append(uid)
+        return ordinal
+
+    def _set(self, trait: str, ordinal: int, value: bool = True):
+        bitmap = self._bitmaps.get(trait)
+        if bitmap is None:
+            if not value:
+                return
+            bitmap = self._bitmaps[trait] = bytearray()
+        if len(bitmap) <= ordinal >> 3:
+            if not value:
+                return
+            bitmap.extend(bytes((ordinal >> 3) + 1 - len(bitmap)))
+        if value:
+            bitmap[ordinal >> 3] |= 1 << (ordinal & 7)
+        else:
+            bitmap[ordinal >> 3] &= ~(1 << (ordinal & 7)) & 0xFF
+
+    def _mark_day(self, trait: str, ordinal: int, ts: float):
+        day = self.day(ts)
+        if day > self._newest_day:
+            self._newest_day = day
+            # oynadan chiqqan kunlar tashlanadi
+            cutoff = day - self.window_days
+            for key in [k for k in self._days if k[1] <= cutoff]:
+                del self._days[key]
+        elif day <= self._newest_day - self.window_days:
+            return
+        days = self._days.get((trait, day))
+        if days is None:
+            days = self._days[(trait, day)] = array("I")
+        days.append(ordinal)
+
+    def _deferred(self, method: Callable, *args) -> bool:
+        if self._backlog is None:
+            return False
+        self._backlog.append((method, args))
+        return True
+
+    def add_user(self, uid: int, user: Optional[dict] = None):
+        if self._deferred(self.add_user, uid, user):
+            return
+        ordinal = self._ordinal(int(uid))
+        if not user:
+            return
+        if user.get("joined_at"):
+            self._mark_day("new", ordinal, user["joined_at"])
+            self._mark_day("active", ordinal, user["joined_at"])
+        if user.get("last_seen"):
+            self._mark_day("active", ordinal, user["last_seen"])
+        self._set("blocked", ordinal, bool(user.get("blocked_at")))
+
+    def touch(self, uid: int, ts: Optional[float] = None):
+        # /start — faollik; botni qayta ishga tushirgan foydalanuvchi endi bloklamagan
+        if self._deferred(self.touch, uid, ts):
+            return
+        ordinal = self._ordinal(int(uid))
+        self._mark_day("active", ordinal, ts or time.time())
+        self._set("blocked", ordinal, False)
+
+    def set_blocked(self, uid: int, blocked: bool = True):
+        if self._deferred(self.set_blocked, uid, blocked):
+            return
+        self._set("blocked", self._ordinal(int(uid)), blocked)
+
+    def record_order(self, order: dict, event: str, ts: Optional[float] = None):
+        # event: new — chek yuklandi, ok — tasdiqlandi, no — bekor qilindi
+        if self._deferred(self.record_order, order, event, ts):
+            return
+        try:
+            ordinal = self._ordinal(int(order["user_id"]))
+        except (KeyError, TypeError, ValueError):
+            return
+        ts = ts or time.time()
+        if event == "new":
+            self._set("ordered", ordinal)
+            self._mark_day("active", ordinal, ts)
+        elif event == "ok":
+            trait = f"{order.get('type')}:{order.get('currency')}"
+            self._set(trait, ordinal)
+            self._mark_day(trait, ordinal, ts)
+
+    def add_order(self, order: dict):
+        # Tarixdan qurishda va boshqa ishchilarning buyurtmalarida: yuklash + (bo'lsa) tasdiq
+        created = order.get("created_at") or 0
+        self.record_order(order, "new", created)
+        if FINAL_EVENTS.get(order.get("status")) == "ok":
+            self.record_order(order, "ok", order.get("reviewed_at") or created)
+
+    # --- qurish ---
+    @classmethod
+    def build_from(cls, users: Iterable[Tuple[int, dict]], orders: Iterable[dict], window_days: int = 90,
+                   tz_offset: int = 0, now: Optional[float] = None) -> "SegmentIndex":
+        # Bloklovchi — thread poolda; yangi obyekt, ishlayotgan indeksga tegmaydi
+        index = cls(window_days, tz_offset)
+        # oyna bugungi kunga nisbatan (eski tarix oynani siljitib yubormasin)
+        index._newest_day = index.day(now or time.time())
+        for uid, user in users:
+            index.add_user(uid, user)
+        for order in orders:
+            index.add_order(order)
+        return index
+
+    async def build(self, users: Iterable[Tuple[int, dict]], orders: Iterable[dict]):
+        self._backlog = []
+        started = time.perf_counter()
+        try:
+            built = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.build_from(users, orders, self.window_days, self.tz_offset))
+        except BaseException:
+            backlog, self._backlog = self._backlog, None
+            for method, args in backlog:
+                method(*args)
+            raise
+        backlog, self._backlog = self._backlog, None
+        # qurilgan holat olinadi, keyin qurish paytidagi o'zgarishlar qo'llanadi
+        self._ordinals, self._uids, self._bitmaps = built._ordinals, built._uids, built._bitmaps
+        self._days, self._newest_day = built._days, built._newest_day
+        for method, args in backlog:
+            method(*args)
+        self.ready = True
+        self.build_s = time.perf_counter() - started
+        logger.info("Segment indeksi: %d foydalanuvchi, %d bitmap, %d kunlik ro'yxat, %.2f s",
+                    len(self), len(self._bitmaps), len(self._days), self.build_s)
+
+    # --- o'qish ---
+    def universe(self) -> int:
+        return (1 << len(self._uids)) - 1
+
+    def bitmap(self, trait: str) -> int:
+        return int.from_bytes(self._bitmaps.get(trait, b""), "little")
+
+    def window(self, trait: str, days: int, now: Optional[float] = None) -> int:
+        if days > self.window_days:
+            raise ValueError(f"Oyna {self.window_days} kundan oshmasligi kerak")
+        today = self.day(now or time.time())
+        bitmap = bytearray((len(self._uids) + 7) >> 3)
+        for day in range(today - days + 1, today + 1):
+            for ordinal in self._days.get((trait, day), ()):
+                bitmap[ordinal >> 3] |= 1 << (ordinal & 7)
+        return int.from_bytes(bitmap, "little")
+
+    def atom(self, name: str, now: Optional[float] = None) -> int:
+        if not ATOM_RE.match(name):
+            raise ValueError(f"Noma'lum segment: {name}")
+        if name == "all":
+            return self.universe()
+        parts = name.split(":")
+        if parts[0] in ("active", "new"):
+            return self.window(parts[0], int(parts[1]), now)
+        if parts[0] in ("buy", "sell"):
+            trait = f"{parts[0]}:{parts[1].upper()}"
+            return self.window(trait, int(parts[2]), now) if len(parts) == 3 else self.bitmap(trait)
+        return self.bitmap(name)
+
+    def evaluate(self, expression: str, now: Optional[float] = None) -> int:
+        # Rekursiv tushish: ifoda := qism (| qism)*, qism := omil (& omil)*, omil := !omil | (ifoda) | nom
+        tokens: List[str] = []
+        pos = 0
+        expression = expression.strip()
+        while pos < len(expression):
+            match = TOKEN_RE.match(expression, pos)
+            if match is None or match.end() == pos:
+                raise ValueError(f"Ifodada xato: {expression[pos:pos + 10]!r}")
+            tokens.append(match.group(1) or match.group(2))
+            pos = match.end()
+        if not tokens:
+            raise ValueError("Ifoda bo'sh")
+        universe = self.universe()
+        cursor = 0
+
+        def peek() -> Optional[str]:
+            return tokens[cursor] if cursor < len(tokens) else None
+
+        def take() -> str:
+            nonlocal cursor
+            cursor += 1
+            return tokens[cursor - 1]
+
+        def factor() -> int:
+            token = peek()
+            if token is None:
+                raise ValueError("Ifoda tugallanmagan")
+            take()
+            if token == "!":
+                return universe & ~factor()
+            if token == "(":
+                value = expr()
+                if peek() != ")":
+                    raise ValueError("Yopuvchi qavs yo'q")
+                take()
+                return value
+            if token in ")&|":
+                raise ValueError(f"Kutilmagan belgi: {token}")
+            return self.atom(token, now) & universe
+
+        def term() -> int:
+            value = factor()
+            while peek() == "&":
+                take()
+                value &= factor()
+            return value
+
+        def expr() -> int:
+            value = term()
+            while peek() == "|":
+                take()
+                value |= term()
+            return value
+
+        result = expr()
+        if cursor != len(tokens):
+            raise ValueError(f"Kutilmagan belgi: {tokens[cursor]}")
+        return result
+
+    def count(self, bits: int) -> int:
+        return popcount(bits)
+
+    def members(self, bits: int) -> List[int]:
+        # Bitlardan user_id lar (ordinal tartibida); nol baytlar C darajasida o'tkazib yuboriladi
+        data = bits.to_bytes((len(self._uids) + 7) >> 3, "little")
+        uids = self._uids
+        result = []
+        for match in NONZERO_RE.finditer(data):
+            base = match.start() << 3
+            byte = data[match.start()]
+            for bit in range(8):
+                if byte >> bit & 1:
+                    result.append(uids[base + bit])
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "users": len(self), "bitmaps": len(self._bitmaps),
+                "day_lists": len(self._days), "build_s": round(self.build_s, 3)}
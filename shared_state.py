@@ -0,0 +1,167 @@
+# shared_state.py — bir nechta ishchi jarayon uchun umumiy kichik holat (OBMEN_WORKERS > 1)
+# -*- coding: utf-8 -*-
+# currencies, reserves, card_balance, reserve_holds, help_video — bot_data/bot.db
+# dagi shared_state jadvalida (nom, JSON, versiya) saqlanadi. Har ishchida shu
+# nomdagi lug'at xotirada turadi (bind), o'zgarish darhol bazaga yoziladi (save).
+#   refresh()      — PRAGMA data_version o'zgarmagan bo'lsa hech narsa o'qilmaydi;
+#                    boshqa jarayon o'zgartirgan yozuvlar lug'atning o'ziga qayta yuklanadi
+#   transaction()  — BEGIN IMMEDIATE: o'qish-tekshirish-yozish (zaxira bandlari)
+#                    boshqa ishchilar bilan ketma-ket bajariladi
+import os
+import json
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_state (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class SharedState:
+    def __init__(self, db_path: str, busy_timeout: float = 5.0,
+                 on_change: Optional[Callable[[List[str]], None]] = None):
+        self.db_path = db_path
+        self.on_change = on_change
+        self._lock = threading.RLock()
+        # isolation_level=None — tranzaksiyalar faqat transaction() da, qolgani autocommit
+        # timeout — boshqa ishchi yozish qulfini ushlab turganda kutish (busy_timeout)
+        self._conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # nom -> [lug'at, shu jarayon ko'rgan versiya]
+        self._bound: Dict[str, list] = {}
+        self._data_version = self._read_data_version()
+        self._depth = 0
+        # bazada biror jarayon nimadir yozgan har safar oshadi (orders ham shu faylda)
+        self.generation = 0
+        self.reloads = 0
+        self.conflicts = 0
+
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def bind(self, name: str, default: Any, seed_path: Optional[str] = None) -> Any:
+        # Yozuv bo'lmasa — eski JSON fayldan (bo'lsa) yoki default dan boshlanadi
+        with self._lock:
+            row = self._conn.execute("SELECT data, version FROM shared_state WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                value = default
+                if seed_path and os.path.exists(seed_path):
+                    with open(seed_path, "r", encoding="utf-8") as f:
+                        value = json.load(f)
+                # bir vaqtda ishga tushgan ishchilardan birinchisiniki qoladi
+                self._conn.execute("INSERT OR IGNORE INTO shared_state (name, data, version) VALUES (?, ?, 1)",
+                                   (name, _dumps(value)))
+                row = self._conn.execute("SELECT data, version FROM shared_state WHERE name = ?",
+                                         (name,)).fetchone()
+            value = json.loads(row[0])
+            self._bound[name] = [value, row[1]]
+            return value
+
+    def save(self, name: str, value: Any):
+        with self._lock:
+            if self._depth:
+                self._write(name, value)
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(name, value)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _write(self, name: str, value: Any):
+        cur = self._conn.execute("UPDATE shared_state SET data = ?, version = version + 1 WHERE name = ?",
+                                 (_dumps(value), name))
+        if cur.rowcount == 0:
+            self._conn.execute("INSERT INTO shared_state (name, data, version) VALUES (?, ?, 1)",
+                               (name, _dumps(value)))
+        version = self._conn.execute("SELECT version FROM shared_state WHERE name = ?", (name,)).fetchone()[0]
+        entry = self._bound.get(name)
+        if entry is not None:
+            if entry[1] + 1 != version:
+                # oxirgi refresh dan keyin boshqa ishchi ham yozgan — ularning o'zgarishi ustidan yozildi
+                self.conflicts += 1
+                logger.warning("%s: boshqa ishchining o'zgarishi ustidan yozildi (v%d -> v%d)",
+                               name, entry[1], version)
+            entry[1] = version
+
+    def refresh(self) -> List[str]:
+        # Update boshida chaqiriladi: o'zgarmagan bo'lsa bitta PRAGMA
+        with self._lock:
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return []
+            self._data_version = data_version
+            self.generation += 1
+            changed = []
+            for name, version in self._conn.execute("SELECT name, version FROM shared_state").fetchall():
+                entry = self._bound.get(name)
+                if entry is None or entry[1] == version:
+                    continue
+                row = self._conn.execute("SELECT data, version FROM shared_state WHERE name = ?",
+                                         (name,)).fetchone()
+                value = json.loads(row[0])
+                # lug'atning o'zi yangilanadi — unga havola saqlagan kod (ledger, handlerlar) yangisini ko'radi
+                target = entry[0]
+                if isinstance(target, dict) and isinstance(value, dict):
+                    target.clear()
+                    target.update(value)
+                else:
+                    entry[0] = value
+                entry[1] = row[1]
+                changed.append(name)
+            if changed:
+                self.reloads += len(changed)
+                if self.on_change is not None:
+                    self.on_change(changed)
+            return changed
+
+    @contextmanager
+    def transaction(self):
+        # Ichma-ich chaqirilsa tashqi tranzaksiyaga qo'shiladi
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._depth = 1
+            try:
+                # yozish qulfi olingandan keyin — boshqa ishchilarning oxirgi holati
+                self.refresh()
+                yield
+            except BaseException:
+                self._depth = 0
+                self._conn.execute("ROLLBACK")
+                raise
+            self._depth = 0
+            self._conn.execute("COMMIT")
+            # o'zimizning COMMIT data_version ni o'zgartirmaydi
+            self._data_version = self._read_data_version()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"bound": sorted(self._bound), "generation": self.generation, "reloads": self.reloads,
+                "conflicts": self.conflicts}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,184 @@
+# side_effects.py — callbackdan keyingi qo'shimcha ishlar uchun fon ishchilar havzasi
+# -*- coding: utf-8 -*-
+# Admin tugmani bosganda holat darhol o'zgaradi va call.answer() qaytadi;
+# foydalanuvchiga xabar, kanalga post va captionni tahrirlash shu yerga
+# navbatga qo'yiladi. Har vazifa qayta urinishlar bilan bajariladi
+# (RetryAfter bo'lsa Telegram aytgan vaqtcha kutiladi) va nomi bo'yicha
+# kechikish statistikasi yig'iladi. submit hech qachon xato bermaydi (holat allaqachon
+# saqlangan): navbat to'lsa vazifa cheklangan zaxira navbatiga (overflow) tushadi va
+# ishchilar uni navbatda joy bo'shashi bilan o'tkazadi; u ham to'lsa vazifa darhol
+# rad etiladi — on_failure chaqiriladi va rejected_total oshadi.
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from aiogram.utils import exceptions
+
+logger = logging.getLogger(__name__)
+
+# Qayta urinishdan foyda yo'q: noto'g'ri so'rov yoki bot bloklangan
+NON_RETRYABLE = (exceptions.BadRequest, exceptions.Unauthorized)
+
+
+class TaskStats:
+    __slots__ = ("submitted", "ok", "failed", "retries", "total_ms", "max_ms", "wait_ms")
+
+    def __init__(self):
+        self.submitted = 0
+        self.ok = 0
+        self.failed = 0
+        self.retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.wait_ms = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        done = self.ok + self.failed
+        return {
+            "submitted": self.submitted,
+            "ok": self.ok,
+            "failed": self.failed,
+            "retries": self.retries,
+            "avg_ms": round(self.total_ms / done, 3) if done else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "avg_wait_ms": round(self.wait_ms / done, 3) if done else 0.0,
+        }
+
+
+class SideEffectPipeline:
+    def __init__(self, workers: int = 8, retries: int = 3, backoff: float = 1.0, maxsize: int = 10000,
+                 overflow_size: Optional[int] = None):
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        # navbat to'lganda kutib turadiganlar; ishchilar navbatdan olgan zahoti bittasini o'tkazadi
+        self._overflow: Deque[tuple] = deque()
+        self.overflow_size = maxsize if overflow_size is None else overflow_size
+        self.overflow_total = 0
+        # rad etilganlar: (nom, on_failure, xato) — ishchilar bo'sh paytda on_failure ni chaqiradi
+        self._rejected: Deque[Tuple[str, Callable, BaseException]] = deque(maxlen=self.overflow_size or 1)
+        self.rejected_total = 0
+        self._stats: Dict[str, TaskStats] = {}
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, name: str, factory: Callable[[], Awaitable[Any]],
+               on_failure: Optional[Callable[[BaseException], Awaitable[Any]]] = None):
+        # factory har urinishda yangi coroutine yaratadi
+        self._stats.setdefault(name, TaskStats()).submitted += 1
+        item = (name, factory, on_failure, time.perf_counter())
+        try:
+            self._queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        if len(self._overflow) < self.overflow_size:
+            self._overflow.append(item)
+            self.overflow_total += 1
+            if self.overflow_total == 1 or self.overflow_total % 1000 == 0:
+                logger.warning("Fon vazifalari navbati to'ldi (%d), '%s' zaxira navbatiga qo'yildi (jami %d)",
+                               self.depth, name, self.overflow_total)
+            return
+        # zaxira navbati ham to'la — yangi vazifa yaratmasdan darhol rad etamiz
+        self.rejected_total += 1
+        self._stats[name].failed += 1
+        if self.rejected_total == 1 or self.rejected_total % 1000 == 0:
+            logger.error("Fon vazifalari navbati va zaxirasi to'la, '%s' rad etildi (jami %d)",
+                         name, self.rejected_total)
+        if on_failure is not None:
+            if len(self._rejected) == self._rejected.maxlen:
+                # bu ro'yxat ham cheklangan — eng eskisining on_failure i chaqirilmaydi
+                dropped, _, _ = self._rejected[0]
+                logger.warning("Fon vazifasi '%s' uchun on_failure chaqirilmadi (ro'yxat to'la)", dropped)
+            self._rejected.append((name, on_failure, asyncio.QueueFull()))
+
+    async def _report_rejected(self):
+        while self._rejected:
+            name, on_failure, error = self._rejected.popleft()
+            try:
+                await on_failure(error)
+            except Exception as e:
+                logger.exception("Fon vazifasi '%s' xato ishlovchisida xato: %s", name, e)
+
+    async def _run_one(self, name: str, factory, on_failure, queued_at: float):
+        stats = self._stats[name]
+        started = time.perf_counter()
+        stats.wait_ms += (started - queued_at) * 1000
+        error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.retries += 1
+            try:
+                await factory()
+                error = None
+                break
+            except exceptions.RetryAfter as e:
+                error, delay = e, e.timeout
+            except NON_RETRYABLE as e:
+                error = e
+                break
+            except Exception as e:
+                error, delay = e, self.backoff * (2 ** attempt)
+            if attempt < self.retries:
+                await asyncio.sleep(delay)
+        elapsed = (time.perf_counter() - started) * 1000
+        stats.total_ms += elapsed
+        stats.max_ms = max(stats.max_ms, elapsed)
+        if error is None:
+            stats.ok += 1
+            return
+        stats.failed += 1
+        logger.warning("Fon vazifasi '%s' bajarilmadi: %s", name, error)
+        if on_failure is not None:
+            try:
+                await on_failure(error)
+            except Exception as e:
+                logger.exception("Fon vazifasi '%s' xato ishlovchisida xato: %s", name, e)
+
+    async def _worker(self):
+        while True:
+            if self._rejected:
+                await self._report_rejected()
+            item = await self._queue.get()
+            if self._overflow:
+                # navbatda joy bo'shadi — zaxiradagi eng eski vazifa tartib bo'yicha navbatga
+                self._queue.put_nowait(self._overflow.popleft())
+            try:
+                await self._run_one(*item)
+            except Exception as e:
+                logger.exception("Fon vazifasida kutilmagan xato: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if self._tasks:
+            return
+        loop = asyncio.get_event_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 30):
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Fon vazifalari %s soniyada tugamadi, %d ta qoldi", timeout,
+                           self.depth + len(self._overflow))
+        await self._report_rejected()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.depth,
+            "overflow_depth": len(self._overflow),
+            "overflow_total": self.overflow_total,
+            "rejected_total": self.rejected_total,
+            "tasks": {name: s.as_dict() for name, s in sorted(self._stats.items())},
+        }
@@ -0,0 +1,409 @@
+# snapshot_store.py — users/orders uchun mmap qilinadigan snapshot (dangasa yuklash)
+# -*- coding: utf-8 -*-
+# users.json / orders.json ni ishga tushishda to'liq json.load qilish o'rniga
+# <nom>.snap fayli mmap qilinadi. Xotiraga faqat kalitlar indeksi o'qiladi,
+# yozuvning o'zi birinchi murojaatda decode qilinadi. Fayl tuzilishi:
+#   MAGIC | HEADER (count, keys_len, columns_len)
+#   keys     — JSON ro'yxat, slot tartibida
+#   columns  — {maydon: [takrorlanmas qiymatlar]} (JSON) + har maydon uchun array("I") kodlar
+#   offsets  — array("Q"), count + 1 ta (yozuv i = data[offsets[i]:offsets[i+1]])
+#   data     — ixcham JSON yozuvlar ketma-ket
+# columns — decode qilmasdan filtrlash uchun (orders: status, created_at).
+# Saqlashda faqat __setitem__ orqali o'zgargan (repo.save_user/save_order) yozuvlar qayta
+# serializatsiya qilinadi, qolganlari eski mmap dan bayt sifatida ko'chiriladi. Joyida
+# o'zgartirilgan yozuv ham saqlanishi uchun qayta o'rnatilishi kerak (map[key] = yozuv).
+# Loopda faqat o'zgarishlar muzlatiladi; yangi kalitlar ro'yxati, fayl va uning mmap
+# ko'rinishi thread poolda quriladi va loopda bitta o'zlashtirish bilan almashtiriladi.
+# Shundan keyin o'zgarmagan, oxirgi flush oralig'ida o'qilmagan yozuvlar keshdan
+# chiqariladi — RSS vaqt o'tishi bilan o'smaydi.
+import os
+import sys
+import json
+import mmap
+import struct
+import logging
+import tempfile
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"OBSNAP1\n"
+# JSON dan ko'chirilgandan keyin eski fayl shu qo'shimcha bilan qoladi (zaxira)
+IMPORTED_SUFFIX = ".imported"
+HEADER = struct.Struct("<QQQ")
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _View:
+    # Bitta snapshot faylining o'qish uchun ko'rinishi. Yaratilgandan keyin o'zgarmaydi
+    # (ustunlar birinchi kerak bo'lganda bir marta o'qiladi): SnapshotMap uni bitta
+    # o'zlashtirish bilan almashtiradi, shuning uchun thread pooldagi o'quvchi (peek,
+    # to'liq skanlar) qo'lidagi ko'rinishdan izchil slot va baytlarni oladi.
+    __slots__ = ("mm", "offsets", "data_start", "slot_keys", "slots", "columns_raw", "columns")
+
+    def __init__(self, mm: Optional[mmap.mmap] = None, offsets: Optional[array] = None, data_start: int = 0,
+                 slot_keys: Optional[List[str]] = None, columns_raw: Tuple[int, int] = (0, 0)):
+        self.mm = mm
+        self.offsets = offsets if offsets is not None else array("Q", [0])
+        self.data_start = data_start
+        self.slot_keys: List[str] = slot_keys if slot_keys is not None else []
+        self.slots: Dict[str, int] = dict(zip(self.slot_keys, range(len(self.slot_keys))))
+        self.columns_raw = columns_raw
+        self.columns: Optional[Dict[str, Tuple[list, array]]] = None
+
+    @classmethod
+    def open(cls, path: str) -> "_View":
+        # Eski ko'rinishning mmap i yopilmaydi: undan o'qiyotganlar bo'lishi mumkin (GC yopadi)
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_RANDOM"):
+            # Yozuvlar tarqoq o'qiladi — oldindan o'qish (readahead) butun faylni RSS ga tortmasin
+            mm.madvise(mmap.MADV_RANDOM)
+        if mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: snapshot formati noma'lum")
+        pos = len(MAGIC)
+        count, keys_len, columns_len = HEADER.unpack_from(mm, pos)
+        pos += HEADER.size
+        slot_keys = json.loads(mm[pos:pos + keys_len])
+        pos += keys_len
+        # ustunlar birinchi filtrlashda o'qiladi
+        columns_raw = (pos, columns_len)
+        pos += columns_len
+        offsets = array("Q")
+        offsets.frombytes(mm[pos:pos + 8 * (count + 1)])
+        return cls(mm, offsets, pos + 8 * (count + 1), slot_keys, columns_raw)
+
+    def load_columns(self) -> Dict[str, Tuple[list, array]]:
+        if self.columns is None:
+            columns: Dict[str, Tuple[list, array]] = {}
+            pos, length = self.columns_raw
+            if self.mm is not None and length:
+                header_len = struct.unpack_from("<Q", self.mm, pos)[0]
+                values = json.loads(self.mm[pos + 8:pos + 8 + header_len])
+                at = pos + 8 + header_len
+                count = len(self.slot_keys)
+                for name in sorted(values):
+                    codes = array("I")
+                    codes.frombytes(self.mm[at:at + 4 * count])
+                    at += 4 * count
+                    columns[name] = (values[name], codes)
+            self.columns = columns
+        return self.columns
+
+    def raw(self, slot: int) -> bytes:
+        return self.mm[self.data_start + self.offsets[slot]:self.data_start + self.offsets[slot + 1]]
+
+
+class SnapshotMap(MutableMapping):
+    def __init__(self, path: Optional[str] = None, fields: Sequence[str] = ()):
+        self.path = path
+        self.fields = tuple(fields)
+        # joriy snapshot fayli; kalitlar to'plami = view.slot_keys - _removed + _added
+        self._view = _View.open(path) if path is not None and os.path.exists(path) else _View()
+        # faylda bor, lekin o'chirilgan kalitlar va faylda hali yo'q (keyin qo'shilgan) kalitlar, tartib bilan
+        self._removed: Set[str] = set()
+        self._added: Dict[str, None] = {}
+        # decode qilingan va yangi yozuvlar
+        self._cache: Dict[str, Any] = {}
+        # oxirgi saqlashdan beri o'rnatilgan kalitlar va oxirgi flush oralig'ida o'qilganlar
+        self._dirty: Set[str] = set()
+        self._touched: Set[str] = set()
+        self.decoded = 0
+        self.evicted = 0
+
+    def _slot(self, key) -> Optional[int]:
+        # Faylda bor va o'chirilmagan kalitning sloti
+        slot = self._view.slots.get(key)
+        if slot is None or key in self._removed:
+            return None
+        return slot
+
+    # --- MutableMapping ---
+    def __getitem__(self, key):
+        self._touched.add(key)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        view = self._view
+        slot = view.slots.get(key)
+        if slot is None or key in self._removed:
+            raise KeyError(key)
+        value = self._cache[key] = json.loads(view.raw(slot))
+        self.decoded += 1
+        return value
+
+    def peek(self, key, default: Any = None) -> Any:
+        # Keshga olmasdan o'qish (to'liq skanlar uchun: RSS o'smaydi). Thread pooldan ham
+        # chaqiriladi: avval kesh, keyin ko'rinish — _swap yozuvni keshdan faqat yangi
+        # ko'rinish o'rnatilgandan keyin chiqaradi, slot va baytlar esa bitta ko'rinishdan olinadi
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        view = self._view
+        slot = view.slots.get(key)
+        if slot is None or key in self._removed:
+            return default
+        return json.loads(view.raw(slot))
+
+    def __setitem__(self, key, value):
+        self._cache[key] = value
+        self._dirty.add(key)
+        if key in self._view.slots:
+            self._removed.discard(key)
+        else:
+            self._added[key] = None
+
+    def __delitem__(self, key):
+        if key in self._added:
+            del self._added[key]
+        elif self._slot(key) is not None:
+            self._removed.add(key)
+        else:
+            raise KeyError(key)
+        self._cache.pop(key, None)
+        self._dirty.discard(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._added or self._slot(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        # Thread pooldan (to'liq skanlar) ham xavfsiz: o'qish paytida ko'rinish almashsa,
+        # _added yangi ko'rinishga moslangan bo'lishi mumkin — ro'yxat qayta olinadi
+        while True:
+            view = self._view
+            removed = self._removed
+            keys = [k for k in view.slot_keys if k not in removed] if removed else list(view.slot_keys)
+            keys.extend(list(self._added))
+            if self._view is view:
+                return iter(keys)
+
+    def __len__(self) -> int:
+        return len(self._view.slot_keys) - len(self._removed) + len(self._added)
+
+    # --- decode qilmasdan filtrlash ---
+    def field(self, key: str, name: str, default: Any = None) -> Any:
+        if key in self._cache:
+            return self._cache[key].get(name, default)
+        view = self._view
+        slot = view.slots.get(key)
+        column = view.load_columns().get(name)
+        if column is None or slot is None or key in self._removed:
+            return self[key].get(name, default)
+        values, codes = column
+        return values[codes[slot]]
+
+    def keys_where(self, name: str, accepted: Collection[Any]) -> List[str]:
+        view = self._view
+        column = view.load_columns().get(name)
+        if column is None:
+            return [k for k in self if self[k].get(name) in accepted]
+        values, codes = column
+        wanted = {i for i, v in enumerate(values) if v in accepted}
+        result = []
+        if wanted:
+            slot_keys, removed, cache = view.slot_keys, self._removed, self._cache
+            for slot, code in enumerate(codes):
+                if code in wanted:
+                    key = slot_keys[slot]
+                    if key not in removed and key not in cache:
+                        result.append(key)
+        result.extend(k for k, v in self._cache.items() if k in self and v.get(name) in accepted)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"keys": len(self), "decoded": self.decoded, "cached": len(self._cache),
+                "dirty": len(self._dirty), "evicted": self.evicted}
+
+    # --- saqlash (PersistenceService: tayyorlash loopda, yozish thread poolda) ---
+    def prepare_write(self):
+        # Loop oqimida faqat o'zgarishlar muzlatiladi: o'rnatilgan yozuvlar baytlarga aylanadi,
+        # o'chirilgan va qo'shilgan kalitlar nusxalanadi — O(o'zgarishlar), O(kalitlar) emas.
+        # Yangi kalitlar ro'yxati, slotlar, ustunlar va fayl thread poolda joriy (o'zgarmas)
+        # ko'rinishdan quriladi; tayyor ko'rinish done() da bitta o'zlashtirish bilan almashadi.
+        flushed, self._dirty = self._dirty, set()
+        fields = self.fields
+        changed: Dict[str, Tuple[bytes, tuple]] = {}
+        for key in flushed:
+            record = self._cache[key]
+            row = tuple(record.get(name) if isinstance(record, dict) else None for name in fields)
+            changed[key] = (_dumps(record), row)
+        removed = set(self._removed)
+        added = list(self._added)
+        view = self._view
+        result: List[_View] = []
+
+        def write(path: str) -> int:
+            keys, records, values = _merge(view, fields, removed, added, changed)
+            size = _write_snapshot(path, fields, keys, records, values, view.offsets, view.raw)
+            result.append(_View.open(path))
+            return size
+
+        def done(ok: bool):
+            # Loop oqimida, yozish tugagandan keyin
+            if not ok or not result:
+                # oraliqda o'chirilganlari qayta yozilmaydi
+                self._dirty |= {key for key in flushed if key in self._cache}
+                return
+            self._swap(result[0], removed, added)
+
+        return write, done
+
+    def _swap(self, view: _View, removed: Set[str], added: List[str]):
+        # Yangi fayl tayyorlangan paytdagi kalitlar bilan yozilgan; shundan keyingi o'zgarishlar
+        # (_removed/_added, keshda va _dirty da) yangi ko'rinishga nisbatan qayta hisoblanadi
+        self._view = view
+        for key in added:
+            if key in self._added:
+                del self._added[key]
+            else:
+                # tayyorlashdan keyin o'chirilgan — faylda bor, lekin kalitlar orasida emas
+                self._removed.add(key)
+        for key in removed:
+            if key in self._removed:
+                self._removed.discard(key)
+            else:
+                # tayyorlashdan keyin qayta o'rnatilgan — yangi faylda yo'q
+                self._added[key] = None
+        # o'zgarmagan va oxirgi oraliqda o'qilmagan yozuvlar endi fayldan o'qiladi
+        keep = self._dirty | self._touched
+        for key in [k for k in self._cache if k not in keep and k in view.slots]:
+            del self._cache[key]
+            self.evicted += 1
+        self._touched = set()
+
+    def write_atomic(self, path: str) -> int:
+        writer, done = self.prepare_write()
+        try:
+            size = writer(path)
+        except BaseException:
+            done(False)
+            raise
+        done(True)
+        return size
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], fields: Sequence[str] = ()) -> "SnapshotMap":
+        snapshot = cls(fields=fields)
+        snapshot._cache = dict(data)
+        snapshot._added = dict.fromkeys(snapshot._cache)
+        snapshot._dirty = set(snapshot._cache)
+        return snapshot
+
+    @classmethod
+    def open(cls, path: str, json_path: Optional[str] = None, fields: Sequence[str] = ()) -> "SnapshotMap":
+        # Snapshot bo'lsa — har doim o'sha. JSON dan faqat snapshot hali yo'q bo'lganda bir marta
+        # ko'chiriladi va JSON <nom>.json.imported ga o'tkaziladi: keyin tiklangan yoki tegilgan
+        # eski JSON (mtime) jonli snapshotni hech qachon almashtirmaydi
+        if os.path.exists(path):
+            if json_path is not None and os.path.exists(json_path):
+                logger.warning("%s e'tiborga olinmadi: %s mavjud (qayta ko'chirish uchun .snap ni o'chiring)",
+                               json_path, path)
+            return cls(path, fields)
+        if json_path is not None and os.path.exists(json_path):
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            cls.from_dict(data, fields).write_atomic(path)
+            os.replace(json_path, json_path + IMPORTED_SUFFIX)
+            logger.info("%s -> %s (%d ta yozuv)", json_path, path, len(data))
+        else:
+            cls(fields=fields).write_atomic(path)
+        return cls(path, fields)
+
+def _merge(view: _View, fields: Sequence[str], removed: Set[str], added: List[str],
+           changed: Dict[str, Tuple[bytes, tuple]]) -> Tuple[List[str], List[Any], Dict[str, list]]:
+    # Thread poolda: eski ko'rinish + muzlatilgan o'zgarishlar -> yangi fayl tarkibi.
+    # records — tayyor baytlar yoki eski snapshotdagi slot raqamlari
+    columns = view.load_columns() if fields else {}
+    keys, records = [], []
+    values: Dict[str, list] = {name: [] for name in fields}
+    for slot, key in enumerate(view.slot_keys):
+        if key in removed:
+            continue
+        keys.append(key)
+        entry = changed.get(key)
+        if entry is not None:
+            records.append(entry[0])
+            for name, value in zip(fields, entry[1]):
+                values[name].append(value)
+        else:
+            records.append(slot)
+            for name in fields:
+                column = columns.get(name)
+                values[name].append(column[0][column[1][slot]] if column else None)
+    for key in added:
+        entry = changed.get(key)
+        if entry is None:
+            # qo'shilgan kalit doim o'rnatilgan; bo'lmasa yozib bo'lmaydi
+            continue
+        keys.append(key)
+        records.append(entry[0])
+        for name, value in zip(fields, entry[1]):
+            values[name].append(value)
+    return keys, records, values
+
+
+def _write_snapshot(path: str, fields: Sequence[str], keys: List[str], records: List[Any],
+                    values: Dict[str, list], old_offsets: array, raw) -> int:
+    # Thread poolda: records — tayyor baytlar yoki eski snapshotdagi slot raqamlari
+    lengths = [len(r) if isinstance(r, bytes) else old_offsets[r + 1] - old_offsets[r] for r in records]
+    offsets = array("Q", [0])
+    total = 0
+    for length in lengths:
+        total += length
+        offsets.append(total)
+    columns_blob = b""
+    if fields:
+        # qiymatlar lug'ati + har yozuv uchun kod
+        distinct = {name: list(dict.fromkeys(vals)) for name, vals in values.items()}
+        header = _dumps(distinct)
+        parts = [struct.pack("<Q", len(header)), header]
+        for name in sorted(distinct):
+            position = {v: i for i, v in enumerate(distinct[name])}
+            parts.append(array("I", [position[v] for v in values[name]]).tobytes())
+        columns_blob = b"".join(parts)
+    keys_blob = _dumps(keys)
+
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".snap", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(keys), len(keys_blob), len(columns_blob)))
+            f.write(keys_blob)
+            f.write(columns_blob)
+            f.write(offsets.tobytes())
+            for record in records:
+                f.write(record if isinstance(record, bytes) else raw(record))
+            size = f.tell()
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # Eski mmap yopilmaydi: tegilmagan yozuvlar hali undan o'qiladi (os.replace dan keyin ham amal qiladi)
+    return size
+
+def export_json(path: str, json_path: str):
+    # Eski versiyaga qaytish uchun: snapshot -> oddiy JSON
+    snapshot = SnapshotMap(path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({k: snapshot[k] for k in snapshot}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    # python snapshot_store.py export bot_data/orders.snap bot_data/orders.json
+    if len(sys.argv) != 4 or sys.argv[1] != "export":
+        print("Foydalanish: python snapshot_store.py export <fayl.snap> <fayl.json>")
+        sys.exit(1)
+    export_json(sys.argv[2], sys.argv[3])
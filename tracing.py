@@ -0,0 +1,292 @@
+# tracing.py — update bo'yicha span daraxti, sekin updatelar jurnali va /profile
+# -*- coding: utf-8 -*-
+# Har update uchun Trace ochiladi (TracingMiddleware); ichida:
+#   filters          — handler tanlanguncha (filtrlar zanjiri, ButtonRouter)
+#   handler:<nom>    — tanlangan handler
+#   storage.* / save_json / repo.* / api.<metod> — instrument() bilan o'ralgan chaqiruvlar
+# Span — bitta ro'yxat elementi (nom, boshlanish, tugash, ota indeks); hech qanday
+# formatlash update tugaguncha qilinmaydi. Natija faqat ikki holda yoziladi:
+#   * tasodifiy tanlangan (sample_rate) updatelar — trace jurnaliga
+#   * slow_ms dan uzoq davom etganlar — sekin updatelar jurnaliga (to'liq daraxt bilan)
+# Profiler — /profile buyrug'i uchun: cProfile N soniya, eng og'ir funksiyalar matni.
+import io
+import json
+import time
+import random
+import pstats
+import asyncio
+import cProfile
+import logging
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from router import resolve_handler
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS = 256
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("obmen_trace", default=None)
+_parent: ContextVar[int] = ContextVar("obmen_trace_parent", default=0)
+
+
+class Trace:
+    __slots__ = ("kind", "event", "sampled", "spans", "handler")
+
+    def __init__(self, kind: str, event: Any, sampled: bool):
+        self.kind = kind
+        self.event = event
+        self.sampled = sampled
+        self.handler: Optional[str] = None
+        # [nom, boshlanish, tugash, ota indeks]; 0 — ildiz (filtrlardan handler oxirigacha)
+        self.spans: List[list] = [[kind, time.perf_counter(), None, -1]]
+
+    def open(self, name: str, parent: Optional[int] = None) -> int:
+        if len(self.spans) >= MAX_SPANS:
+            return -1
+        self.spans.append([name, time.perf_counter(), None, _parent.get() if parent is None else parent])
+        return len(self.spans) - 1
+
+    def close(self, index: int):
+        if index > 0 and self.spans[index][2] is None:
+            self.spans[index][2] = time.perf_counter()
+
+    @property
+    def total_ms(self) -> float:
+        root = self.spans[0]
+        return ((root[2] or time.perf_counter()) - root[1]) * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        origin = self.spans[0][1]
+        depths = [0] * len(self.spans)
+        spans = []
+        for i, (name, start, end, parent) in enumerate(self.spans):
+            if parent >= 0:
+                depths[i] = depths[parent] + 1
+            spans.append({"name": name, "depth": depths[i], "start_ms": round((start - origin) * 1000, 3),
+                          "ms": round((end - start) * 1000, 3) if end else None})
+        update = types.Update.get_current()
+        user = getattr(self.event, "from_user", None)
+        return {"t": round(time.time(), 3), "update_id": update.update_id if update else None, "kind": self.kind,
+                "user": user.id if user else None, "handler": self.handler, "total_ms": round(self.total_ms, 3),
+                "spans": spans}
+
+    def summary(self) -> str:
+        # Jurnal uchun bir qator: eng uzun 5 ta span (ildizdan tashqari)
+        heavy = sorted((s for s in self.spans[1:] if s[2] is not None), key=lambda s: s[1] - s[2])[:5]
+        parts = ", ".join(f"{name} {(end - start) * 1000:.1f}" for name, start, end, _ in heavy)
+        return f"{self.kind} {self.handler or '-'} {self.total_ms:.1f} ms: {parts}"
+
+
+@contextmanager
+def span(name: str):
+    trace = _trace.get()
+    if trace is None:
+        yield
+        return
+    index = trace.open(name)
+    token = _parent.set(index) if index > 0 else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _parent.reset(token)
+        trace.close(index)
+
+
+def traced(fn: Callable, name: str, label_arg: Optional[int] = None) -> Callable:
+    # label_arg — span nomiga qo'shiladigan pozitsion argument (masalan, Bot.request dagi metod)
+    def span_name(args) -> str:
+        return f"{name}.{args[label_arg]}" if label_arg is not None and len(args) > label_arg else name
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return await fn(*args, **kwargs)
+            with span(span_name(args)):
+                return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _trace.get() is None:
+            return fn(*args, **kwargs)
+        with span(span_name(args)):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def instrument(obj: Any, prefix: str, methods: Iterable[str]):
+    # Obyekt metodlarini shu obyektning o'zida o'raydi (klass o'zgarmaydi): span nomi "<prefix>.<metod>"
+    for method in methods:
+        fn = getattr(obj, method, None)
+        if fn is not None:
+            setattr(obj, method, traced(fn, f"{prefix}.{method}"))
+
+
+def _file_logger(name: str, path: str) -> logging.Logger:
+    log = logging.getLogger(name)
+    log.propagate = False
+    if not log.handlers:
+        handler = RotatingFileHandler(path, maxBytes=5 * 1024 * 1024, backupCount=2, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+    return log
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, slow_ms: float, trace_log: Optional[str] = None,
+                 slow_log: Optional[str] = None):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self._trace_log = _file_logger("obmen.trace", trace_log) if trace_log else None
+        self._slow_log = _file_logger("obmen.slow", slow_log) if slow_log else None
+        self.traced_total = 0
+        self.sampled_total = 0
+        self.slow_total = 0
+        self.max_ms = 0.0
+
+    def begin(self, kind: str, event: Any) -> Trace:
+        return Trace(kind, event, self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def finish(self, trace: Trace):
+        trace.spans[0][2] = time.perf_counter()
+        total = trace.total_ms
+        self.traced_total += 1
+        self.max_ms = max(self.max_ms, total)
+        slow = self.slow_ms > 0 and total >= self.slow_ms
+        if not (slow or trace.sampled):
+            return
+        line = json.dumps(trace.as_dict(), ensure_ascii=False, separators=(",", ":"))
+        if trace.sampled:
+            self.sampled_total += 1
+            if self._trace_log is not None:
+                self._trace_log.info(line)
+        if slow:
+            self.slow_total += 1
+            logger.warning("Sekin update: %s", trace.summary())
+            if self._slow_log is not None:
+                self._slow_log.info(line)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"traced": self.traced_total, "sampled": self.sampled_total, "slow": self.slow_total,
+                "max_ms": round(self.max_ms, 3)}
+
+
+class TracingMiddleware(BaseMiddleware):
+    # Faqat message/callback_query darajasidagi 3 ta hook: aiogram da har bir hook
+    # update boshiga bir necha mikrosekund turadi, update darajasidagi hooklar esa
+    # daraxtga deyarli hech narsa qo'shmaydi.
+    #   pre_process  → trace + "filters" spani (handler tanlanguncha)
+    #   process      → "handler:<nom>" spani (storage/api spanlari shu ostiga tushadi)
+    #   post_process → trace yopiladi
+    def __init__(self, tracer: Tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    def _begin(self, kind: str, event, data: dict):
+        trace = self.tracer.begin(kind, event)
+        data["_trace_token"] = _trace.set(trace)
+        data["_trace_span"] = trace.open("filters", parent=0)
+        data["_trace_parent"] = _parent.set(data["_trace_span"])
+
+    def _pop(self, trace: Trace, data: dict):
+        token = data.pop("_trace_parent", None)
+        if token is not None:
+            _parent.reset(token)
+        trace.close(data.pop("_trace_span", -1))
+
+    def _handler(self, data: dict):
+        trace = _trace.get()
+        if trace is None:
+            return
+        # filters (yoki SkipHandler bilan o'tkazib yuborilgan oldingi handler) yopiladi
+        self._pop(trace, data)
+        trace.handler = getattr(resolve_handler(data), "__name__", "unknown")
+        index = trace.open(f"handler:{trace.handler}", parent=0)
+        data["_trace_span"] = index
+        data["_trace_parent"] = _parent.set(index) if index > 0 else None
+
+    def _finish(self, data: dict):
+        token = data.pop("_trace_token", None)
+        if token is None:
+            return
+        trace = _trace.get()
+        self._pop(trace, data)
+        _trace.reset(token)
+        self.tracer.finish(trace)
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        self._begin("message", message, data)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        self._handler(data)
+
+    async def on_post_process_message(self, message: types.Message, results: list, data: dict):
+        self._finish(data)
+
+    async def on_pre_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._begin("callback_query", call, data)
+
+    async def on_process_callback_query(self, call: types.CallbackQuery, data: dict):
+        self._handler(data)
+
+    async def on_post_process_callback_query(self, call: types.CallbackQuery, results: list, data: dict):
+        self._finish(data)
+
+
+class Profiler:
+    # Event loop oqimidagi hamma narsa (handlerlar, fon vazifalari) profillanadi
+    def __init__(self):
+        self._profile: Optional[cProfile.Profile] = None
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._profile is not None
+
+    def start(self, seconds: float, on_done: Callable[[str], Any]):
+        if self.running:
+            raise RuntimeError("Profiler allaqachon ishlayapti")
+        self._profile = cProfile.Profile()
+        self.started_at = time.monotonic()
+        self._profile.enable()
+        self._task = asyncio.ensure_future(self._run(seconds, on_done))
+
+    async def _run(self, seconds: float, on_done: Callable[[str], Any]):
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            pass
+        report = self.stop()
+        if report is not None:
+            await on_done(report)
+
+    def cancel(self):
+        # /profile qayta yuborilsa — muddatidan oldin to'xtatib natijani yuborish
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def stop(self, limit: int = 40) -> Optional[str]:
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return None
+        profile.disable()
+        out = io.StringIO()
+        out.write(f"Profil: {time.monotonic() - self.started_at:.1f} s\n\n")
+        stats = pstats.Stats(profile, stream=out)
+        stats.strip_dirs()
+        out.write("=== tottime (funksiyaning o'zi) ===\n")
+        stats.sort_stats("tottime").print_stats(limit)
+        out.write("\n=== cumulative (chaqirganlari bilan) ===\n")
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,215 @@
+# trade_stats.py — savdo hajmi bo'yicha yig'ma statistika (/stats)
+# -*- coding: utf-8 -*-
+# Har buyurtma holati o'zgarganda (yuklash, tasdiqlash, bekor qilish) soatlik va
+# kunlik chelakdagi hisoblagichlar oshiriladi:
+#   (chelak boshi, valyuta, tur, hodisa) -> [soni, miqdori, UZS aylanmasi]
+# hodisalar: new — chek yuklandi, ok — tasdiqlandi, no — bekor qilindi.
+# Aylanma = miqdor × buyurtmadagi "rate". Kunlar mahalliy vaqt bo'yicha (tz_offset).
+# Hisobot faqat so'ralgan oraliqdagi chelaklarni ko'radi (buyurtmalar emas).
+# Fayl ixcham: {"v": 1, "tz": ..., "rows": [[grain, boshi, valyuta, tur, hodisa, soni, miqdor, aylanma], ...]}
+# Ko'p ishchili rejimda har ishchi o'z faylini yozadi, hisobot ularni qo'shadi.
+# Buyurtmalar tarixidan qayta qurish (bot to'xtagan paytda):
+#   python trade_stats.py rebuild [bot_data]
+import os
+import sys
+import glob
+import json
+import time
+import sqlite3
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from persistence import encode_json, write_bytes_atomic
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+# buyurtma statusi -> yakuniy hodisa
+FINAL_EVENTS = {"✅ Tasdiqlandi": "ok", "❌ Bekor qilindi": "no"}
+FILE_PATTERN = "trade_stats*.json"
+
+Cell = Tuple[str, str, str]
+
+
+class TradeStats:
+    def __init__(self, tz_offset: int = 0, hourly_days: int = 14):
+        self.tz_offset = tz_offset
+        self.hourly_days = hourly_days
+        # grain -> chelak boshi -> (valyuta, tur, hodisa) -> [soni, miqdor, aylanma]
+        self._buckets: Dict[str, Dict[int, Dict[Cell, list]]] = {"h": {}, "d": {}}
+        self._newest_hour = 0
+        self.events_total = 0
+
+    def day_start(self, ts: int) -> int:
+        return (ts + self.tz_offset) // DAY * DAY - self.tz_offset
+
+    def _add(self, grain: str, start: int, cell: Cell, count: int, amount: float, turnover: float):
+        buckets = self._buckets[grain]
+        bucket = buckets.get(start)
+        if bucket is None:
+            if grain == "h":
+                # Soatlik chelaklar faqat oxirgi hourly_days kun uchun; kunliklari — doim
+                if start > self._newest_hour:
+                    self._newest_hour = start
+                    self._prune()
+                elif start < self._newest_hour - self.hourly_days * DAY:
+                    return
+            bucket = buckets[start] = {}
+        values = bucket.get(cell)
+        if values is None:
+            bucket[cell] = [count, amount, turnover]
+        else:
+            values[0] += count
+            values[1] += amount
+            values[2] += turnover
+
+    def _prune(self):
+        cutoff = self._newest_hour - self.hourly_days * DAY
+        for start in [s for s in self._buckets["h"] if s < cutoff]:
+            del self._buckets["h"][start]
+
+    def record(self, order: dict, event: str, ts: Optional[int] = None):
+        try:
+            amount = float(order["amount"])
+            turnover = amount * float(order.get("rate") or 0)
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Statistikaga yozilmadi (%s): miqdor/kurs noto'g'ri", order.get("id"))
+            return
+        ts = int(ts or time.time())
+        cell = (str(order.get("currency")), str(order.get("type")), event)
+        self._add("h", ts // HOUR * HOUR, cell, 1, amount, turnover)
+        self._add("d", self.day_start(ts), cell, 1, amount, turnover)
+        self.events_total += 1
+
+    def record_order(self, order: dict):
+        # Tarixdan qayta qurishda: yuklash + (bo'lsa) yakuniy hodisa
+        created = int(order.get("created_at") or 0)
+        self.record(order, "new", created)
+        event = FINAL_EVENTS.get(order.get("status"))
+        if event is not None:
+            self.record(order, event, int(order.get("reviewed_at") or created))
+
+    def summary(self, grain: str, start: int, end: int) -> Dict[Cell, list]:
+        # [start, end) oraliqdagi chelaklar yig'indisi: O(chelaklar soni)
+        step = HOUR if grain == "h" else DAY
+        buckets = self._buckets[grain]
+        result: Dict[Cell, list] = {}
+        for bucket_start in range(start, end, step):
+            bucket = buckets.get(bucket_start)
+            if not bucket:
+                continue
+            for cell, (count, amount, turnover) in bucket.items():
+                total = result.setdefault(cell, [0, 0.0, 0.0])
+                total[0] += count
+                total[1] += amount
+                total[2] += turnover
+        return result
+
+    def first_day(self) -> Optional[int]:
+        return min(self._buckets["d"]) if self._buckets["d"] else None
+
+    def rows(self) -> List[list]:
+        return [[grain, start, *cell, *values]
+                for grain, buckets in self._buckets.items()
+                for start, bucket in buckets.items()
+                for cell, values in bucket.items()]
+
+    def encode(self) -> bytes:
+        return encode_json({"v": 1, "tz": self.tz_offset, "rows": self.rows()})
+
+    def prepare_write(self):
+        # PersistenceService: loopda baytlarga, thread poolda faqat yozish
+        payload = self.encode()
+        return (lambda path: write_bytes_atomic(path, payload)), None
+
+    def write_atomic(self, path: str) -> int:
+        return write_bytes_atomic(path, self.encode())
+
+    def load_rows(self, rows: Iterable[list]):
+        for grain, start, currency, order_type, event, count, amount, turnover in rows:
+            self._add(grain, int(start), (currency, order_type, event), int(count), float(amount), float(turnover))
+
+    @classmethod
+    def load(cls, path: str, tz_offset: int = 0, hourly_days: int = 14) -> "TradeStats":
+        stats = cls(tz_offset, hourly_days)
+        if not os.path.exists(path):
+            return stats
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("tz", tz_offset) != tz_offset:
+                logger.warning("%s boshqa vaqt mintaqasida yozilgan, kunlik chelaklar siljigan bo'ladi", path)
+            stats.load_rows(data.get("rows", []))
+        except Exception as e:
+            logger.exception("Statistika faylini o'qishda xato (%s): %s", path, e)
+        return stats
+
+    def rebuild(self, orders: Iterable[dict]) -> int:
+        self._buckets = {"h": {}, "d": {}}
+        self._newest_hour = 0
+        seen = set()
+        for order in orders:
+            if order.get("id") in seen:
+                continue
+            seen.add(order.get("id"))
+            self.record_order(order)
+        return len(seen)
+
+
+def merged_summary(parts: Iterable[TradeStats], grain: str, start: int, end: int) -> Dict[Cell, list]:
+    # Ko'p ishchili rejim: har ishchining fayli alohida, yig'indi shu yerda
+    result: Dict[Cell, list] = {}
+    for stats in parts:
+        for cell, values in stats.summary(grain, start, end).items():
+            total = result.setdefault(cell, [0, 0.0, 0.0])
+            for i, value in enumerate(values):
+                total[i] += value
+    return result
+
+
+def history_orders(data_dir: str) -> Iterable[dict]:
+    # Barcha buyurtmalar: bot.db (sqlite backend, bo'sh bo'lmasa) yoki orders.json/.snap + arxiv
+    from repository import DB_NAME, _read_source
+    from order_archive import OrderArchive
+
+    db_path = os.path.join(data_dir, DB_NAME)
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            has_orders = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'orders'").fetchone() is not None
+            if has_orders and conn.execute("SELECT 1 FROM orders LIMIT 1").fetchone() is not None:
+                # sqlite backendda arxiv yo'q — barcha buyurtmalar shu jadvalda
+                for (data,) in conn.execute("SELECT data FROM orders"):
+                    yield json.loads(data)
+                return
+        finally:
+            conn.close()
+    for order_id, order in _read_source(data_dir, "orders").items():
+        yield dict(order, id=order.get("id", order_id))
+    archive = OrderArchive(os.path.join(data_dir, "orders_archive.jsonl"),
+                           os.path.join(data_dir, "orders_archive.idx"))
+    yield from archive.scan()
+
+
+def rebuild_files(data_dir: str, tz_offset: int, hourly_days: int = 14) -> Tuple[str, int]:
+    # Eski (ishchilar bo'yicha) fayllar o'rniga bitta trade_stats.json
+    stats = TradeStats(tz_offset, hourly_days)
+    count = stats.rebuild(history_orders(data_dir))
+    for path in glob.glob(os.path.join(data_dir, FILE_PATTERN)):
+        os.unlink(path)
+    path = os.path.join(data_dir, "trade_stats.json")
+    stats.write_atomic(path)
+    return path, count
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("Foydalanish: python trade_stats.py rebuild [bot_data]")
+        sys.exit(1)
+    started = time.perf_counter()
+    path, count = rebuild_files(sys.argv[2] if len(sys.argv) > 2 else "bot_data", tz_offset=5 * 3600,
+                                hourly_days=int(os.getenv("OBMEN_STATS_HOURLY_DAYS", "14")))
+    logger.info("%d ta buyurtmadan qayta qurildi: %s (%.2f s)", count, path, time.perf_counter() - started)
@@ -0,0 +1,284 @@
+# user_index.py — foydalanuvchilarni ID, @username va ism bo'yicha qidirish (/find)
+# -*- coding: utf-8 -*-
+# Ism so'zlari va username normallashtiriladi (NFKC + casefold, apostroflar olib
+# tashlanadi: "O‘g‘iloy", "O'g'iloy" va "Ogiloy" bir xil) va saralangan kalitlarga
+# aylanadi: "ali", "valiyev", "@ali_uz".
+# Kalitlar ikki qismda turadi:
+#   asosiy — bitta bytes blob + array("I") offsetlar + array("q") user_id lar, (kalit, id)
+#            bo'yicha saralangan; 1M foydalanuvchida ~50 MB (tuple/str lar ro'yxati ~3 barobar ko'p)
+#   delta  — keyin qo'shilganlar, saralangan ro'yxat (insort); DELTA_MAX dan oshsa
+#            compact() uni thread poolda asosiy qism bilan birlashtiradi
+# Aniq username va prefiks qidiruvi — ikkala qismda bisect, O(log n + natijalar).
+# Aniq ID — users lug'atining o'zi. Ism/username o'zgarsa eski kalit o'chirilmaydi:
+# nomzodlar foydalanuvchining joriy yozuvi bo'yicha qayta baholanadi, eskirganlari tushib qoladi.
+import re
+import time
+import asyncio
+import logging
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DELTA_MAX = 50_000
+# bitta so'z uchun ko'rib chiqiladigan eng ko'p kalit (juda qisqa prefikslar uchun chegara)
+MAX_SCAN = 2000
+# joriy yozuvi bo'yicha tekshiriladigan eng ko'p nomzod
+MAX_VERIFY = 500
+APOSTROPHES = str.maketrans({c: None for c in "'‘’ʻʼ`´"})
+WORD_RE = re.compile(r"\w+")
+
+# ball: aniq ID > aniq username > so'z to'liq mos > so'z boshi mos
+SCORE_ID = 100
+SCORE_USERNAME = 50
+SCORE_WORD = 3
+SCORE_PREFIX = 1
+
+Entry = Tuple[bytes, int]
+
+
+def normalize(text: Optional[str]) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold().translate(APOSTROPHES)
+
+
+def words(text: Optional[str]) -> List[str]:
+    return WORD_RE.findall(normalize(text))
+
+
+def user_keys(name: Optional[str], username: Optional[str]) -> Set[bytes]:
+    keys = {w.encode("utf-8") for w in words(name)}
+    handle = normalize(username).strip().lstrip("@")
+    if handle:
+        keys.add(b"@" + handle.encode("utf-8"))
+    return keys
+
+
+class _Packed:
+    def __init__(self, entries: Iterable[Entry] = ()):
+        blob = bytearray()
+        self.offsets = array("I", [0])
+        self.uids = array("q")
+        previous = None
+        for entry in entries:
+            # qurish va birlashtirish paytida ikkala qismga tushgan bir xil kalitlar bittaga
+            if entry == previous:
+                continue
+            previous = key, uid = entry
+            blob += key
+            self.offsets.append(len(blob))
+            self.uids.append(uid)
+        self.blob = bytes(blob)
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def key(self, i: int) -> bytes:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def entries(self) -> Iterator[Entry]:
+        for i in range(len(self.uids)):
+            yield self.key(i), self.uids[i]
+
+    def lower_bound(self, key: bytes, uid: int = -(1 << 63)) -> int:
+        lo, hi = 0, len(self.uids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (self.key(mid), self.uids[mid]) < (key, uid):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def contains(self, key: bytes, uid: int) -> bool:
+        i = self.lower_bound(key, uid)
+        return i < len(self.uids) and self.uids[i] == uid and self.key(i) == key
+
+    def prefix(self, prefix: bytes, limit: int) -> Iterator[Entry]:
+        i = self.lower_bound(prefix)
+        end = min(len(self.uids), i + limit)
+        while i < end:
+            key = self.key(i)
+            if not key.startswith(prefix):
+                return
+            yield key, self.uids[i]
+            i += 1
+
+
+def _prefix(delta: List[Entry], prefix: bytes, limit: int) -> Iterator[Entry]:
+    i = bisect_left(delta, (prefix, -(1 << 63)))
+    for key, uid in delta[i:i + limit]:
+        if not key.startswith(prefix):
+            return
+        yield key, uid
+
+
+def score(keys: Set[bytes], query: List[str]) -> int:
+    # Har so'rov so'zi kamida bitta kalitga mos kelishi kerak, aks holda 0
+    total = 0
+    for word in query:
+        raw, handle = word.encode("utf-8"), b"@" + word.lstrip("@").encode("utf-8")
+        if handle in keys and len(query) == 1:
+            best = SCORE_USERNAME
+        elif raw in keys or handle in keys:
+            best = SCORE_WORD
+        elif any(k.startswith(raw) or k.startswith(handle) for k in keys):
+            best = SCORE_PREFIX
+        else:
+            return 0
+        total += best
+    return total
+
+
+class UserIndex:
+    def __init__(self, delta_max: int = DELTA_MAX):
+        self.delta_max = delta_max
+        self._base = _Packed()
+        # compact() paytida muzlatilgan delta — birlashtirish tugaguncha qidiruvda qatnashadi
+        self._frozen: List[Entry] = []
+        self._delta: List[Entry] = []
+        self._compacting = False
+        self.ready = False
+        self.build_s = 0.0
+        self.compactions = 0
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._frozen) + len(self._delta)
+
+    def _contains(self, key: bytes, uid: int) -> bool:
+        for part in (self._delta, self._frozen):
+            i = bisect_left(part, (key, uid))
+            if i < len(part) and part[i] == (key, uid):
+                return True
+        return self._base.contains(key, uid)
+
+    def add(self, uid: int, name: Optional[str], username: Optional[str]) -> int:
+        added = 0
+        for key in user_keys(name, username):
+            if not self._contains(key, uid):
+                insort(self._delta, (key, uid))
+                added += 1
+        return added
+
+    @property
+    def needs_compact(self) -> bool:
+        return len(self._delta) > self.delta_max and not self._compacting
+
+    @staticmethod
+    def build_base(rows: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> _Packed:
+        # Bloklovchi — thread poolda chaqiriladi; rows: (user_id, ism, username).
+        # Saralash uchun har yozuv bitta bytes: kalit + NUL + id (big-endian) — tartibi
+        # (kalit, id) bilan bir xil (kalitlarda NUL yo'q), tuple lardan ~2 barobar kam xotira
+        encoded = [key + b"\0" + int(uid).to_bytes(8, "big")
+                   for uid, name, username in rows for key in user_keys(name, username)]
+        encoded.sort(reverse=True)
+
+        def drain():
+            # oxiridan olinadi — o'qilgan yozuvlar darhol bo'shaydi (cho'qqi xotira kamayadi)
+            while encoded:
+                item = encoded.pop()
+                yield item[:-9], int.from_bytes(item[-8:], "big")
+
+        return _Packed(drain())
+
+    def install(self, base: _Packed, elapsed: float = 0.0):
+        self._base = base
+        self.ready = True
+        self.build_s = elapsed
+
+    async def build(self, rows: Iterable[Tuple[int, Optional[str], Optional[str]]]):
+        # Qurilayotgan paytda add() qilinganlar deltada qoladi
+        started = time.perf_counter()
+        base = await asyncio.get_running_loop().run_in_executor(None, self.build_base, rows)
+        self.install(base, time.perf_counter() - started)
+        logger.info("Foydalanuvchilar indeksi: %d kalit, %.2f s", len(base), self.build_s)
+
+    async def compact(self):
+        if self._compacting:
+            return
+        self._compacting = True
+        self._frozen, self._delta = self._delta, []
+        try:
+            base, frozen = self._base, self._frozen
+            merged = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: _Packed(merge(base.entries(), frozen)))
+            self._base = merged
+            self.compactions += 1
+        except Exception:
+            # birlashtirib bo'lmadi — muzlatilgan kalitlar deltaga qaytadi
+            for entry in self._frozen:
+                insort(self._delta, entry)
+            raise
+        finally:
+            self._frozen = []
+            self._compacting = False
+
+    def _matches(self, word: str, single: bool) -> Tuple[Dict[int, int], bool]:
+        # user_id -> shu so'z uchun eng yaxshi ball (faqat indeks bo'yicha) va chegaralandimi
+        raw = word.lstrip("@").encode("utf-8")
+        handle = b"@" + raw
+        found: Dict[int, int] = {}
+        truncated = False
+        for prefix in (raw, handle):
+            for source in (self._base.prefix(prefix, MAX_SCAN), _prefix(self._frozen, prefix, MAX_SCAN),
+                           _prefix(self._delta, prefix, MAX_SCAN)):
+                count = 0
+                for key, uid in source:
+                    count += 1
+                    if key == handle:
+                        points = SCORE_USERNAME if single else SCORE_WORD
+                    else:
+                        points = SCORE_WORD if key == raw else SCORE_PREFIX
+                    if points > found.get(uid, 0):
+                        found[uid] = points
+                truncated = truncated or count >= MAX_SCAN
+        return found, truncated
+
+    def search(self, query: str, lookup: Callable[[int], Optional[Dict[str, Any]]],
+               limit: int = 10) -> Tuple[List[Tuple[int, int]], bool]:
+        # [(user_id, ball)] kamayish tartibida va "natijalar chegaralandi" belgisi.
+        # lookup(user_id) — joriy yozuv (name/username) yoki None; faqat eng yaxshi
+        # nomzodlar uchun, limit ta natija topilguncha (ko'pi bilan MAX_VERIFY marta)
+        text = query.strip()
+        results: Dict[int, int] = {}
+        if text.isdigit() and lookup(int(text)) is not None:
+            results[int(text)] = SCORE_ID
+        query_words = words(text)
+        if not query_words:
+            return list(results.items()), False
+        parts = [self._matches(word, len(query_words) == 1) for word in query_words]
+        # nomzodlar eng aniq (chegaralanmagan, eng kichik) so'z bo'yicha olinadi
+        driver = min(range(len(parts)), key=lambda i: (parts[i][1], len(parts[i][0])))
+        preliminary: Dict[int, int] = {}
+        for uid, points in parts[driver][0].items():
+            for j, (found, cut) in enumerate(parts):
+                if j == driver:
+                    continue
+                if uid in found:
+                    points += found[uid]
+                elif not cut:
+                    break
+            else:
+                preliminary[uid] = points
+        checked = 0
+        for uid in sorted(preliminary, key=lambda u: (-preliminary[u], u)):
+            if len(results) >= limit or checked >= MAX_VERIFY:
+                break
+            if uid in results:
+                continue
+            record = lookup(uid)
+            checked += 1
+            if record is None:
+                continue
+            # eskirgan kalitlar (ism/username o'zgargan) shu yerda tushib qoladi
+            points = score(user_keys(record.get("name"), record.get("username")), query_words)
+            if points:
+                results[uid] = points
+        ranked = sorted(results.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit], any(cut for _, cut in parts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "keys": len(self), "delta": len(self._delta),
+                "build_s": round(self.build_s, 3), "compactions": self.compactions}
@@ -0,0 +1,169 @@
+# webhook.py — webhook rejimi (OBMEN_MODE=webhook)
+# -*- coding: utf-8 -*-
+# Telegram so'roviga darhol "ok" qaytariladi, update esa cheklangan sonli
+# ishchilar (worker) tomonidan event loopda qayta ishlanadi. Navbat to'lib
+# qolsa so'rov navbatda joy bo'shashini kutadi (Telegram o'zi qayta yuboradi).
+#
+# Mahalliy sinov uchun soxta Telegram mijozi:
+#   python webhook.py http://127.0.0.1:8080/webhook [soni] [secret]
+import sys
+import hmac
+import time
+import json
+import asyncio
+import logging
+from typing import Callable, List, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiogram.utils.executor import Executor
+
+logger = logging.getLogger(__name__)
+
+UPDATE_QUEUE_KEY = "OBMEN_UPDATE_QUEUE"
+SECRET_TOKEN_KEY = "OBMEN_SECRET_TOKEN"
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateQueue:
+    def __init__(self, dispatcher: Dispatcher, workers: int = 32, maxsize: int = 1000):
+        self.dispatcher = dispatcher
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+        self.processed = 0
+        self.errors = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, update: types.Update, on_done: Optional[Callable[[types.Update, bool, float], None]] = None):
+        # on_done(update, muvaffaqiyatli, soniya) — qayta ishlash tugaganda (scaleout ishchisi javobi)
+        await self._queue.put((update, on_done))
+
+    async def _worker(self):
+        Dispatcher.set_current(self.dispatcher)
+        Bot.set_current(self.dispatcher.bot)
+        while True:
+            update, on_done = await self._queue.get()
+            started = time.perf_counter()
+            ok = False
+            try:
+                # Har update o'z vazifasida: kontekst o'zgaruvchilari (FSM holati keshi va h.k.)
+                # keyingi updatega o'tib ketmaydi
+                await asyncio.ensure_future(self.dispatcher.updates_handler.notify(update))
+                self.processed += 1
+                ok = True
+            except Exception as e:
+                self.errors += 1
+                logger.exception("Update %s ni qayta ishlashda xato: %s", update.update_id, e)
+            finally:
+                self._queue.task_done()
+                if on_done is not None:
+                    on_done(update, ok, time.perf_counter() - started)
+
+    def start(self):
+        loop = asyncio.get_event_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 30):
+        # Navbatdagi updatelar tugaguncha kutamiz, keyin ishchilarni to'xtatamiz
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook navbati %s soniyada bo'shamadi, %d ta update qoldi", timeout, self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+class FastAckWebhookHandler(WebhookRequestHandler):
+    async def post(self):
+        self.validate_ip()
+        secret = self.request.app.get(SECRET_TOKEN_KEY)
+        if secret and not hmac.compare_digest(self.request.headers.get(SECRET_TOKEN_HEADER, ""), secret):
+            return web.Response(status=401, text="unauthorized")
+        dispatcher = self.get_dispatcher()
+        update = await self.parse_update(dispatcher.bot)
+        await self.request.app[UPDATE_QUEUE_KEY].put(update)
+        return web.Response(text="ok")
+
+
+def start_webhook(dispatcher: Dispatcher, path: str, host: str, port: int,
+                  secret: Optional[str] = None, url: Optional[str] = None,
+                  on_startup: Optional[Callable] = None, on_shutdown: Optional[Callable] = None,
+                  workers: int = 32, queue_size: int = 1000, skip_updates: bool = True):
+    queue = UpdateQueue(dispatcher, workers=workers, maxsize=queue_size)
+    app = web.Application()
+    app[UPDATE_QUEUE_KEY] = queue
+    app[SECRET_TOKEN_KEY] = secret
+
+    async def _startup(dp: Dispatcher):
+        queue.start()
+        if url:
+            await dp.bot.set_webhook(url.rstrip("/") + path, secret_token=secret, drop_pending_updates=skip_updates)
+            logger.info("Webhook o'rnatildi: %s%s", url.rstrip("/"), path)
+
+    async def _shutdown(dp: Dispatcher):
+        await queue.stop()
+        logger.info("Webhook: %d ta update qayta ishlandi, %d ta xato", queue.processed, queue.errors)
+
+    executor = Executor(dispatcher, skip_updates=False)
+    executor.on_startup(_startup, polling=False)
+    if on_startup is not None:
+        executor.on_startup(on_startup, polling=False)
+    # avval navbat bo'shatiladi, keyin saqlash va boshqa yopish ishlari
+    executor.on_shutdown(_shutdown, polling=False)
+    if on_shutdown is not None:
+        executor.on_shutdown(on_shutdown, polling=False)
+    executor.set_webhook(webhook_path=path, request_handler=FastAckWebhookHandler, web_app=app)
+    executor.run_app(host=host, port=port)
+
+
+def fake_update(update_id: int, user_id: int, text: str) -> dict:
+    user = {"id": user_id, "is_bot": False, "first_name": f"Test {user_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        },
+    }
+
+
+async def _send_fake_updates(url: str, count: int, secret: Optional[str]):
+    import aiohttp
+    headers = {SECRET_TOKEN_HEADER: secret} if secret else {}
+    started = time.perf_counter()
+    latencies = []
+    async with aiohttp.ClientSession(headers=headers) as session:
+        async def one(i: int):
+            t = time.perf_counter()
+            async with session.post(url, data=json.dumps(fake_update(i, 100000 + i, "/start")),
+                                    headers={"Content-Type": "application/json"}) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    logger.warning("Update %d: HTTP %d", i, resp.status)
+            latencies.append((time.perf_counter() - t) * 1000)
+        await asyncio.gather(*(one(i) for i in range(1, count + 1)))
+    latencies.sort()
+    total = time.perf_counter() - started
+    print(f"{count} ta update, {total:.2f} s, {count / total:.0f} upd/s, "
+          f"p50={latencies[len(latencies) // 2]:.1f} ms, p99={latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.1f} ms")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Foydalanish: python webhook.py URL [soni] [secret]")
+        sys.exit(1)
+    asyncio.run(_send_fake_updates(
+        sys.argv[1],
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+        sys.argv[3] if len(sys.argv) > 3 else None,
+    ))